@@ -0,0 +1,141 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+_APP_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.abspath(os.path.join(_APP_DIR, ".."))
+
+# Carpetas donde se buscan los mapas e imágenes por nombre de fichero, en orden
+# de preferencia (las mismas que recorrían display_interactive_map/display_image)
+CARPETAS_ACTIVOS = {
+    "html": ("docs", "resultados_barcelona_airbnb"),
+    "imagen": ("img", "resultados_barcelona_airbnb"),
+}
+EXTENSIONES = {"html": (".html", ".htm"), "imagen": (".png", ".jpg", ".jpeg", ".gif", ".webp", ".svg")}
+
+MAX_ENTRADAS = 32
+MAX_BYTES = 128 * 1024 ** 2
+INTERVALO_STAT = 2.0    # segundos entre comprobaciones del mtime de un mismo fichero
+
+_manifiesto = {}
+_rutas = {}
+_comprobado = {}        # ruta -> (instante de la última comprobación, mtime_ns)
+_contenido = OrderedDict()  # (ruta, mtime_ns) -> str (html) o bytes (imagen ya codificada)
+_bytes = 0
+_candado = threading.Lock()
+
+
+def _construir_manifiesto(tipo):
+    """Nombre de fichero -> ruta para los activos de ``tipo`` en sus carpetas conocidas"""
+    manifiesto = {}
+    for carpeta in CARPETAS_ACTIVOS[tipo]:
+        for base in (_APP_DIR, BASE_DIR):
+            directorio = os.path.join(base, carpeta)
+            if not os.path.isdir(directorio):
+                continue
+            for nombre in sorted(os.listdir(directorio)):
+                if nombre.lower().endswith(EXTENSIONES[tipo]):
+                    manifiesto.setdefault(nombre, os.path.join(directorio, nombre))
+    return manifiesto
+
+
+def resolver(ruta, tipo="html"):
+    """Ruta real de un activo, probando la ruta dada y después el manifiesto.
+
+    Las resoluciones se recuerdan; los fallos no, porque el activo puede
+    generarse más tarde (en ese caso se rehace el manifiesto).
+    """
+    clave = (ruta, tipo)
+    with _candado:
+        if clave in _rutas:
+            return _rutas[clave]
+
+    encontrada = next(
+        (p for p in (ruta, os.path.join(_APP_DIR, ruta), os.path.join(BASE_DIR, ruta)) if os.path.isfile(p)),
+        None,
+    )
+    if encontrada is None:
+        manifiesto = _construir_manifiesto(tipo)
+        with _candado:
+            _manifiesto[tipo] = manifiesto
+        encontrada = manifiesto.get(os.path.basename(ruta))
+    if encontrada is None:
+        return None
+
+    encontrada = os.path.abspath(encontrada)
+    with _candado:
+        _rutas[clave] = encontrada
+    return encontrada
+
+
+def _mtime(ruta):
+    """mtime de ``ruta`` consultando el disco como mucho cada INTERVALO_STAT segundos"""
+    ahora = time.monotonic()
+    with _candado:
+        comprobado = _comprobado.get(ruta)
+    if comprobado is not None and ahora - comprobado[0] < INTERVALO_STAT:
+        return comprobado[1]
+    try:
+        mtime = os.stat(ruta).st_mtime_ns
+    except OSError:
+        mtime = None
+    with _candado:
+        _comprobado[ruta] = (ahora, mtime)
+    return mtime
+
+
+def _guardar(clave, valor, tamano):
+    global _bytes
+    with _candado:
+        # Versiones anteriores del mismo fichero ya no sirven
+        for antigua in [k for k in _contenido if k[0] == clave[0]]:
+            _bytes -= _contenido.pop(antigua)[1]
+        _contenido[clave] = (valor, tamano)
+        _bytes += tamano
+        while len(_contenido) > MAX_ENTRADAS or (_bytes > MAX_BYTES and len(_contenido) > 1):
+            _bytes -= _contenido.popitem(last=False)[1][1]
+
+
+def _leer(ruta, tipo):
+    encontrada = resolver(ruta, tipo)
+    if encontrada is None:
+        return None
+    mtime = _mtime(encontrada)
+    if mtime is None:
+        # Se borró o movió: se olvida la resolución para volver a buscarlo
+        with _candado:
+            _rutas.pop((ruta, tipo), None)
+        return None
+
+    clave = (encontrada, mtime)
+    with _candado:
+        if clave in _contenido:
+            _contenido.move_to_end(clave)
+            return _contenido[clave][0]
+
+    with open(encontrada, "rb") as f:
+        datos = f.read()
+    valor = datos.decode("utf-8") if tipo == "html" else datos
+    _guardar(clave, valor, len(datos))
+    return valor
+
+
+def version(ruta, tipo="html"):
+    """(ruta resuelta, mtime_ns) del activo sin leerlo, o None si no se encuentra"""
+    encontrada = resolver(ruta, tipo)
+    if encontrada is None:
+        return None
+    mtime = _mtime(encontrada)
+    return None if mtime is None else (encontrada, mtime)
+
+
+def leer_html(ruta):
+    """Contenido de un mapa HTML (str) o None si no se encuentra"""
+    return _leer(ruta, "html")
+
+
+def leer_imagen(ruta):
+    """Bytes de una imagen tal como está codificada en disco (sin decodificar con PIL)"""
+    return _leer(ruta, "imagen")
@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+
+
+# Métricas por barrio que usan las pestañas; las que no estén en el frame se ignoran
+METRICAS = [
+    "price", "days_rented", "estimated_occupancy_l365d", "number_of_reviews", "review_scores_rating",
+    "n_amenities", "bedrooms", "bathrooms", "ROI (%)", "Net ROI (%)", "roi", "net_roi",
+    "price_per_m2", "precio",
+]
+ESTADISTICOS = ["count", "sum", "mean", "median", "min", "max"]
+CUANTILES = (0.25, 0.75)
+
+# Un anuncio se considera activo por encima de estos días ocupados al año
+UMBRAL_ACTIVO = 150
+
+
+def cubo_barrios(df, barrio="neighbourhood", metricas=None, ocupacion="estimated_occupancy_l365d"):
+    """Todas las métricas por barrio en una sola agrupación.
+
+    Devuelve un DataFrame indexado por barrio con columnas (metrica, estadistico):
+    count, sum, mean, median, min, max y los cuantiles de CUANTILES (q25, q75).
+    Incluye ``("anuncios", "size")`` y, si existe la columna de ocupación,
+    ``("activos", "sum")`` con los anuncios por encima de UMBRAL_ACTIVO.
+    """
+    metricas = [c for c in (metricas or METRICAS) if c in df.columns]
+    datos = df[metricas].astype("float64")
+    if ocupacion in df.columns:
+        datos["activos"] = (df[ocupacion] > UMBRAL_ACTIVO).astype("float64")
+    datos[barrio] = df[barrio]
+
+    grupos = datos.groupby(barrio, observed=True, sort=True)
+    cubo = grupos.agg(ESTADISTICOS)
+    if metricas:
+        cuantiles = grupos[metricas].quantile(list(CUANTILES)).unstack()
+        cuantiles.columns = pd.MultiIndex.from_tuples(
+            [(m, f"q{round(q * 100)}") for m, q in cuantiles.columns]
+        )
+        cubo = cubo.join(cuantiles)
+    cubo[("anuncios", "size")] = grupos.size()
+    cubo.columns.names = ["metrica", "estadistico"]
+    return cubo.sort_index(axis=1)
+
+
+def estadistico(cubo, nombre="mean"):
+    """Frame barrio x métrica con un solo estadístico del cubo"""
+    return cubo.xs(nombre, axis=1, level="estadistico")
+
+
+def top_barrios(cubo, metrica, nombre="mean", n=15):
+    """Serie con los ``n`` barrios de mayor valor en (metrica, nombre), sin nulos"""
+    if (metrica, nombre) not in cubo.columns:
+        return pd.Series(dtype="float64", name=metrica)
+    serie = cubo[(metrica, nombre)].dropna().rename(metrica)
+    return serie.sort_values(ascending=False).head(n)
+
+
+def combinar_parciales(cubo):
+    """Agregados de toda la selección combinando los parciales por barrio del cubo.
+
+    Solo usa estadísticos combinables (count, sum, min, max), así que el coste
+    depende del nº de barrios y no del de anuncios. Devuelve un frame
+    métrica x (count, sum, mean, min, max).
+    """
+    cuenta = estadistico(cubo, "count").sum()
+    suma = estadistico(cubo, "sum").sum()
+    return pd.DataFrame({
+        "count": cuenta,
+        "sum": suma,
+        "mean": suma / cuenta.where(cuenta > 0),
+        "min": estadistico(cubo, "min").min(),
+        "max": estadistico(cubo, "max").max(),
+    })
+
+
+def indice_barrios(df, barrio="neighbourhood"):
+    """barrio -> posiciones de sus filas en ``df`` (ordenadas), con un solo argsort"""
+    codigos, barrios = pd.factorize(df[barrio], sort=True)
+    orden = np.argsort(codigos, kind="stable")
+    # Los nulos (código -1) quedan al principio y no pertenecen a ningún barrio
+    cortes = np.searchsorted(codigos[orden], np.arange(len(barrios) + 1))
+    return {b: orden[inicio:fin] for b, inicio, fin in zip(barrios, cortes[:-1], cortes[1:])}
+
+
+def filas_seleccion(indice, seleccion):
+    """Posiciones de las filas de los barrios seleccionados, en el orden original"""
+    partes = [indice[b] for b in seleccion if b in indice]
+    if not partes:
+        return np.empty(0, dtype=np.intp)
+    return np.sort(np.concatenate(partes))
@@ -8,43 +8,62 @@ import traceback
 import os
 import folium
 from folium.plugins import MarkerCluster, HeatMap
-from PIL import Image
 import plotly.graph_objects as go
 import streamlit.components.v1 as components
-from maps_utils import crear_mapa_oportunidades, crear_mapa_precios_valencia, crear_heatmap_ocupacion_valencia, crear_mapa_roi_por_tipo
+from maps_utils import crear_mapa_oportunidades, crear_mapa_precios_valencia, crear_heatmap_ocupacion_valencia, crear_mapa_roi_por_tipo, html_mapa_clusters, crear_mapa_barrios
 from maps_utils import crear_mapa_precios_valencia, crear_heatmap_ocupacion_valencia,  display_interactive_map
 import streamlit.components.v1 as components
 from maps_utils import display_interactive_map, display_image, crear_evolucion_reseñas,mostrar_mapa_correlaciones,mostrar_matriz_correlacion,mostrar_relacion_precio_calificacion,mostrar_mapa_perfiles, crear_mapa_valencia,mostrar_mapa_con_fallback,mostrar_imagen, mostrar_imagen_con_fallback,mostrar_mapa, mostrar_mapa_con_fallback
 import copy
 import uuid
+import hashlib
+from ciudades import GEOJSON_BARRIOS, PARAMETROS_ROI, TOPOJSON_BARRIOS, contar_amenities, leer_ciudad
+from escenarios import ESCENARIO_BASE, barrer_escenarios
+from simulacion import ajustar_distribuciones, simular_roi_neto
+from artefactos import huella_frame, obtener_artefacto
+from figuras import huella_seleccion, mostrar_figura
+from dispersion import OPCIONES_ZONA, dispersion, mostrar_zona, zona_seleccionada
+from kde import dibujar_kde_1d
+from resumenes import bordes_histograma, cajas, conteos_histograma, histograma, traza_histograma
+from precalculo import artefacto_listo, precalentar
+from activos import leer_html, leer_imagen, version
+from clusters import indice_clusters
+from binning import RESOLUCIONES_M
+from espacial import densidad_competencia, indice_espacial, mas_cercanos
+from poligonos import unir_barrios
+from geometria import guardar_topologia
+from servidor_mapas import iniciar_servidor, publicar_estatico, registrar_indice
+from agregados import combinar_parciales, cubo_barrios, estadistico, filas_seleccion, indice_barrios, top_barrios
 
 IMG_DIR = "img"
 DOCS_DIR = "docs"
 DATA_DIR = "data"
 
 # Funciones de utilidad
+def incrustar_mapa(file_path, height=600):
+    """Muestra un mapa HTML; devuelve False si no se encuentra.
+
+    Por defecto el HTML (cacheado en memoria por activos.py) va en línea con
+    components.html, que funciona en cualquier despliegue. Solo si se configura
+    MAPAS_URL_BASE con una URL accesible desde el navegador se incrusta por URL
+    (copia precomprimida con ETag, revalidada con un 304).
+    """
+    encontrado = version(file_path)
+    if encontrado is None:
+        return False
+    url_mapas = load_servidor_mapas()
+    if url_mapas:
+        components.iframe(url_mapas + publicar_estatico(*encontrado), height=height)
+    else:
+        components.html(leer_html(file_path), height=height)
+    return True
+
 def display_interactive_map(file_path, title="Mapa Interactivo"):
     """Display an interactive HTML map"""
     try:
-        # Get the directory where this script is located
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-
-        # Try to find the file in different directories
-        possible_paths = [
-            file_path,
-            os.path.join(script_dir, file_path),
-            os.path.join(script_dir, 'docs', os.path.basename(file_path)),
-            os.path.join(script_dir, '..', 'docs', os.path.basename(file_path)),
-            os.path.join(script_dir, 'resultados_barcelona_airbnb', os.path.basename(file_path)),
-            os.path.join(script_dir, '..', 'resultados_barcelona_airbnb', os.path.basename(file_path))
-        ]
-
-        for path in possible_paths:
-            if os.path.exists(path):
-                with open(path, 'r', encoding='utf-8') as f:
-                    html_content = f.read()
-                st.components.v1.html(html_content, height=600)
-                return
+        # Ruta resuelta en memoria (activos.py); por URL solo con MAPAS_URL_BASE
+        if incrustar_mapa(file_path):
+            return
 
         st.warning(f"No se pudo encontrar el archivo: {file_path}")
     except Exception as e:
@@ -53,24 +72,11 @@ def display_interactive_map(file_path, title="Mapa Interactivo"):
 def display_image(image_path, caption=""):
     """Display an image from different possible directories"""
     try:
-        # Get the directory where this script is located
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-
-        # Try to find the image in different directories
-        possible_paths = [
-            image_path,
-            os.path.join(script_dir, image_path),
-            os.path.join(script_dir, 'img', os.path.basename(image_path)),
-            os.path.join(script_dir, '..', 'img', os.path.basename(image_path)),
-            os.path.join(script_dir, 'resultados_barcelona_airbnb', os.path.basename(image_path)),
-            os.path.join(script_dir, '..', 'resultados_barcelona_airbnb', os.path.basename(image_path))
-        ]
-
-        for path in possible_paths:
-            if os.path.exists(path):
-                img = Image.open(path)
-                st.image(img, caption=caption, use_container_width=True)
-                return
+        # Bytes ya codificados (PNG/JPEG) en memoria: st.image no necesita PIL
+        img = leer_imagen(image_path)
+        if img is not None:
+            st.image(img, caption=caption, use_container_width=True)
+            return
 
         st.warning(f"No se pudo encontrar la imagen: {image_path}")
     except Exception as e:
@@ -87,25 +93,9 @@ DATA_DIR = os.path.join(BASE_DIR, "data")
 def display_interactive_map(file_path, title="Mapa Interactivo"):
     """Display an interactive HTML map"""
     try:
-        # Get the directory where this script is located
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-
-        # Try to find the file in different directories
-        possible_paths = [
-            file_path,
-            os.path.join(script_dir, file_path),
-            os.path.join(script_dir, 'docs', os.path.basename(file_path)),
-            os.path.join(script_dir, '..', 'docs', os.path.basename(file_path)),
-            os.path.join(script_dir, 'resultados_barcelona_airbnb', os.path.basename(file_path)),
-            os.path.join(script_dir, '..', 'resultados_barcelona_airbnb', os.path.basename(file_path))
-        ]
-
-        for path in possible_paths:
-            if os.path.exists(path):
-                with open(path, 'r', encoding='utf-8') as f:
-                    html_content = f.read()
-                st.components.v1.html(html_content, height=600)
-                return
+        # Ruta resuelta en memoria (activos.py); por URL solo con MAPAS_URL_BASE
+        if incrustar_mapa(file_path):
+            return
 
         st.warning(f"No se pudo encontrar el archivo: {file_path}")
     except Exception as e:
@@ -114,24 +104,11 @@ def display_interactive_map(file_path, title="Mapa Interactivo"):
 def display_image(image_path, caption=""):
     """Display an image from different possible directories"""
     try:
-        # Get the directory where this script is located
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-
-        # Try to find the image in different directories
-        possible_paths = [
-            image_path,
-            os.path.join(script_dir, image_path),
-            os.path.join(script_dir, 'img', os.path.basename(image_path)),
-            os.path.join(script_dir, '..', 'img', os.path.basename(image_path)),
-            os.path.join(script_dir, 'resultados_barcelona_airbnb', os.path.basename(image_path)),
-            os.path.join(script_dir, '..', 'resultados_barcelona_airbnb', os.path.basename(image_path))
-        ]
-
-        for path in possible_paths:
-            if os.path.exists(path):
-                img = Image.open(path)
-                st.image(img, caption=caption, use_container_width=True)
-                return
+        # Bytes ya codificados (PNG/JPEG) en memoria: st.image no necesita PIL
+        img = leer_imagen(image_path)
+        if img is not None:
+            st.image(img, caption=caption, use_container_width=True)
+            return
 
         st.warning(f"No se pudo encontrar la imagen: {image_path}")
     except Exception as e:
@@ -150,80 +127,406 @@ Utiliza los filtros y selectores en la barra lateral para personalizar tu análi
 """)
 
 @st.cache_data(ttl=3600)
-def load_data():
+def load_data(ciudad):
+    # Una entrada de caché por ciudad: solo se leen los datasets de la ciudad seleccionada
     try:
-        df_valencia = pd.read_csv('data/Valencia_limpio.csv')
-        df_inmobiliario = pd.read_csv("data/valencia_vivienda_limpio.csv")
-        df_delincuencia = pd.read_csv("data/crimenValencia.csv", sep=';')
-        df_barcelona = pd.read_csv("data/barcelona_limpio_completo.csv")
-        df_barcelona_inversores = pd.read_csv("data/barcelona_inversores.csv")
-        df_malaga = pd.read_csv("data/malaga_completed_clean.csv")
-        df_malaga_crimen = pd.read_csv("data/malaga_crimen_clean.csv", sep=',', quotechar='"')
-        return df_valencia, df_inmobiliario, df_delincuencia,df_barcelona, df_barcelona_inversores, df_malaga, df_malaga_crimen
-
+        return leer_ciudad(ciudad)
     except Exception as e:
         st.error(f"Error al cargar los datos: {e}")
         st.text(traceback.format_exc())
-        return None, None, None, None, None, None, None, None, None
+        return {}
 
-df_valencia, df_inmobiliario, df_delincuencia,df_barcelona, df_barcelona_inversores, df_malaga, df_malaga_crimen = load_data()
-#df_valencia, df_inmobiliario, df_delincuencia, df_barcelona, df_barcelona_inversores, df_precios_barrios, df_precios_distritos, df_malaga, df_malaga_crimen = load_data()
+@st.cache_data(ttl=3600)
+def huella_datos(ciudad):
+    # Versión del contenido de los datasets de la ciudad, para las claves de figuras
+    return huella_seleccion(*(
+        (nombre, huella_frame(df)) for nombre, df in sorted(load_data(ciudad).items()) if df is not None
+    ))
+
+# Artefactos de la selección por defecto que se generan en segundo plano al arrancar:
+# ciudad -> nombre -> (función, extensión, columnas que usa, parámetros por defecto)
+ARTEFACTOS_POR_CIUDAD = {
+    "valencia": {
+        "oportunidades": (crear_mapa_oportunidades, ".html", ['latitude', 'longitude', 'price', 'ROI (%)'], {}),
+        "precios": (
+            crear_mapa_precios_valencia, ".html",
+            ['latitude', 'longitude', 'price', 'Net ROI (%)', 'days_rented'], {"tamano_m": RESOLUCIONES_M[1]}
+        ),
+        "ocupacion": (
+            crear_heatmap_ocupacion_valencia, ".png",
+            ['city', 'latitude', 'longitude', 'estimated_occupancy_l365d'], {}
+        ),
+        "reseñas": (crear_evolucion_reseñas, ".png", ['city', 'last_review', 'number_of_reviews'], {}),
+        "roi_tipo": (crear_mapa_roi_por_tipo, ".html", ['latitude', 'longitude', 'room_type', 'ROI (%)'], {}),
+    },
+}
 
-# Preprocesamiento básico y filtros
-if df_valencia is not None and df_inmobiliario is not None:
-    if 'price' in df_valencia.columns:
-        df_valencia['price'] = df_valencia['price'].astype(float)
-    if 'precio' in df_inmobiliario.columns:
-        precio_m2_valencia = df_inmobiliario['precio'].mean()
-    else:
-        precio_m2_valencia = 2000  # fallback
-    average_m2 = 70
-    df_valencia['annual_income'] = df_valencia['price'] * df_valencia['days_rented']
-    df_valencia['estimated_property_value'] = precio_m2_valencia * average_m2
-    df_valencia['ROI (%)'] = (df_valencia['annual_income'] / df_valencia['estimated_property_value']) * 100
-    gastos_anuales = 3000
-    df_valencia['net_annual_income'] = df_valencia['annual_income'] - gastos_anuales
-    df_valencia['Net ROI (%)'] = (df_valencia['net_annual_income'] / df_valencia['estimated_property_value']) * 100
+@st.cache_resource(ttl=3600)
+def precalentar_ciudad(ciudad):
+    # Una vez por ciudad y hora, como load_data: si los datos cambiaron cambian las
+    # claves y se regeneran; si no, las tareas encuentran el artefacto hecho.
+    # Pasa por load_data para no parsear dos veces la ciudad que luego se abra
+    return precalentar(lambda: load_data(ciudad).get("anuncios"), list(ARTEFACTOS_POR_CIUDAD[ciudad].values()))
+
+def precalentar_otras_ciudades(ciudad_actual):
+    # La ciudad seleccionada ya encola sus artefactos al pintarse
+    for ciudad in ARTEFACTOS_POR_CIUDAD:
+        if ciudad != ciudad_actual:
+            precalentar_ciudad(ciudad)
+
+def artefacto(ciudad, nombre, df, **params):
+    """(listo, ruta) de un artefacto registrado; si aún no está, se encola.
+
+    Si la generación falló se avisa y se devuelve (True, None): la sección
+    sigue con su alternativa y el siguiente rerun lo reintenta.
+    """
+    funcion, extension, columnas, por_defecto = ARTEFACTOS_POR_CIUDAD[ciudad][nombre]
+    try:
+        return artefacto_listo(funcion, df, extension, columnas=columnas, **{**por_defecto, **params})
+    except Exception as e:
+        st.warning(f"No se pudo generar '{nombre}': {e}")
+        return True, None
 
-    st.sidebar.header("Filtros")
+def esperando_artefacto(descripcion, clave):
+    st.info(f"⏳ {descripcion} se está generando en segundo plano.")
+    if st.button("Actualizar", key=f"actualizar_{clave}"):
+        st.rerun()
 
-# Filtro por ciudad
-ciudades = ['Valencia', 'Malaga', 'Barcelona']
+@st.cache_data(ttl=3600)
+def load_n_amenities(ciudad):
+    # El texto de 'amenities' no se carga con el resto: solo se guarda el recuento
+    try:
+        return contar_amenities(ciudad)
+    except Exception:
+        return None
 
-if 'city' in df_valencia.columns:
-    ciudad_seleccionada = st.sidebar.selectbox("Selecciona ciudad", ciudades)
+@st.cache_data(ttl=3600)
+def load_cubo(ciudad, dataset="anuncios"):
+    # Un único groupby por ciudad con todas las métricas; las pestañas leen de aquí
+    df = load_data(ciudad).get(dataset)
+    if df is None or 'neighbourhood' not in df.columns:
+        return None
+    if dataset == "anuncios":
+        n_amenities = load_n_amenities(ciudad)
+        if n_amenities is not None:
+            df = df.assign(n_amenities=n_amenities)
+    return cubo_barrios(df)
+
+@st.cache_resource(ttl=3600)
+def load_indice(ciudad):
+    # Posiciones de filas por barrio; cache_resource para no copiar los arrays en cada rerun
+    df = load_data(ciudad).get("anuncios")
+    if df is None or 'neighbourhood' not in df.columns:
+        return {}
+    return indice_barrios(df)
+
+# Valores que acompañan a cada cluster/anuncio en el mapa de oportunidades
+CAMPOS_MAPA_CLUSTERS = [("Precio", 'price', "€{}"), ("ROI Bruto", 'ROI (%)', "{}%")]
+
+@st.cache_resource
+def load_servidor_mapas():
+    # Un único servidor por proceso, compartido por todas las sesiones. None salvo
+    # que MAPAS_URL_BASE esté definida; si lo está y el puerto no se puede abrir,
+    # el error llega a quien muestra el mapa (cache_resource no guarda excepciones)
+    return iniciar_servidor()
+
+@st.cache_resource(ttl=3600, max_entries=16)
+def load_indice_clusters(ciudad, barrios):
+    # Índice de clusters de la selección; el nombre es el que usa el mapa en /clusters
+    df = load_data(ciudad).get("anuncios")
+    if df is None or 'latitude' not in df.columns or 'longitude' not in df.columns:
+        return None, None
+    df = df.iloc[filas_seleccion(load_indice(ciudad), barrios)]
+    valores = {col: df[col] for _, col, _ in CAMPOS_MAPA_CLUSTERS if col in df.columns}
+    nombre = f"{ciudad}-{hashlib.sha1(repr(barrios).encode('utf-8')).hexdigest()[:12]}"
+    return nombre, indice_clusters(df['latitude'], df['longitude'], valores)
 
-    # Selecciona el dataframe según la ciudad
-    if ciudad_seleccionada.lower() == 'valencia':
-        df_ciudad = df_valencia
-    elif ciudad_seleccionada.lower() == 'barcelona':
-        df_ciudad = df_barcelona
-    elif ciudad_seleccionada.lower() == 'malaga':
-        df_ciudad = df_malaga
-    else:
-        st.warning("Ciudad no reconocida.")
-        st.stop()
+@st.cache_data(ttl=3600)
+def roi_neto_medio(ciudad, columna_roi):
+    # Solo se cachea el escalar: los datos de la otra ciudad no quedan en memoria
+    try:
+        df = leer_ciudad(ciudad, pestanas=["rentabilidad"]).get("anuncios")
+    except Exception:
+        return None
+    if df is None or df.empty or columna_roi not in df.columns:
+        return None
+    return float(df[columna_roi].mean())
 
-    # Filtro por barrios
-    if 'neighbourhood' in df_ciudad.columns:
-        barrios = sorted(df_ciudad['neighbourhood'].dropna().unique())
-        selected_barrios = st.sidebar.multiselect("Selecciona barrios", options=barrios, default=barrios)
-        df_ciudad = df_ciudad[df_ciudad['neighbourhood'].isin(selected_barrios)]
-        if df_ciudad.empty:
-            st.warning("No hay datos para los barrios seleccionados en la ciudad.")
-            st.stop()
-    else:
-        st.sidebar.warning("No se encontró la columna 'neighbourhood' en los datos de la ciudad seleccionada.")
-        st.stop()
+@st.cache_data(ttl=3600)
+def load_escenarios(ciudad):
+    # Se calcula una vez por ciudad; los controles solo cortan el cubo ya calculado
+    df = load_data(ciudad).get("anuncios")
+    if df is None or ciudad not in PARAMETROS_ROI:
+        return None
+    try:
+        return barrer_escenarios(df, **PARAMETROS_ROI[ciudad])
+    except KeyError:
+        return None
+
+def mostrar_escenarios(ciudad, barrios_seleccionados):
+    st.markdown("#### Escenarios de rentabilidad (ROI Neto por barrio)")
+    cubo = load_escenarios(ciudad)
+    if cubo is None or cubo.empty:
+        st.info("No hay datos suficientes para calcular escenarios de rentabilidad.")
+        return
+
+    etiquetas = {
+        "gastos": ("Gastos anuales (€)", lambda v: f"{v:,.0f}"),
+        "m2": ("Superficie (m²)", lambda v: f"{v:.0f}"),
+        "ajuste_ocupacion": ("Pérdida de ocupación", lambda v: f"{v:.0%}"),
+        "variacion_precio_m2": ("Variación €/m² de compra", lambda v: f"{v:+.0%}"),
+    }
+    seleccion = []
+    for col, (eje, (etiqueta, formato)) in zip(st.columns(len(etiquetas)), etiquetas.items()):
+        valores = list(cubo.index.unique(eje))
+        seleccion.append(col.select_slider(
+            etiqueta, options=valores, value=ESCENARIO_BASE[eje],
+            format_func=formato, key=f"escenario_{ciudad}_{eje}"
+        ))
+
+    corte = cubo.xs(tuple(seleccion), level=list(etiquetas))
+    corte = corte[corte.index.isin([str(b) for b in barrios_seleccionados])]
+    top = corte.sort_values('p50', ascending=False).head(15)
+    if top.empty:
+        st.info("No hay barrios seleccionados con datos de escenarios.")
+        return
+    def construir_fig():
+        fig = px.bar(
+            top,
+            x='p50',
+            y=top.index,
+            orientation='h',
+            error_x=top['p90'] - top['p50'],
+            error_x_minus=top['p50'] - top['p10'],
+            labels={'p50': 'ROI Neto mediano (%)', 'y': 'Barrio', 'barrio': 'Barrio'},
+            title='Top 15 barrios por ROI Neto mediano en el escenario (barras: percentiles 10-90)'
+        )
+        return fig
+    mostrar_figura(f"escenarios_{ciudad}", huella_seleccion(HUELLA_SELECCION, seleccion), construir_fig)
 
-else:
-    st.sidebar.warning("No se encontró la columna 'city' en los datos. Mostrando todos los datos.")
-    barrios = sorted(df_valencia['neighbourhood'].dropna().unique())
+@st.cache_data(ttl=3600)
+def load_simulacion(ciudad, n_simulaciones, semilla=42):
+    # Misma semilla -> mismos resultados, sea cual sea el nº de núcleos
+    df = load_data(ciudad).get("anuncios")
+    if df is None or ciudad not in PARAMETROS_ROI:
+        return None
+    parametros = PARAMETROS_ROI[ciudad]
+    try:
+        distribuciones = ajustar_distribuciones(
+            df, parametros["precio_m2"], ocupacion=parametros.get("ocupacion", "days_rented")
+        )
+    except KeyError:
+        return None
+    return simular_roi_neto(distribuciones, n_simulaciones=n_simulaciones, semilla=semilla)
+
+@st.cache_resource(ttl=3600)
+def load_indice_espacial(ciudad):
+    # KD-tree de la ciudad completa; las consultas devuelven posiciones de load_data()
+    df = load_data(ciudad).get("anuncios")
+    if df is None or 'latitude' not in df.columns or 'longitude' not in df.columns:
+        return None
+    return indice_espacial(df['latitude'], df['longitude'])
+
+@st.cache_data(ttl=3600)
+def load_densidad_competencia(ciudad, radio_m):
+    indice = load_indice_espacial(ciudad)
+    if indice is None:
+        return None
+    df = load_data(ciudad)["anuncios"]
+    return pd.Series(densidad_competencia(indice, radio_m), index=df.index[indice["filas"]], name='competidores')
+
+def mostrar_competencia_local(ciudad, df_seleccion):
+    st.subheader("Competencia en el entorno de cada anuncio")
+    radio = st.select_slider("Radio (m)", options=[250, 500, 1000], value=500, key=f"radio_competencia_{ciudad}")
+    densidad = load_densidad_competencia(ciudad, radio)
+    if densidad is None:
+        st.info("No hay coordenadas para calcular la competencia local.")
+        return
+
+    def construir_fig_densidad():
+        densidad_seleccion = densidad.reindex(df_seleccion.index)
+        top_densidad = (
+            densidad_seleccion.groupby(df_seleccion['neighbourhood'], observed=True).mean()
+            .dropna().sort_values(ascending=False).head(15)
+        )
+        if top_densidad.empty:
+            return None
+        fig_densidad = px.bar(
+            x=top_densidad.values,
+            y=top_densidad.index,
+            orientation='h',
+            labels={'x': f'Competidores medios a menos de {radio} m', 'y': 'Barrio'},
+            title=f'Top 15 barrios por competidores en un radio de {radio} m'
+        )
+        return fig_densidad
+    mostrar_figura(f"densidad_competencia_{ciudad}", huella_seleccion(HUELLA_SELECCION, radio), construir_fig_densidad)
+
+    # Anuncios comparables (mismo tipo de alojamiento) más cercanos a uno dado
+    if 'id' not in df_seleccion.columns:
+        return
+    # Texto y no number_input: los ids actuales (~1e18) pasan de 2**53, el máximo que admite Streamlit
+    ids = df_seleccion['id'].dropna()
+    if ids.empty:
+        return
+    texto_id = st.text_input(
+        "ID de anuncio para buscar comparables cercanos",
+        value=str(ids.iloc[0]), key=f"anuncio_comparables_{ciudad}"
+    )
+    try:
+        anuncio_id = int(texto_id.strip())
+    except ValueError:
+        st.info("El ID de anuncio debe ser un número entero.")
+        return
+    # Comparación exacta en int64 (con ids nulos el resultado es NA, que no coincide)
+    anuncio = df_seleccion[df_seleccion['id'].eq(anuncio_id).fillna(False).to_numpy(dtype=bool)]
+    if anuncio.empty or anuncio[['latitude', 'longitude']].isna().any(axis=None):
+        st.info("No se encontró el anuncio o no tiene coordenadas.")
+        return
+    df = load_data(ciudad)["anuncios"]
+    distancias, filas = mas_cercanos(
+        load_indice_espacial(ciudad), anuncio['latitude'].iloc[0], anuncio['longitude'].iloc[0], k=50
+    )
+    cercanos = df.iloc[filas[0]].assign(**{'Distancia (m)': distancias[0].round(0)})
+    cercanos = cercanos[~cercanos['id'].eq(anuncio_id).fillna(False).to_numpy(dtype=bool)]
+    if 'room_type' in df.columns:
+        cercanos = cercanos[cercanos['room_type'] == anuncio['room_type'].iloc[0]]
+    columnas = [c for c in ['id', 'neighbourhood', 'room_type', 'price', 'Distancia (m)'] if c in cercanos.columns]
+    st.dataframe(cercanos[columnas].head(10), use_container_width=True)
+
+@st.cache_data(ttl=3600)
+def load_barrios_poligono(ciudad):
+    # Unión espacial anuncio -> polígono de neighbourhoods.geojson, una vez por ciudad
+    path = GEOJSON_BARRIOS.get(ciudad)
+    df = load_data(ciudad).get("anuncios")
+    if path is None or not os.path.exists(path) or df is None or 'latitude' not in df.columns or 'longitude' not in df.columns:
+        return None
+    return unir_barrios(df, path)
+
+METRICAS_MAPA_BARRIOS = {
+    'roi_neto_medio': 'ROI Neto medio (%)',
+    'precio_medio': 'Precio medio (€)',
+    'n_anuncios': 'Nº de anuncios',
+}
+
+def mostrar_mapa_barrios(ciudad, df_seleccion):
+    union = load_barrios_poligono(ciudad)
+    if union is None:
+        return
+    union = union.reindex(df_seleccion.index)
+    datos = df_seleccion.assign(barrio_poligono=union['barrio_poligono'])
+    agregados = datos.groupby('barrio_poligono', observed=True).agg(
+        n_anuncios=('barrio_poligono', 'size'),
+        precio_medio=('price', 'mean'),
+        roi_neto_medio=('Net ROI (%)', 'mean'),
+    )
+
+    st.markdown("#### Mapa de barrios")
+    metrica = st.selectbox(
+        "Métrica", list(METRICAS_MAPA_BARRIOS), format_func=METRICAS_MAPA_BARRIOS.get, key=f"metrica_barrios_{ciudad}"
+    )
+    # Se genera una vez desde el GeoJSON si no existe
+    ruta_topologia = TOPOJSON_BARRIOS[ciudad]
+    if not os.path.exists(ruta_topologia):
+        guardar_topologia(GEOJSON_BARRIOS[ciudad], ruta_topologia)
+    ruta = obtener_artefacto(
+        crear_mapa_barrios, agregados, ".html",
+        topologia=ruta_topologia, metrica=metrica, etiqueta=METRICAS_MAPA_BARRIOS[metrica]
+    )
+    if ruta:
+        display_interactive_map(ruta, "Mapa de barrios")
+
+    # Anuncios cuya etiqueta de barrio no es la del polígono en el que caen
+    dentro = union['barrio_poligono'].notna()
+    st.caption(
+        f"{int((dentro & ~union['coincide']).sum())} anuncios con un barrio distinto al de su polígono y "
+        f"{int((~dentro).sum())} fuera de todos los polígonos."
+    )
+
+def mostrar_simulacion(ciudad, barrios_seleccionados):
+    if not st.checkbox("Modo simulación (Monte Carlo del ROI Neto)", key=f"simulacion_{ciudad}"):
+        return
+    n_simulaciones = st.select_slider(
+        "Simulaciones por barrio", options=[1000, 5000, 10000, 50000], value=10000,
+        key=f"n_simulaciones_{ciudad}"
+    )
+    resultado = load_simulacion(ciudad, n_simulaciones)
+    if resultado is None or resultado.empty:
+        st.info("No hay datos suficientes para simular la rentabilidad.")
+        return
+    resultado = resultado[resultado.index.isin([str(b) for b in barrios_seleccionados])]
+    top = resultado.sort_values('p50', ascending=False).head(15)
+    if top.empty:
+        st.info("No hay barrios seleccionados con datos de simulación.")
+        return
+
+    def construir_fig():
+        fig = px.bar(
+            top,
+            x='p50',
+            y=top.index,
+            orientation='h',
+            error_x=top['p95'] - top['p50'],
+            error_x_minus=top['p50'] - top['p5'],
+            color='prob_perdida',
+            color_continuous_scale='RdYlGn_r',
+            labels={'p50': 'ROI Neto mediano (%)', 'y': 'Barrio', 'barrio': 'Barrio', 'prob_perdida': 'P(pérdida)'},
+            title='Top 15 barrios por ROI Neto simulado (barras: percentiles 5-95)'
+        )
+        return fig
+    mostrar_figura(f"simulacion_{ciudad}", huella_seleccion(HUELLA_SELECCION, n_simulaciones), construir_fig)
+    st.dataframe(
+        top[['roi_neto_medio', 'p5', 'p50', 'p95', 'var_95', 'prob_perdida', 'n_anuncios']].rename(columns={
+            'roi_neto_medio': 'ROI Neto medio (%)', 'p5': 'P5 (%)', 'p50': 'P50 (%)', 'p95': 'P95 (%)',
+            'var_95': 'VaR 95% (%)', 'prob_perdida': 'Prob. pérdida', 'n_anuncios': 'Anuncios'
+        }).style.format(precision=2).format({'Prob. pérdida': '{:.1%}', 'Anuncios': '{:.0f}'}),
+        use_container_width=True
+    )
+
+st.sidebar.header("Filtros")
+
+# Filtro por ciudad
+ciudades = ['Valencia', 'Malaga', 'Barcelona']
+ciudad_seleccionada = st.sidebar.selectbox("Selecciona ciudad", ciudades)
+
+datos_ciudad = load_data(ciudad_seleccionada.lower())
+precalentar_otras_ciudades(ciudad_seleccionada.lower())
+df_ciudad = datos_ciudad.get("anuncios")
+if df_ciudad is None:
+    st.warning("No se pudieron cargar los datos de la ciudad seleccionada.")
+    st.stop()
+
+# Datasets de la ciudad activa (None para el resto de ciudades)
+df_valencia = df_ciudad if ciudad_seleccionada.lower() == 'valencia' else None
+df_inmobiliario = datos_ciudad.get("vivienda")
+df_delincuencia = datos_ciudad.get("crimen") if ciudad_seleccionada.lower() == 'valencia' else None
+df_barcelona = df_ciudad if ciudad_seleccionada.lower() == 'barcelona' else None
+df_barcelona_inversores = datos_ciudad.get("inversores")
+df_malaga = df_ciudad if ciudad_seleccionada.lower() == 'malaga' else None
+df_malaga_crimen = datos_ciudad.get("crimen") if ciudad_seleccionada.lower() == 'malaga' else None
+
+# Filtro por barrios
+if 'neighbourhood' in df_ciudad.columns:
+    barrios = sorted(df_ciudad['neighbourhood'].dropna().unique())
     selected_barrios = st.sidebar.multiselect("Selecciona barrios", options=barrios, default=barrios)
-    df_valencia = df_valencia[df_valencia['neighbourhood'].isin(selected_barrios)]
-    if df_valencia.empty:
-        st.warning("No hay datos para los barrios seleccionados.")
+    # Con todos los barrios se usa el frame tal cual; si no, se unen las filas precalculadas de cada barrio
+    if len(selected_barrios) < len(barrios):
+        df_ciudad = df_ciudad.iloc[filas_seleccion(load_indice(ciudad_seleccionada.lower()), selected_barrios)]
+        if isinstance(df_ciudad['neighbourhood'].dtype, pd.CategoricalDtype):
+            df_ciudad = df_ciudad.assign(neighbourhood=df_ciudad['neighbourhood'].cat.remove_unused_categories())
+    if df_ciudad.empty:
+        st.warning("No hay datos para los barrios seleccionados en la ciudad.")
         st.stop()
+    # Agregados por barrio de la selección: filas del cubo, sin volver a agrupar
+    cubo_ciudad = load_cubo(ciudad_seleccionada.lower())
+    cubo = cubo_ciudad[cubo_ciudad.index.isin(selected_barrios)]
+    resumen_seleccion = combinar_parciales(cubo)
+    n_anuncios_seleccion = int(cubo[('anuncios', 'size')].sum())
+    HUELLA_SELECCION = huella_seleccion(
+        ciudad_seleccionada.lower(), huella_datos(ciudad_seleccionada.lower()), sorted(map(str, selected_barrios))
+    )
+else:
+    st.sidebar.warning("No se encontró la columna 'neighbourhood' en los datos de la ciudad seleccionada.")
+    st.stop()
 
 # Definir pestañas por ciudad usando la ciudad seleccionada del filtro
 tabs_por_ciudad = {
@@ -266,59 +569,56 @@ if not pestañas:
     st.warning(f"No hay pestañas definidas para la ciudad '{ciudad_seleccionada}'.")
     st.stop()
 
-main_tabs = st.tabs(pestañas)
-
-# Mostrar contenido básico para testear acceso a pestañas (debug)
-for i, tab in enumerate(main_tabs):
-    with tab:
-        st.write("")
+# Selector de sección en lugar de st.tabs: las pestañas ejecutan todo su contenido
+# en cada rerun aunque no se vean; aquí solo corre la sección elegida (ver SECCIONES)
+seccion = st.radio("Sección", pestañas, horizontal=True, label_visibility="collapsed", key="seccion")
 
 # ------------------ Pestaña 1: Resumen General ------------------
-if len(main_tabs) > 0:
-    with main_tabs[0]:
-        if ciudad_actual == "valencia":
-            st.subheader("Resumen General del Mercado Inmobiliario de Valencia")
-
-            # Métricas principales
-            col1, col2, col3 = st.columns(3)
-            col1.metric("Nº de anuncios", len(df_ciudad))
-
-            if 'Net ROI (%)' in df_ciudad.columns and not df_ciudad['Net ROI (%)'].isnull().all():
-                roi_neto_medio = df_ciudad['Net ROI (%)'].mean() * 100
-                col2.metric("ROI Neto medio (%)", f"{roi_neto_medio:.2f}")
-            else:
-                col2.metric("ROI Neto medio (%)", "N/A")
-                    
-            if 'price' in df_ciudad.columns and not df_ciudad['price'].isnull().all():
-                precio_medio = df_ciudad['price'].mean()
-                col3.metric("Precio medio alquiler (€)", f"{precio_medio:.2f}")
-            else:
-                col3.metric("Precio medio alquiler (€)", "N/A")
+def seccion_resumen():
+    if ciudad_actual == "valencia":
+        st.subheader("Resumen General del Mercado Inmobiliario de Valencia")
 
+        # Métricas principales
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Nº de anuncios", n_anuncios_seleccion)
+
+        if 'Net ROI (%)' in resumen_seleccion.index and resumen_seleccion.loc['Net ROI (%)', 'count'] > 0:
+            roi_neto_medio = resumen_seleccion.loc['Net ROI (%)', 'mean'] * 100
+            col2.metric("ROI Neto medio (%)", f"{roi_neto_medio:.2f}")
+        else:
+            col2.metric("ROI Neto medio (%)", "N/A")
 
-            # Distribución de ROI Bruto y Neto (gráfico mejorado)
-            st.markdown("#### Distribución de ROI Bruto y Neto (%)")
-            if (
-                len(df_ciudad) > 1 and 
-                'ROI (%)' in df_ciudad.columns and 
-                'Net ROI (%)' in df_ciudad.columns
-            ):
+        if 'price' in resumen_seleccion.index and resumen_seleccion.loc['price', 'count'] > 0:
+            precio_medio = resumen_seleccion.loc['price', 'mean']
+            col3.metric("Precio medio alquiler (€)", f"{precio_medio:.2f}")
+        else:
+            col3.metric("Precio medio alquiler (€)", "N/A")
+
+
+        # Distribución de ROI Bruto y Neto (gráfico mejorado)
+        st.markdown("#### Distribución de ROI Bruto y Neto (%)")
+        if (
+            len(df_ciudad) > 1 and 
+            'ROI (%)' in df_ciudad.columns and 
+            'Net ROI (%)' in df_ciudad.columns
+        ):
+            def construir_fig():
+                # Clases comunes calculadas aquí: se envía un valor por clase, no por anuncio
+                bordes = bordes_histograma(df_ciudad['ROI (%)'], df_ciudad['Net ROI (%)'], nbins=40)
                 fig = go.Figure()
-                fig.add_trace(go.Histogram(
-                    x=df_ciudad['ROI (%)'],
+                fig.add_trace(traza_histograma(
+                    conteos_histograma(df_ciudad['ROI (%)'], bordes), bordes,
+                    histnorm='probability density', etiqueta_x='ROI (%)',
                     name='ROI Bruto (%)',
                     opacity=0.6,
-                    marker_color='skyblue',
-                    nbinsx=40,
-                    histnorm='probability density'
+                    marker_color='skyblue'
                 ))
-                fig.add_trace(go.Histogram(
-                    x=df_ciudad['Net ROI (%)'],
+                fig.add_trace(traza_histograma(
+                    conteos_histograma(df_ciudad['Net ROI (%)'], bordes), bordes,
+                    histnorm='probability density', etiqueta_x='ROI (%)',
                     name='ROI Neto (%)',
                     opacity=0.6,
-                    marker_color='orange',
-                    nbinsx=40,
-                    histnorm='probability density'
+                    marker_color='orange'
                 ))
                 fig.update_layout(
                     barmode='overlay',
@@ -331,21 +631,33 @@ if len(main_tabs) > 0:
                     margin=dict(l=40, r=40, t=60, b=40)
                 )
                 fig.update_traces(marker_line_width=1, marker_line_color='white')
-                st.plotly_chart(fig, use_container_width=True, key="bar_358")
+                return fig
+            mostrar_figura("bar_358", HUELLA_SELECCION, construir_fig)
 
-            # Mapa interactivo
-            st.markdown("#### Mapa de Oportunidades en Valencia")
-            try:
-                crear_mapa_oportunidades(df_ciudad)  # Genera el HTML
-                with open(f"mapa_oportunidad_{ciudad_actual}.html", "r", encoding="utf-8") as f:
-                    html_mapa = f.read()
-                components.html(html_mapa, height=600, scrolling=True)
-            except Exception as e:
-                st.warning(f"No se pudo generar el mapa de oportunidades de Valencia. Error: {e}")
+        # Mapa interactivo
+        st.markdown("#### Mapa de Oportunidades en Valencia")
+        try:
+            url_mapas = load_servidor_mapas()
+            nombre_indice, indice = load_indice_clusters(ciudad_actual, tuple(selected_barrios)) if url_mapas else (None, None)
+            if url_mapas and indice is not None:
+                # Con MAPAS_URL_BASE el navegador pide al servidor solo los clusters del viewport
+                registrar_indice(nombre_indice, indice)
+                campos = [c for c in CAMPOS_MAPA_CLUSTERS if c[1] in indice["valores"]]
+                components.html(html_mapa_clusters(url_mapas, nombre_indice, campos), height=600)
+            else:
+                # Por defecto: mapa estático cacheado, solo se regenera si cambian los anuncios
+                listo, ruta_mapa = artefacto(ciudad_actual, "oportunidades", df_ciudad)
+                if not listo:
+                    esperando_artefacto("El mapa de oportunidades", "oportunidades")
+                elif ruta_mapa:
+                    components.html(leer_html(ruta_mapa), height=600, scrolling=True)
+        except Exception as e:
+            st.warning(f"No se pudo generar el mapa de oportunidades de Valencia. Error: {e}")
 
-            # Distribución por tipo de habitación
-            st.markdown("#### Distribución por Tipo de Alojamiento")
-            if 'room_type' in df_ciudad.columns:
+        # Distribución por tipo de habitación
+        st.markdown("#### Distribución por Tipo de Alojamiento")
+        if 'room_type' in df_ciudad.columns:
+            def construir_fig():
                 room_type_counts = df_ciudad['room_type'].value_counts().reset_index()
                 room_type_counts.columns = ['room_type', 'count']
 
@@ -356,60 +668,58 @@ if len(main_tabs) > 0:
                     title='Distribución por Tipo de Alojamiento',
                     hole=0.4
                 )
-                st.plotly_chart(fig, use_container_width=True, key=f"fig_bar_{ciudad_actual}_374")
-            else:
-                st.info("No hay datos de tipo de alojamiento disponibles.")
-        
-        elif ciudad_actual == "malaga":
-            st.subheader("Resumen General del Mercado Inmobiliario")
-        
-            col1, col2, col3 = st.columns(3)
-            col1.metric("Nº de anuncios", len(df_ciudad))
-            
-            # Verificar si 'net_roi' existe
-            if 'net_roi' in df_ciudad.columns and df_ciudad['net_roi'].notna().any():
-                roi_neto_medio = df_ciudad['net_roi'].mean()
-                col2.metric("ROI Neto medio (%)", f"{roi_neto_medio:.2f}")
-            else:
-                col2.metric("ROI Neto medio (%)", "Dato no disponible")
-        
-            # Verificar si 'price' existe
-            if 'price' in df_ciudad.columns and not df_ciudad['price'].isnull().all():
-                precio_medio = df_ciudad['price'].mean()
-                col3.metric("Precio medio alquiler (€)", f"{precio_medio:.2f}")
-            else:
-                col3.metric("Precio medio alquiler (€)", "Dato no disponible")
-        
-            # KDE ROI Bruto y Neto
-            st.markdown("#### Distribución de ROI Bruto y Neto (%)")
-            if len(df_ciudad) > 1 and 'roi' in df_ciudad.columns and 'net_roi' in df_ciudad.columns:
-                fig, ax = plt.subplots(figsize=(10, 5))
-                sns.kdeplot(df_ciudad['roi'], fill=True, label='ROI Bruto (%)', color='skyblue', bw_adjust=0.7, clip=(0, 50), ax=ax)
-                sns.kdeplot(df_ciudad['net_roi'], fill=True, label='ROI Neto (%)', color='orange', bw_adjust=0.7, clip=(0, 50), ax=ax)
-                ax.set_title('Distribución de ROI Bruto y Neto')
-                ax.set_xlabel('ROI (%)')
-                ax.set_ylabel('Densidad')
-                ax.set_xlim(0, 50)
-                ax.legend()
-                st.pyplot(fig)
-            else:
-                st.info("No hay suficientes datos para mostrar la distribución de ROI.")
+                return fig
+            mostrar_figura(f"fig_bar_{ciudad_actual}_374", HUELLA_SELECCION, construir_fig)
+        else:
+            st.info("No hay datos de tipo de alojamiento disponibles.")
 
-else:
-    st.info("No hay datos para mostrar en esta pestaña.")
+    elif ciudad_actual == "malaga":
+        st.subheader("Resumen General del Mercado Inmobiliario")
+
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Nº de anuncios", n_anuncios_seleccion)
+
+        # Verificar si 'net_roi' existe
+        if 'net_roi' in resumen_seleccion.index and resumen_seleccion.loc['net_roi', 'count'] > 0:
+            roi_neto_medio = resumen_seleccion.loc['net_roi', 'mean']
+            col2.metric("ROI Neto medio (%)", f"{roi_neto_medio:.2f}")
+        else:
+            col2.metric("ROI Neto medio (%)", "Dato no disponible")
+
+        # Verificar si 'price' existe
+        if 'price' in resumen_seleccion.index and resumen_seleccion.loc['price', 'count'] > 0:
+            precio_medio = resumen_seleccion.loc['price', 'mean']
+            col3.metric("Precio medio alquiler (€)", f"{precio_medio:.2f}")
+        else:
+            col3.metric("Precio medio alquiler (€)", "Dato no disponible")
+
+        # KDE ROI Bruto y Neto
+        st.markdown("#### Distribución de ROI Bruto y Neto (%)")
+        if len(df_ciudad) > 1 and 'roi' in df_ciudad.columns and 'net_roi' in df_ciudad.columns:
+            fig, ax = plt.subplots(figsize=(10, 5))
+            dibujar_kde_1d(ax, df_ciudad['roi'], color='skyblue', label='ROI Bruto (%)', bw_adjust=0.7, clip=(0, 50))
+            dibujar_kde_1d(ax, df_ciudad['net_roi'], color='orange', label='ROI Neto (%)', bw_adjust=0.7, clip=(0, 50))
+            ax.set_title('Distribución de ROI Bruto y Neto')
+            ax.set_xlabel('ROI (%)')
+            ax.set_ylabel('Densidad')
+            ax.set_xlim(0, 50)
+            ax.legend()
+            st.pyplot(fig)
+        else:
+            st.info("No hay suficientes datos para mostrar la distribución de ROI.")
 
 
 # ------------------ Pestaña 2: Precios de Vivienda ------------------
-with main_tabs[1]:
+def seccion_precios():
     if ciudad_actual.lower() == "valencia":
        
-        RUTA_MAPA = 'docs/mapa_precio_valencia.html'
-        RUTA_IMG = 'img/valencia_heatmap_ocupacion.png'
-
-
-        # El resto igual
-        crear_mapa_precios_valencia(df_ciudad, ruta_guardado=RUTA_MAPA)
-        crear_heatmap_ocupacion_valencia(df_ciudad, ruta_guardado=RUTA_IMG)
+        # Mapa e imagen cacheados por contenido: solo se regeneran si cambian los datos
+        tamano_hexagono = st.select_slider(
+            "Tamaño de celda del mapa de precios (m)", options=list(RESOLUCIONES_M),
+            value=RESOLUCIONES_M[1], key=f"hexagonos_{ciudad_actual}"
+        )
+        mapa_listo, RUTA_MAPA = artefacto(ciudad_actual, "precios", df_ciudad, tamano_m=tamano_hexagono)
+        RUTA_MAPA = RUTA_MAPA or 'docs/mapa_precio_valencia.html'
         
         st.title("Análisis de Vivienda en Valencia")
         st.subheader("Precios de Vivienda en Valencia")
@@ -422,46 +732,53 @@ with main_tabs[1]:
                 st.metric("Precio Mediano por Noche", f"{stats['50%']:.2f}€")
                 st.metric("Precio Máximo", f"{stats['max']:.2f}€")
 
-                fig = px.histogram(
-                    df_ciudad,
-                    x='price',
-                    nbins=50,
-                    title='Distribución de Precios por Noche',
-                    labels={'price': 'Precio (€)'},
-                    range_x=[0, stats['75%'] * 2] if stats['75%'] > 0 else None
-                )
-                st.plotly_chart(fig, use_container_width=True, key="hist_precio")
+                def construir_fig():
+                    fig = histograma(
+                        df_ciudad,
+                        x='price',
+                        nbins=50,
+                        title='Distribución de Precios por Noche',
+                        labels={'price': 'Precio (€)'},
+                        range_x=[0, stats['75%'] * 2] if stats['75%'] > 0 else None
+                    )
+                    return fig
+                mostrar_figura("hist_precio", HUELLA_SELECCION, construir_fig)
             else:
                 st.info("No hay datos de precios de alquiler disponibles.")
 
         with col2:
             if 'price' in df_ciudad.columns and 'room_type' in df_ciudad.columns:
-                fig_box = px.box(
-                    df_ciudad,
-                    x='room_type',
-                    y='price',
-                    title='Distribución de Precios por Tipo de Alojamiento',
-                    labels={'price': 'Precio por Noche (€)', 'room_type': 'Tipo de Alojamiento'}
-                )
-                st.plotly_chart(fig_box, use_container_width=True, key="box_room_type1")
-
-                avg_price_by_type = df_ciudad.groupby('room_type')['price'].mean().reset_index()
-                fig_bar = px.bar(
-                    avg_price_by_type,
-                    x='room_type',
-                    y='price',
-                    title='Precio Promedio por Tipo de Alojamiento',
-                    labels={'price': 'Precio Promedio (€)', 'room_type': 'Tipo de Alojamiento'}
-                )
-                st.plotly_chart(fig_bar, use_container_width=True, key=f"fig_bar_{ciudad_actual}_1")
+                def construir_fig_box():
+                    fig_box = cajas(
+                        df_ciudad,
+                        x='room_type',
+                        y='price',
+                        title='Distribución de Precios por Tipo de Alojamiento',
+                        labels={'price': 'Precio por Noche (€)', 'room_type': 'Tipo de Alojamiento'}
+                    )
+                    return fig_box
+                mostrar_figura("box_room_type1", HUELLA_SELECCION, construir_fig_box)
+
+                def construir_fig_bar():
+                    avg_price_by_type = df_ciudad.groupby('room_type', observed=True)['price'].mean().reset_index()
+                    fig_bar = px.bar(
+                        avg_price_by_type,
+                        x='room_type',
+                        y='price',
+                        title='Precio Promedio por Tipo de Alojamiento',
+                        labels={'price': 'Precio Promedio (€)', 'room_type': 'Tipo de Alojamiento'}
+                    )
+                    return fig_bar
+                mostrar_figura(f"fig_bar_{ciudad_actual}_1", HUELLA_SELECCION, construir_fig_bar)
             else:
                 st.info("No hay datos de precios por tipo de habitación disponibles.")
 
         st.subheader("Precios de Compra por Barrio")
         if 'precio' in df_inmobiliario.columns:
-            barrio_caros = df_inmobiliario.groupby('neighbourhood')['precio'].mean().reset_index()
-            barrio_caros = barrio_caros.sort_values(by='precio', ascending=False).head(15)
-            if not barrio_caros.empty:
+            def construir_fig_precio():
+                barrio_caros = top_barrios(load_cubo(ciudad_actual, "vivienda"), 'precio').reset_index()
+                if barrio_caros.empty:
+                    return None
                 fig_precio = px.bar(
                     barrio_caros,
                     x='precio',
@@ -470,17 +787,17 @@ with main_tabs[1]:
                     labels={'precio': 'Precio medio m2 de compra (€)', 'neighbourhood': 'Barrio'},
                     title='Top 15 barrios más caros por precio medio m2 de compra'
                 )
-                st.plotly_chart(fig_precio, use_container_width=True, key="bar_barrio_1")
-            else:
+                return fig_precio
+            if not mostrar_figura("bar_barrio_1", HUELLA_SELECCION, construir_fig_precio):
                 st.info("No hay datos de precios de vivienda para mostrar.")
         else:
             st.info("No hay datos de precios de vivienda para mostrar.")
 
         col1, col2, col3 = st.columns(3)
         with col1:
-            st.metric("Total de Propiedades", f"{len(df_ciudad):,}")
-            if 'price' in df_ciudad.columns:
-                st.metric("Precio Medio por Noche", f"{df_ciudad['price'].mean():.2f}€")
+            st.metric("Total de Propiedades", f"{n_anuncios_seleccion:,}")
+            if 'price' in resumen_seleccion.index:
+                st.metric("Precio Medio por Noche", f"{resumen_seleccion.loc['price', 'mean']:.2f}€")
         with col2:
             if 'room_type' in df_ciudad.columns:
                 room_counts = df_ciudad['room_type'].value_counts()
@@ -490,40 +807,48 @@ with main_tabs[1]:
                 st.info("No hay datos de tipos de habitación disponibles")
         with col3:
             if 'neighbourhood' in df_ciudad.columns:
-                st.metric("Barrios", f"{df_ciudad['neighbourhood'].nunique()}")
+                st.metric("Barrios", f"{len(cubo)}")
 
         st.subheader("Distribución Geográfica de Precios de Alquiler")
-        display_interactive_map(RUTA_MAPA, "Mapa de Precios en Valencia")
+        if mapa_listo:
+            display_interactive_map(RUTA_MAPA, "Mapa de Precios en Valencia")
+        else:
+            esperando_artefacto("El mapa de precios", "precios")
 
         st.subheader("Análisis de Mercado")
         col1, col2 = st.columns(2)
         with col1:
             if 'price' in df_ciudad.columns and 'room_type' in df_ciudad.columns:
-                fig = px.box(
-                    df_ciudad,
-                    x='room_type',
-                    y='price',
-                    title='Distribución de Precios por Tipo de Alojamiento',
-                    labels={'price': 'Precio por noche (€)', 'room_type': 'Tipo de Alojamiento'}
-                )
-                st.plotly_chart(fig, use_container_width=True, key="box_analisis1")
+                def construir_fig():
+                    fig = cajas(
+                        df_ciudad,
+                        x='room_type',
+                        y='price',
+                        title='Distribución de Precios por Tipo de Alojamiento',
+                        labels={'price': 'Precio por noche (€)', 'room_type': 'Tipo de Alojamiento'}
+                    )
+                    return fig
+                mostrar_figura("box_analisis1", HUELLA_SELECCION, construir_fig)
         with col2:
             if 'neighbourhood' in df_ciudad.columns:
-                top_barrios = df_ciudad['neighbourhood'].value_counts().head(10)
-                fig = px.bar(
-                    top_barrios,
-                    title='Top 10 Barrios con Más Propiedades',
-                    labels={'value': 'Número de Propiedades', 'index': 'Barrio'}
-                )
-                st.plotly_chart(fig, use_container_width=True, key="bar_barrios_1")
+                def construir_fig():
+                    barrios_top = df_ciudad['neighbourhood'].value_counts().head(10)
+                    fig = px.bar(
+                        barrios_top,
+                        title='Top 10 Barrios con Más Propiedades',
+                        labels={'value': 'Número de Propiedades', 'index': 'Barrio'}
+                    )
+                    return fig
+                mostrar_figura("bar_barrios_1", HUELLA_SELECCION, construir_fig)
 
     elif ciudad_actual.lower() == "malaga":
         st.subheader("Precios de Vivienda por Barrio")
 
         if 'price_per_m2' in df_malaga.columns:
-            barrio_caros = df_malaga.groupby('neighbourhood')['price_per_m2'].mean().reset_index()
-            barrio_caros = barrio_caros.sort_values(by='price_per_m2', ascending=False).head(15)
-            if not barrio_caros.empty:
+            def construir_fig_precio():
+                barrio_caros = top_barrios(cubo_ciudad, 'price_per_m2').reset_index()
+                if barrio_caros.empty:
+                    return None
                 fig_precio = px.bar(
                     barrio_caros,
                     x='price_per_m2',
@@ -532,9 +857,8 @@ with main_tabs[1]:
                     labels={'price_per_m2': 'Precio medio m2 de compra (€)', 'neighbourhood': 'Barrio'},
                     title='Top 15 barrios más caros por precio medio m2 de compra'
                 )
-                st.plotly_chart(fig_precio, use_container_width=True, key=f"fig_precio_{ciudad_actual}_629")
-
-            else:
+                return fig_precio
+            if not mostrar_figura(f"fig_precio_{ciudad_actual}_629", HUELLA_SELECCION, construir_fig_precio):
                 st.info("No hay datos de precios de vivienda para mostrar.")
         else:
             st.info("No hay datos de precios de vivienda para mostrar.")
@@ -548,147 +872,172 @@ with main_tabs[1]:
 
 # ------------------ Pestaña 3: Rentabilidad por Barrio ------------------
 
-if len(main_tabs) > 2:
-    with main_tabs[2]:
-        if ciudad_actual == "valencia":
-
-            # ----------------------------------------
-            # FUNCIONES DE STREAMLIT
-            # ----------------------------------------
-
-            def display_interactive_map(path, title=None):
-                try:
-                    with open(path, 'r', encoding='utf-8') as f:
-                        html_content = f.read()
-                        if title:
-                            st.markdown(f"**{title}**")
-                        components.html(html_content, height=600)
-                except FileNotFoundError:
-                    st.warning(f"No se pudo encontrar el archivo: {path}")
-
-            def display_image(path, caption=None):
-                try:
-                    image = Image.open(path)
-                    st.image(image, caption=caption, use_container_width=True)
-                except FileNotFoundError:
-                    st.warning(f"No se pudo encontrar la imagen: {path}")
-
-            # ----------------------------------------
-            # CARGA DE DATOS Y VISUALIZACIÓN DE GRÁFICOS
-            # ----------------------------------------
-
-            st.subheader("Rentabilidad por Barrio en Valencia")
-
-            if not df_ciudad.empty:
-
-                if 'Net ROI (%)' in df_ciudad.columns and 'neighbourhood' in df_ciudad.columns:
-                    roi_barrio = df_ciudad.groupby('neighbourhood')['Net ROI (%)'].mean().sort_values(ascending=False).head(15)
-                    if not roi_barrio.empty:
-                        fig_roi = px.bar(
-                            x=roi_barrio.values,
-                            y=roi_barrio.index,
-                            orientation='h',
-                            labels={'x': 'ROI Neto (%)', 'y': 'Barrio'},
-                            title='Top 15 barrios por ROI Neto (%)'
-                        )
-                        st.plotly_chart(fig_roi, use_container_width=True, key=f"fig_roi_neto_{ciudad_actual}")
-
-                if 'ROI (%)' in df_ciudad.columns and 'neighbourhood' in df_ciudad.columns:
-                    roi_barrio_bruto = df_ciudad.groupby('neighbourhood')['ROI (%)'].mean().sort_values(ascending=False).head(15)
-                    if not roi_barrio_bruto.empty:
-                        fig_roi_bruto = px.bar(
-                            roi_barrio_bruto,
-                            x=roi_barrio_bruto.values,
-                            y=roi_barrio_bruto.index,
-                            orientation='h',
-                            labels={'x': 'ROI Bruto (%)', 'y': 'neighbourhood'},
-                            title='Top 15 barrios por ROI Bruto (%)'
-                        )
-                        st.plotly_chart(fig_roi_bruto, use_container_width=True, key=f"fig_roi_bruto_{ciudad_actual}")
+def seccion_rentabilidad():
+    if ciudad_actual == "valencia":
 
-                # Verificación y generación del mapa si no existe
-                map_path = "docs/valencia_roi_by_type_map.html"
-                if not os.path.exists(map_path):
-                    crear_mapa_roi_por_tipo(df_ciudad, map_path)
+        # ----------------------------------------
+        # FUNCIONES DE STREAMLIT
+        # ----------------------------------------
 
-                st.markdown("#### Mapa de Rentabilidad")
-                display_interactive_map(map_path, "Mapa ROI por Tipo en Valencia")
+        def display_interactive_map(path, title=None):
+            if version(path) is None:
+                st.warning(f"No se pudo encontrar el archivo: {path}")
+                return
+            if title:
+                st.markdown(f"**{title}**")
+            incrustar_mapa(path)
+
+        def display_image(path, caption=None):
+            image = leer_imagen(path)
+            if image is None:
+                st.warning(f"No se pudo encontrar la imagen: {path}")
+                return
+            st.image(image, caption=caption, use_container_width=True)
 
-            else:
-                st.info("No hay datos para mostrar en esta pestaña.")
+        # ----------------------------------------
+        # CARGA DE DATOS Y VISUALIZACIÓN DE GRÁFICOS
+        # ----------------------------------------
 
+        st.subheader("Rentabilidad por Barrio en Valencia")
 
-        elif ciudad_actual == "malaga":
-            st.subheader("Rentabilidad por Barrio")
+        if not df_ciudad.empty:
 
-            if not df_ciudad.empty:
-                # ROI neto por barrio (Málaga)
-                roi_barrio = df_ciudad.groupby('neighbourhood')['net_roi'].mean().sort_values(ascending=False).head(15)
-                if not roi_barrio.empty:
+            if 'Net ROI (%)' in df_ciudad.columns and 'neighbourhood' in df_ciudad.columns:
+                def construir_fig_roi():
+                    roi_barrio = top_barrios(cubo, 'Net ROI (%)')
+                    if roi_barrio.empty:
+                        return None
                     fig_roi = px.bar(
-                        roi_barrio,
                         x=roi_barrio.values,
                         y=roi_barrio.index,
                         orientation='h',
                         labels={'x': 'ROI Neto (%)', 'y': 'Barrio'},
                         title='Top 15 barrios por ROI Neto (%)'
                     )
-                    st.plotly_chart(fig_roi, use_container_width=True, key="bar_1155")
-                else:
-                    st.info("No hay datos de ROI Neto para mostrar.")
-
-                # ROI bruto por barrio (Málaga)
-                roi_barrio_bruto = df_ciudad.groupby('neighbourhood')['roi'].mean().sort_values(ascending=False).head(15)
-                if not roi_barrio_bruto.empty:
+                    return fig_roi
+                mostrar_figura(f"fig_roi_neto_{ciudad_actual}", HUELLA_SELECCION, construir_fig_roi)
+
+            if 'ROI (%)' in df_ciudad.columns and 'neighbourhood' in df_ciudad.columns:
+                def construir_fig_roi_bruto():
+                    roi_barrio_bruto = top_barrios(cubo, 'ROI (%)')
+                    if roi_barrio_bruto.empty:
+                        return None
                     fig_roi_bruto = px.bar(
                         roi_barrio_bruto,
                         x=roi_barrio_bruto.values,
                         y=roi_barrio_bruto.index,
                         orientation='h',
-                        labels={'x': 'ROI Bruto (%)', 'y': 'Barrio'},
+                        labels={'x': 'ROI Bruto (%)', 'y': 'neighbourhood'},
                         title='Top 15 barrios por ROI Bruto (%)'
                     )
-                    st.plotly_chart(fig_roi_bruto, use_container_width=True, key="bar_1172")
-                else:
-                    st.info("No hay datos de ROI Bruto para mostrar.")
-            else:
-                st.info("No hay datos para mostrar en esta pestaña.")
+                    return fig_roi_bruto
+                mostrar_figura(f"fig_roi_bruto_{ciudad_actual}", HUELLA_SELECCION, construir_fig_roi_bruto)
+
+            # Mapa publicado en docs/; si falta, el generado en segundo plano
+            map_path = "docs/valencia_roi_by_type_map.html"
+            mapa_listo = True
+            if not os.path.exists(map_path):
+                mapa_listo, map_path = artefacto(ciudad_actual, "roi_tipo", df_ciudad)
+
+            st.markdown("#### Mapa de Rentabilidad")
+            if not mapa_listo:
+                esperando_artefacto("El mapa de ROI por tipo", "roi_tipo")
+            elif map_path:
+                display_interactive_map(map_path, "Mapa ROI por Tipo en Valencia")
+
+            if 'Net ROI (%)' in df_ciudad.columns and 'price' in df_ciudad.columns:
+                mostrar_mapa_barrios(ciudad_actual, df_ciudad)
+
+            mostrar_escenarios(ciudad_actual, selected_barrios)
+            mostrar_simulacion(ciudad_actual, selected_barrios)
+
+        else:
+            st.info("No hay datos para mostrar en esta pestaña.")
+
+
+    elif ciudad_actual == "malaga":
+        st.subheader("Rentabilidad por Barrio")
+
+        if not df_ciudad.empty:
+            # ROI neto por barrio (Málaga)
+            def construir_fig_roi():
+                roi_barrio = top_barrios(cubo, 'net_roi')
+                if roi_barrio.empty:
+                    return None
+                fig_roi = px.bar(
+                    roi_barrio,
+                    x=roi_barrio.values,
+                    y=roi_barrio.index,
+                    orientation='h',
+                    labels={'x': 'ROI Neto (%)', 'y': 'Barrio'},
+                    title='Top 15 barrios por ROI Neto (%)'
+                )
+                return fig_roi
+            if not mostrar_figura("bar_1155", HUELLA_SELECCION, construir_fig_roi):
+                st.info("No hay datos de ROI Neto para mostrar.")
+
+            # ROI bruto por barrio (Málaga)
+            def construir_fig_roi_bruto():
+                roi_barrio_bruto = top_barrios(cubo, 'roi')
+                if roi_barrio_bruto.empty:
+                    return None
+                fig_roi_bruto = px.bar(
+                    roi_barrio_bruto,
+                    x=roi_barrio_bruto.values,
+                    y=roi_barrio_bruto.index,
+                    orientation='h',
+                    labels={'x': 'ROI Bruto (%)', 'y': 'Barrio'},
+                    title='Top 15 barrios por ROI Bruto (%)'
+                )
+                return fig_roi_bruto
+            if not mostrar_figura("bar_1172", HUELLA_SELECCION, construir_fig_roi_bruto):
+                st.info("No hay datos de ROI Bruto para mostrar.")
+
+            mostrar_escenarios(ciudad_actual, selected_barrios)
+            mostrar_simulacion(ciudad_actual, selected_barrios)
+        else:
+            st.info("No hay datos para mostrar en esta pestaña.")
 
 
 
 # ------------------ Pestaña 4: Competencia y Demanda ------------------
 
-if len(main_tabs) > 3:
-    with main_tabs[3]:
-        if ciudad_actual == "valencia":
-        
-            st.subheader("Competencia y Demanda en Valencia")
-    
-            if df_ciudad.empty:
-                st.info("No hay datos para mostrar.")
-            else:
-                # --- Competencia ---
-                st.subheader("Competencia por barrio")
-                top_comp = df_ciudad.groupby('neighbourhood')['id'].count().sort_values(ascending=False).head(15)
-                if not top_comp.empty:
-                    fig_comp = px.bar(
-                        x=top_comp.values,
-                        y=top_comp.index,
-                        orientation='h',
-                        labels={'x': 'Nº de anuncios', 'y': 'Barrio'},
-                        title='Top 15 barrios con más competencia'
-                    )
-                    st.plotly_chart(fig_comp, use_container_width=True, key="bar_1265")
-    
-                # --- Mapa de Densidad de Alojamientos ---
-                st.subheader("Mapa de Oportunidad en Valencia")
-                mapa_path = os.path.join(DOCS_DIR, "mapa_oportunidad_valencia.html")
-                display_interactive_map(mapa_path, "Mapa de Rentabilidad")
-    
-                # --- Reseñas como indicador de demanda ---
-                st.subheader("Análisis de Reseñas")
-                if 'number_of_reviews' in df_ciudad.columns:
-                    top_reviews = df_ciudad.groupby('neighbourhood')['number_of_reviews'].sum().sort_values(ascending=False).head(15)
+def seccion_competencia():
+    if ciudad_actual == "valencia":
+
+        st.subheader("Competencia y Demanda en Valencia")
+
+        if df_ciudad.empty:
+            st.info("No hay datos para mostrar.")
+        else:
+            # --- Competencia ---
+            st.subheader("Competencia por barrio")
+            def construir_fig_comp():
+                top_comp = top_barrios(cubo, 'anuncios', 'size')
+                if top_comp.empty:
+                    return None
+                fig_comp = px.bar(
+                    x=top_comp.values,
+                    y=top_comp.index,
+                    orientation='h',
+                    labels={'x': 'Nº de anuncios', 'y': 'Barrio'},
+                    title='Top 15 barrios con más competencia'
+                )
+                return fig_comp
+            mostrar_figura("bar_1265", HUELLA_SELECCION, construir_fig_comp)
+
+            mostrar_competencia_local(ciudad_actual, df_ciudad)
+
+            # --- Mapa de Densidad de Alojamientos ---
+            st.subheader("Mapa de Oportunidad en Valencia")
+            mapa_path = os.path.join(DOCS_DIR, "mapa_oportunidad_valencia.html")
+            display_interactive_map(mapa_path, "Mapa de Rentabilidad")
+
+            # --- Reseñas como indicador de demanda ---
+            st.subheader("Análisis de Reseñas")
+            if 'number_of_reviews' in df_ciudad.columns:
+                def construir_fig_reviews():
+                    top_reviews = top_barrios(cubo, 'number_of_reviews', 'sum')
                     fig_reviews = px.bar(
                         x=top_reviews.values,
                         y=top_reviews.index,
@@ -696,19 +1045,24 @@ if len(main_tabs) > 3:
                         labels={'x': 'Número de reseñas', 'y': 'Barrio'},
                         title='Top 15 barrios por número de reseñas'
                     )
-                    st.plotly_chart(fig_reviews, use_container_width=True, key="bar_1283")
-    
-                    # Crear imagen de evolución antes de mostrarla
-                    img_reviews_path = os.path.join(IMG_DIR, "valencia_reviews_evolution.png")
-                    crear_evolucion_reseñas(df_ciudad, img_reviews_path)  # <-- función que debes tener o crear
+                    return fig_reviews
+                mostrar_figura("bar_1283", HUELLA_SELECCION, construir_fig_reviews)
+
+                # Imagen generada en segundo plano (precalculo.py)
+                imagen_lista, img_reviews_path = artefacto(ciudad_actual, "reseñas", df_ciudad)
+                if imagen_lista:
+                    img_reviews_path = img_reviews_path or os.path.join(IMG_DIR, "valencia_reviews_evolution.png")
                     display_image(img_reviews_path, "Evolución de reseñas en el tiempo")
                 else:
-                    st.info("No hay datos de reseñas disponibles.")
-    
-                # --- Ocupación estimada ---
-                st.subheader("Ocupación Estimada")
-                if 'days_rented' in df_ciudad.columns:
-                    top_ocup = df_ciudad.groupby('neighbourhood')['days_rented'].mean().sort_values(ascending=False).head(15)
+                    esperando_artefacto("La evolución de reseñas", "reseñas")
+            else:
+                st.info("No hay datos de reseñas disponibles.")
+
+            # --- Ocupación estimada ---
+            st.subheader("Ocupación Estimada")
+            if 'days_rented' in df_ciudad.columns:
+                def construir_fig_ocup():
+                    top_ocup = top_barrios(cubo, 'days_rented')
                     fig_ocup = px.bar(
                         x=top_ocup.values,
                         y=top_ocup.index,
@@ -716,111 +1070,117 @@ if len(main_tabs) > 3:
                         labels={'x': 'Días ocupados', 'y': 'Barrio'},
                         title='Top 15 barrios por ocupación estimada'
                     )
-                    st.plotly_chart(fig_ocup, use_container_width=True, key="bar_1303")
-    
-                    # Crear imagen de ocupación antes de mostrarla
-                    img_ocupacion_path = os.path.join(IMG_DIR, "valencia_ocupacion_diasemana.png")
-                    crear_heatmap_ocupacion_valencia(df_ciudad, img_ocupacion_path)
+                    return fig_ocup
+                mostrar_figura("bar_1303", HUELLA_SELECCION, construir_fig_ocup)
+
+                imagen_lista, img_ocupacion_path = artefacto(ciudad_actual, "ocupacion", df_ciudad)
+                if imagen_lista:
+                    img_ocupacion_path = img_ocupacion_path or os.path.join(IMG_DIR, "valencia_ocupacion_diasemana.png")
                     display_image(img_ocupacion_path, "Patrón de ocupación semanal")
                 else:
-                    st.info("No hay datos de ocupación.")
-
-
-        elif ciudad_actual == "malaga":
-            st.subheader("Competencia y Demanda por Barrio")
-
-            if not df_ciudad.empty:
-                # Competencia por barrio (Málaga)
-                # Competencia por barrio (Málaga)
-                competencia_por_barrio = df_ciudad.groupby('neighbourhood')['id'].count().reset_index().rename(columns={'id': 'n_anuncios'})
-                top_comp = competencia_por_barrio.sort_values(by='n_anuncios', ascending=False).head(15)
-                if not top_comp.empty:
-                    fig_comp = px.bar(
-                        top_comp,
-                        x='n_anuncios',
+                    esperando_artefacto("El mapa de ocupación", "ocupacion")
+            else:
+                st.info("No hay datos de ocupación.")
+
+
+    elif ciudad_actual == "malaga":
+        st.subheader("Competencia y Demanda por Barrio")
+
+        if not df_ciudad.empty:
+            # Competencia por barrio (Málaga)
+            # Competencia por barrio (Málaga)
+            def construir_fig_comp():
+                top_comp = top_barrios(cubo, 'anuncios', 'size').rename('n_anuncios').reset_index()
+                if top_comp.empty:
+                    return None
+                fig_comp = px.bar(
+                    top_comp,
+                    x='n_anuncios',
+                    y='neighbourhood',
+                    orientation='h',
+                    labels={'n_anuncios': 'Nº de anuncios', 'neighbourhood': 'Barrio'},
+                    title='Top 15 barrios con más competencia (nº de anuncios)'
+                )
+                return fig_comp
+            if not mostrar_figura("bar_1403", HUELLA_SELECCION, construir_fig_comp):
+                st.info("No hay datos de competencia para mostrar.")
+
+            mostrar_competencia_local(ciudad_actual, df_ciudad)
+
+            # Anuncios activos (>150 días ocupados/año, usando estimated_occupancy_l365d)
+            if 'estimated_occupancy_l365d' in df_ciudad.columns:
+                def construir_fig_activos():
+                    top_activos = top_barrios(cubo, 'activos', 'sum')
+                    top_activos = top_activos[top_activos > 0].rename('n_anuncios_activos').reset_index()
+                    if top_activos.empty:
+                        return None
+                    fig_activos = px.bar(
+                        top_activos,
+                        x='n_anuncios_activos',
                         y='neighbourhood',
                         orientation='h',
-                        labels={'n_anuncios': 'Nº de anuncios', 'neighbourhood': 'Barrio'},
-                        title='Top 15 barrios con más competencia (nº de anuncios)'
+                        labels={'n_anuncios_activos': 'Nº de anuncios activos', 'neighbourhood': 'Barrio'},
+                        title='Top 15 barrios con más anuncios activos (>150 días ocupados/año)'
+
                     )
-                    st.plotly_chart(fig_comp, use_container_width=True, key="bar_1403")
-                else:
-                    st.info("No hay datos de competencia para mostrar.")
-
-                # Anuncios activos (>150 días ocupados/año, usando estimated_occupancy_l365d)
-                if 'estimated_occupancy_l365d' in df_ciudad.columns:
-                    activos = df_ciudad[df_ciudad['estimated_occupancy_l365d'] > 150]
-                # Anuncios activos (>150 días ocupados/año, usando estimated_occupancy_l365d)
-                if 'estimated_occupancy_l365d' in df_ciudad.columns:
-                    activos = df_ciudad[df_ciudad['estimated_occupancy_l365d'] > 150]
-                    competencia_activa = activos.groupby('neighbourhood')['id'].count().reset_index().rename(columns={'id': 'n_anuncios_activos'})
-                    top_activos = competencia_activa.sort_values(by='n_anuncios_activos', ascending=False).head(15)
-                    if not top_activos.empty:
-                        fig_activos = px.bar(
-                            top_activos,
-                            x='n_anuncios_activos',
-                            y='neighbourhood',
-                            orientation='h',
-                            labels={'n_anuncios_activos': 'Nº de anuncios activos', 'neighbourhood': 'Barrio'},
-                            title='Top 15 barrios con más anuncios activos (>150 días ocupados/año)'
-                            
-                        )
-                        st.plotly_chart(fig_activos, use_container_width=True, key="bar_1425")
-                    else:
-                        st.info("No hay datos de anuncios activos para mostrar.")
-                else:
-                    st.info("No hay datos de ocupación estimada para mostrar anuncios activos.")
-                    st.info("No hay datos de ocupación estimada para mostrar anuncios activos.")
+                    return fig_activos
+                if not mostrar_figura("bar_1425", HUELLA_SELECCION, construir_fig_activos):
+                    st.info("No hay datos de anuncios activos para mostrar.")
             else:
-                st.info("No hay datos para mostrar en esta pestaña.")
+                st.info("No hay datos de ocupación estimada para mostrar anuncios activos.")
+                st.info("No hay datos de ocupación estimada para mostrar anuncios activos.")
+        else:
+            st.info("No hay datos para mostrar en esta pestaña.")
 
 
-        # elif ciudad_actual == "barcelona":
-        #     st.info("Si la ciudad es Barcelona añadir código aquí")
+    # elif ciudad_actual == "barcelona":
+    #     st.info("Si la ciudad es Barcelona añadir código aquí")
 
-        else:
-            st.info("No hay datos para mostrar en esta pestaña.")
-else:
-     st.warning("No hay pestañas disponibles para mostrar contenido.")
+    else:
+        st.info("No hay datos para mostrar en esta pestaña.")
 
 
 
 # ------------------ Pestaña 5: Análisis Avanzado ------------------
-if len(main_tabs) > 4:
-    with main_tabs[4]:
-        if ciudad_actual.lower() == "valencia":
-            st.subheader("Análisis Avanzado")
-            
-            if not df_valencia.empty:
-                columnas_corr = ['price', 'Net ROI (%)', 'review_scores_rating', 'days_rented']
-                columnas_corr = [col for col in columnas_corr if col in df_valencia.columns]
-                
-                if len(columnas_corr) > 1:
-                    mostrar_matriz_correlacion(df_valencia, columnas_corr)
-                else:
-                    st.info("No hay suficientes columnas para matriz de correlación.")
-                
-                mostrar_relacion_precio_calificacion(df_valencia)
-        
-                try:
-                    mostrar_mapa_perfiles(df_valencia)
-                except Exception as e:
-                    st.error(f"Error al mostrar el mapa de perfiles: {e}")
-        
-                mostrar_mapa_correlaciones(df_valencia)
-        
-                # Relación entre precio medio de alquiler y ROI neto por barrio
-                st.markdown("#### Relación entre precio medio de alquiler y ROI neto por barrio")
-        
-                if ('city' in df_valencia.columns 
-                    and df_valencia['city'].str.lower().nunique() == 1 
-                    and df_valencia['city'].str.lower().iloc[0] == 'valencia'):
-                    
-                    if 'price' in df_valencia.columns and 'Net ROI (%)' in df_valencia.columns:
-                        fig_val = px.scatter(
+def seccion_avanzado():
+    if ciudad_actual.lower() == "valencia":
+        st.subheader("Análisis Avanzado")
+
+        if not df_valencia.empty:
+            columnas_corr = ['price', 'Net ROI (%)', 'review_scores_rating', 'days_rented']
+            columnas_corr = [col for col in columnas_corr if col in df_valencia.columns]
+
+            if len(columnas_corr) > 1:
+                mostrar_matriz_correlacion(df_valencia, columnas_corr)
+            else:
+                st.info("No hay suficientes columnas para matriz de correlación.")
+
+            mostrar_relacion_precio_calificacion(df_valencia)
+
+            try:
+                mostrar_mapa_perfiles(df_valencia)
+            except Exception as e:
+                st.error(f"Error al mostrar el mapa de perfiles: {e}")
+
+            mostrar_mapa_correlaciones(df_valencia)
+
+            # Relación entre precio medio de alquiler y ROI neto por barrio
+            st.markdown("#### Relación entre precio medio de alquiler y ROI neto por barrio")
+
+            if ('city' in df_valencia.columns 
+                and df_valencia['city'].str.lower().nunique() == 1 
+                and df_valencia['city'].str.lower().iloc[0] == 'valencia'):
+
+                if 'price' in df_valencia.columns and 'Net ROI (%)' in df_valencia.columns:
+                    zona = zona_seleccionada("bar_1490")
+                    mostrar_zona(len(df_valencia), zona)
+                    def construir_fig_val():
+                        fig_val = dispersion(
                             df_valencia,
                             x='price',
                             y='Net ROI (%)',
+                            zona=zona,
+                            estratos='neighbourhood',
                             color='neighbourhood',
                             hover_data=['neighbourhood'],
                             opacity=0.6,
@@ -834,127 +1194,133 @@ if len(main_tabs) > 4:
                             height=500,
                             margin=dict(l=40, r=40, t=60, b=40)
                         )
-                        st.plotly_chart(fig_val, use_container_width=True, key="bar_1490")
-                    else:
-                        st.info("No hay datos suficientes para mostrar el gráfico de dispersión para Valencia.")
-                
+                        return fig_val
+                    mostrar_figura("bar_1490", huella_seleccion(HUELLA_SELECCION, zona), construir_fig_val, **OPCIONES_ZONA)
                 else:
-                    df_barrio = df_valencia.groupby('neighbourhood').agg({'price': 'mean', 'Net ROI (%)': 'mean'}).reset_index()
-                    if not df_barrio.empty:
-                        fig_scatter = px.scatter(
-                            df_barrio,
-                            x='price',
-                            y='Net ROI (%)',
-                            text='neighbourhood',
-                            labels={'price': 'Precio medio alquiler (€)', 'Net ROI (%)': 'ROI Neto (%)'},
-                            title='Precio medio de alquiler vs ROI Neto por barrio'
-                        )
-                        fig_scatter.update_traces(marker=dict(size=12, color='royalblue', line=dict(width=1, color='DarkSlateGrey')))
-                        fig_scatter.update_layout(
-                            height=500,
-                            margin=dict(l=40, r=40, t=60, b=40)
-                        )
-                        st.plotly_chart(fig_scatter, use_container_width=True, key="bar_1510")
-                    else:
-                        st.info("No hay datos para mostrar la relación entre precio y ROI.")
-            else:
-                st.info("No hay datos para Valencia.")
+                    st.info("No hay datos suficientes para mostrar el gráfico de dispersión para Valencia.")
 
-
-
-            # Número medio de amenities por barrio
-            st.markdown("#### Top 15 barrios por número medio de amenities")
-            if 'amenities' in df_valencia.columns:
-                df_valencia['n_amenities'] = df_valencia['amenities'].str.count(',') + 1
-                barrio_amenities = df_valencia.groupby('neighbourhood')['n_amenities'].mean().reset_index()
-                barrio_amenities = barrio_amenities.sort_values(by='n_amenities', ascending=False).head(15)
-                if not barrio_amenities.empty:
-                    fig_amenities = px.bar(
-                        barrio_amenities,
-                        x='n_amenities',
-                        y='neighbourhood',
-                        orientation='h',
-                        labels={'n_amenities': 'Nº medio de amenities', 'neighbourhood': 'Barrio'},
-                        title='Top 15 barrios por número medio de amenities',
-                        color='n_amenities',
-                        color_continuous_scale='Purples'
-                    )
-                    fig_amenities.update_layout(
-                        height=500,
-                        margin=dict(l=40, r=40, t=60, b=40),
-                        yaxis=dict(tickfont=dict(size=12)),
-                        xaxis=dict(tickfont=dict(size=12))
-                    )
-                    st.plotly_chart(fig_amenities, use_container_width=True, key="bar_1540")
-                else:
-                    st.info("No hay datos de amenities para mostrar.")
             else:
-                st.info("No hay datos de amenities para mostrar.") 
-
-            # Número total de reseñas por barrio
-            st.markdown("#### Top 15 barrios por número total de reseñas")
-            if 'number_of_reviews' in df_valencia.columns:
-                barrio_mas_resenas = df_valencia.groupby('neighbourhood')['number_of_reviews'].sum().reset_index()
-                barrio_mas_resenas = barrio_mas_resenas.sort_values(by='number_of_reviews', ascending=False).head(15)
-                if not barrio_mas_resenas.empty:
-                    fig_resenas = px.bar(
-                        barrio_mas_resenas,
-                        x='number_of_reviews',
-                        y='neighbourhood',
-                        orientation='h',
-                        labels={'number_of_reviews': 'Número total de reseñas', 'neighbourhood': 'Barrio'},
-                        title='Top 15 barrios por número total de reseñas',
-                        color='number_of_reviews',
-                        color_continuous_scale='Blues'
+                def construir_fig_scatter():
+                    df_barrio = estadistico(cubo_ciudad)[['price', 'Net ROI (%)']].reset_index()
+                    if df_barrio.empty:
+                        return None
+                    fig_scatter = px.scatter(
+                        df_barrio,
+                        x='price',
+                        y='Net ROI (%)',
+                        text='neighbourhood',
+                        labels={'price': 'Precio medio alquiler (€)', 'Net ROI (%)': 'ROI Neto (%)'},
+                        title='Precio medio de alquiler vs ROI Neto por barrio'
                     )
-                    fig_resenas.update_layout(
+                    fig_scatter.update_traces(marker=dict(size=12, color='royalblue', line=dict(width=1, color='DarkSlateGrey')))
+                    fig_scatter.update_layout(
                         height=500,
-                        margin=dict(l=40, r=40, t=60, b=40),
-                        yaxis=dict(tickfont=dict(size=12)),
-                        xaxis=dict(tickfont=dict(size=12))
+                        margin=dict(l=40, r=40, t=60, b=40)
                     )
-                    st.plotly_chart(fig_resenas, use_container_width=True, key="bar_1596")
-                else:
-                    st.info("No hay datos de reseñas para mostrar.")
-            else:
+                    return fig_scatter
+                if not mostrar_figura("bar_1510", HUELLA_SELECCION, construir_fig_scatter):
+                    st.info("No hay datos para mostrar la relación entre precio y ROI.")
+        else:
+            st.info("No hay datos para Valencia.")
+
+
+
+        # Número medio de amenities por barrio
+        st.markdown("#### Top 15 barrios por número medio de amenities")
+        if ('n_amenities', 'mean') in cubo_ciudad.columns:
+            def construir_fig_amenities():
+                barrio_amenities = top_barrios(cubo_ciudad, 'n_amenities').reset_index()
+                if barrio_amenities.empty:
+                    return None
+                fig_amenities = px.bar(
+                    barrio_amenities,
+                    x='n_amenities',
+                    y='neighbourhood',
+                    orientation='h',
+                    labels={'n_amenities': 'Nº medio de amenities', 'neighbourhood': 'Barrio'},
+                    title='Top 15 barrios por número medio de amenities',
+                    color='n_amenities',
+                    color_continuous_scale='Purples'
+                )
+                fig_amenities.update_layout(
+                    height=500,
+                    margin=dict(l=40, r=40, t=60, b=40),
+                    yaxis=dict(tickfont=dict(size=12)),
+                    xaxis=dict(tickfont=dict(size=12))
+                )
+                return fig_amenities
+            if not mostrar_figura("bar_1540", HUELLA_SELECCION, construir_fig_amenities):
+                st.info("No hay datos de amenities para mostrar.")
+        else:
+            st.info("No hay datos de amenities para mostrar.") 
+
+        # Número total de reseñas por barrio
+        st.markdown("#### Top 15 barrios por número total de reseñas")
+        if 'number_of_reviews' in df_valencia.columns:
+            def construir_fig_resenas():
+                barrio_mas_resenas = top_barrios(cubo_ciudad, 'number_of_reviews', 'sum').reset_index()
+                if barrio_mas_resenas.empty:
+                    return None
+                fig_resenas = px.bar(
+                    barrio_mas_resenas,
+                    x='number_of_reviews',
+                    y='neighbourhood',
+                    orientation='h',
+                    labels={'number_of_reviews': 'Número total de reseñas', 'neighbourhood': 'Barrio'},
+                    title='Top 15 barrios por número total de reseñas',
+                    color='number_of_reviews',
+                    color_continuous_scale='Blues'
+                )
+                fig_resenas.update_layout(
+                    height=500,
+                    margin=dict(l=40, r=40, t=60, b=40),
+                    yaxis=dict(tickfont=dict(size=12)),
+                    xaxis=dict(tickfont=dict(size=12))
+                )
+                return fig_resenas
+            if not mostrar_figura("bar_1596", HUELLA_SELECCION, construir_fig_resenas):
                 st.info("No hay datos de reseñas para mostrar.")
+        else:
+            st.info("No hay datos de reseñas para mostrar.")
+
+        # Habitaciones y baños por barrio
+        st.markdown("#### Top 15 barrios por número medio de habitaciones y baños")
+        if 'bedrooms' in df_valencia.columns and 'bathrooms' in df_valencia.columns:
+            def construir_fig_hab():
+                barrio_habitaciones_banos = (
+                    estadistico(cubo_ciudad)[['bedrooms', 'bathrooms']]
+                    .sort_values(by='bedrooms', ascending=False).head(15).reset_index()
+                )
+                if barrio_habitaciones_banos.empty:
+                    return None
+                fig_hab = px.bar(
+                    barrio_habitaciones_banos,
+                    x='bedrooms',
+                    y='neighbourhood',
+                    orientation='h',
+                    labels={'bedrooms': 'Habitaciones medias', 'neighbourhood': 'Barrio'},
+                    title='Top 15 barrios por número medio de habitaciones',
+                    color='bedrooms',
+                    color_continuous_scale='Teal'
+                )
+                fig_hab.update_layout(
+                    height=500,
+                    margin=dict(l=40, r=40, t=60, b=40),
+                    yaxis=dict(tickfont=dict(size=12)),
+                    xaxis=dict(tickfont=dict(size=12))
+                )
+                return fig_hab
+            if not mostrar_figura("bar_1654", HUELLA_SELECCION, construir_fig_hab):
+                st.info("No hay datos de habitaciones para mostrar.")
+        else:
+            st.info("No hay datos de habitaciones o baños para mostrar.")
 
-            # Habitaciones y baños por barrio
-            st.markdown("#### Top 15 barrios por número medio de habitaciones y baños")
-            if 'bedrooms' in df_valencia.columns and 'bathrooms' in df_valencia.columns:
-                barrio_habitaciones_banos = df_valencia.groupby('neighbourhood').agg({
-                    'bedrooms': 'mean',
-                    'bathrooms': 'mean'
-                }).reset_index()
-                barrio_habitaciones_banos = barrio_habitaciones_banos.sort_values(by='bedrooms', ascending=False).head(15)
-                if not barrio_habitaciones_banos.empty:
-                    fig_hab = px.bar(
-                        barrio_habitaciones_banos,
-                        x='bedrooms',
-                        y='neighbourhood',
-                        orientation='h',
-                        labels={'bedrooms': 'Habitaciones medias', 'neighbourhood': 'Barrio'},
-                        title='Top 15 barrios por número medio de habitaciones',
-                        color='bedrooms',
-                        color_continuous_scale='Teal'
-                    )
-                    fig_hab.update_layout(
-                        height=500,
-                        margin=dict(l=40, r=40, t=60, b=40),
-                        yaxis=dict(tickfont=dict(size=12)),
-                        xaxis=dict(tickfont=dict(size=12))
-                    )
-                    st.plotly_chart(fig_hab, use_container_width=True, key="bar_1654")
-                else:
-                    st.info("No hay datos de habitaciones para mostrar.")
-            else:
-                st.info("No hay datos de habitaciones o baños para mostrar.")
 
-          
-            # Histograma de precios de alquiler
-            st.markdown("#### Histograma de precios de alquiler")
-            if 'price' in df_valencia.columns:
-                fig_hist = px.histogram(
+        # Histograma de precios de alquiler
+        st.markdown("#### Histograma de precios de alquiler")
+        if 'price' in df_valencia.columns:
+            def construir_fig_hist():
+                fig_hist = histograma(
                     df_valencia, x='price', nbins=40, color='neighbourhood',
                     labels={'price': 'Precio alquiler (€)'},
                     title='Distribución de precios de alquiler por barrio',
@@ -967,17 +1333,19 @@ if len(main_tabs) > 4:
                     yaxis=dict(tickfont=dict(size=12)),
                     barmode='overlay'
                 )
-                st.plotly_chart(fig_hist, use_container_width=True, key="bar_1725")
-            else:
-                st.info("No hay datos de precios para mostrar histograma.")
+                return fig_hist
+            mostrar_figura("bar_1725", HUELLA_SELECCION, construir_fig_hist)
+        else:
+            st.info("No hay datos de precios para mostrar histograma.")
 
-           
-            # Boxplot de precios de alquiler por barrio (solo top 15 barrios)
-            st.markdown("#### Boxplot de precios de alquiler por barrio (Top 15)")
-            if 'price' in df_valencia.columns:
-                top_barrios = df_valencia['neighbourhood'].value_counts().head(15).index
-                df_top = df_valencia[df_valencia['neighbourhood'].isin(top_barrios)]
-                fig_box = px.box(
+
+        # Boxplot de precios de alquiler por barrio (solo top 15 barrios)
+        st.markdown("#### Boxplot de precios de alquiler por barrio (Top 15)")
+        if 'price' in df_valencia.columns:
+            def construir_fig_box():
+                barrios_top = df_valencia['neighbourhood'].value_counts().head(15).index
+                df_top = df_valencia[df_valencia['neighbourhood'].isin(barrios_top)]
+                fig_box = cajas(
                     df_top, x='neighbourhood', y='price', points='outliers',
                     labels={'price': 'Precio alquiler (€)', 'neighbourhood': 'Barrio'},
                     title='Boxplot de precios de alquiler por barrio (Top 15)'
@@ -988,15 +1356,17 @@ if len(main_tabs) > 4:
                     xaxis=dict(tickangle=45, tickfont=dict(size=12)),
                     yaxis=dict(tickfont=dict(size=12))
                 )
-                st.plotly_chart(fig_box, use_container_width=True, key="bar_1764")
-            else:
-                st.info("No hay datos de precios para mostrar boxplot.")
+                return fig_box
+            mostrar_figura("bar_1764", HUELLA_SELECCION, construir_fig_box)
+        else:
+            st.info("No hay datos de precios para mostrar boxplot.")
 
-           
-            # Histograma de ROI Neto
-            st.markdown("#### Histograma de ROI Neto (%)")
-            if 'Net ROI (%)' in df_valencia.columns:
-                fig_hist_roi = px.histogram(
+
+        # Histograma de ROI Neto
+        st.markdown("#### Histograma de ROI Neto (%)")
+        if 'Net ROI (%)' in df_valencia.columns:
+            def construir_fig_hist_roi():
+                fig_hist_roi = histograma(
                     df_valencia, x='Net ROI (%)', nbins=40, color='neighbourhood',
                     labels={'Net ROI (%)': 'ROI Neto (%)'},
                     title='Distribución de ROI Neto por barrio',
@@ -1009,17 +1379,19 @@ if len(main_tabs) > 4:
                     yaxis=dict(tickfont=dict(size=12)),
                     barmode='overlay'
                 )
-                st.plotly_chart(fig_hist_roi, use_container_width=True, key="bar_1803")
-            else:
-                st.info("No hay datos de ROI Neto para mostrar histograma.")
+                return fig_hist_roi
+            mostrar_figura("bar_1803", HUELLA_SELECCION, construir_fig_hist_roi)
+        else:
+            st.info("No hay datos de ROI Neto para mostrar histograma.")
 
-          
-            # Boxplot de ROI Neto por barrio (solo top 15 barrios)
-            st.markdown("#### Boxplot de ROI Neto por barrio (Top 15)")
-            if 'Net ROI (%)' in df_valencia.columns:
-                top_barrios = df_valencia['neighbourhood'].value_counts().head(15).index
-                df_top = df_valencia[df_valencia['neighbourhood'].isin(top_barrios)]
-                fig_box_roi = px.box(
+
+        # Boxplot de ROI Neto por barrio (solo top 15 barrios)
+        st.markdown("#### Boxplot de ROI Neto por barrio (Top 15)")
+        if 'Net ROI (%)' in df_valencia.columns:
+            def construir_fig_box_roi():
+                barrios_top = df_valencia['neighbourhood'].value_counts().head(15).index
+                df_top = df_valencia[df_valencia['neighbourhood'].isin(barrios_top)]
+                fig_box_roi = cajas(
                     df_top, x='neighbourhood', y='Net ROI (%)', points='outliers',
                     labels={'Net ROI (%)': 'ROI Neto (%)', 'neighbourhood': 'Barrio'},
                     title='Boxplot de ROI Neto por barrio (Top 15)'
@@ -1030,14 +1402,16 @@ if len(main_tabs) > 4:
                     xaxis=dict(tickangle=45, tickfont=dict(size=12)),
                     yaxis=dict(tickfont=dict(size=12))
                 )
-                st.plotly_chart(fig_box_roi, use_container_width=True, key="bar_1842")
-            else:
-                st.info("No hay datos de ROI Neto para mostrar boxplot.")
+                return fig_box_roi
+            mostrar_figura("bar_1842", HUELLA_SELECCION, construir_fig_box_roi)
+        else:
+            st.info("No hay datos de ROI Neto para mostrar boxplot.")
 
-         # Histograma de días alquilados
-            st.markdown("#### Histograma de días alquilados")
-            if 'days_rented' in df_valencia.columns:
-                fig_hist_days = px.histogram(
+     # Histograma de días alquilados
+        st.markdown("#### Histograma de días alquilados")
+        if 'days_rented' in df_valencia.columns:
+            def construir_fig_hist_days():
+                fig_hist_days = histograma(
                     df_valencia, x='days_rented', nbins=40, color='neighbourhood',
                     labels={'days_rented': 'Días alquilados'},
                     title='Distribución de días alquilados por barrio',
@@ -1050,16 +1424,18 @@ if len(main_tabs) > 4:
                     yaxis=dict(tickfont=dict(size=12)),
                     barmode='overlay'
                 )
-                st.plotly_chart(fig_hist_days, use_container_width=True, key="bar_1862")
-            else:
-                st.info("No hay datos de días alquilados para mostrar histograma.")
-            
-            # Boxplot de días alquilados por barrio (Top 15)
-            st.markdown("#### Boxplot de días alquilados por barrio (Top 15)")
-            if 'days_rented' in df_valencia.columns:
-                top_barrios = df_valencia['neighbourhood'].value_counts().head(15).index
-                df_top = df_valencia[df_valencia['neighbourhood'].isin(top_barrios)]
-                fig_box_days = px.box(
+                return fig_hist_days
+            mostrar_figura("bar_1862", HUELLA_SELECCION, construir_fig_hist_days)
+        else:
+            st.info("No hay datos de días alquilados para mostrar histograma.")
+
+        # Boxplot de días alquilados por barrio (Top 15)
+        st.markdown("#### Boxplot de días alquilados por barrio (Top 15)")
+        if 'days_rented' in df_valencia.columns:
+            def construir_fig_box_days():
+                barrios_top = df_valencia['neighbourhood'].value_counts().head(15).index
+                df_top = df_valencia[df_valencia['neighbourhood'].isin(barrios_top)]
+                fig_box_days = cajas(
                     df_top, x='neighbourhood', y='days_rented', points='outliers',
                     labels={'days_rented': 'Días alquilados', 'neighbourhood': 'Barrio'},
                     title='Boxplot de días alquilados por barrio (Top 15)'
@@ -1070,70 +1446,76 @@ if len(main_tabs) > 4:
                     xaxis=dict(tickangle=45, tickfont=dict(size=12)),
                     yaxis=dict(tickfont=dict(size=12))
                 )
-                st.plotly_chart(fig_box_days, use_container_width=True, key="bar_1901")
-            else:
-                st.info("No hay datos de días alquilados para mostrar boxplot.")
-            
-            # Delincuencia: Gráfico de barras agrupadas
-            st.markdown("#### Delitos denunciados en Valencia por año")
-            if df_delincuencia is not None and not df_delincuencia.empty:
-                df_delincuencia_filtrado = df_delincuencia[df_delincuencia['Parámetro'] != 'Total']
-                
-                fig, ax = plt.subplots(figsize=(14, 7))
-                sns.barplot(
-                    data=df_delincuencia_filtrado,
-                    x='Año',
-                    y='Denuncias',
-                    hue='Parámetro',
-                    ax=ax
-                )
-                ax.set_title('Delitos denunciados en Valencia por año')
-                ax.set_ylabel('Número de denuncias')
-                ax.set_xlabel('Año')
-                ax.legend(title='Tipo de delito', bbox_to_anchor=(1.05, 1), loc='upper left')
-                plt.tight_layout()
-                st.pyplot(fig)
-            
-                # Mapa de calor
-                st.markdown("#### Mapa de calor de delitos denunciados en Valencia por tipo y año")
-                fig2, ax2 = plt.subplots(figsize=(14, 7))
-                heatmap_data = df_delincuencia_filtrado.pivot_table(
-                    index='Parámetro',
-                    columns='Año',
-                    values='Denuncias',
-                    aggfunc='sum'
-                ).fillna(0)
-                sns.heatmap(
-                    heatmap_data,
-                    cmap='YlOrRd',
-                    annot=True,
-                    fmt='.0f',
-                    linewidths=.5,
-                    cbar_kws={'label': 'Número de denuncias'},
-                    annot_kws={"size": 10},
-                    ax=ax2
-                )
-                ax2.set_title('Mapa de calor de delitos denunciados en Valencia por tipo y año')
-                ax2.set_xlabel('Año')
-                ax2.set_ylabel('Tipo de delito')
-                plt.xticks(rotation=45)
-                plt.tight_layout()
-                st.pyplot(fig2)
-            else:
-                st.info("No hay datos de delincuencia para mostrar.")
-
+                return fig_box_days
+            mostrar_figura("bar_1901", HUELLA_SELECCION, construir_fig_box_days)
+        else:
+            st.info("No hay datos de días alquilados para mostrar boxplot.")
+
+        # Delincuencia: Gráfico de barras agrupadas
+        st.markdown("#### Delitos denunciados en Valencia por año")
+        if df_delincuencia is not None and not df_delincuencia.empty:
+            df_delincuencia_filtrado = df_delincuencia[df_delincuencia['Parámetro'] != 'Total']
+
+            fig, ax = plt.subplots(figsize=(14, 7))
+            sns.barplot(
+                data=df_delincuencia_filtrado,
+                x='Año',
+                y='Denuncias',
+                hue='Parámetro',
+                ax=ax
+            )
+            ax.set_title('Delitos denunciados en Valencia por año')
+            ax.set_ylabel('Número de denuncias')
+            ax.set_xlabel('Año')
+            ax.legend(title='Tipo de delito', bbox_to_anchor=(1.05, 1), loc='upper left')
+            plt.tight_layout()
+            st.pyplot(fig)
+
+            # Mapa de calor
+            st.markdown("#### Mapa de calor de delitos denunciados en Valencia por tipo y año")
+            fig2, ax2 = plt.subplots(figsize=(14, 7))
+            heatmap_data = df_delincuencia_filtrado.pivot_table(
+                index='Parámetro',
+                columns='Año',
+                values='Denuncias',
+                aggfunc='sum'
+            ).fillna(0)
+            sns.heatmap(
+                heatmap_data,
+                cmap='YlOrRd',
+                annot=True,
+                fmt='.0f',
+                linewidths=.5,
+                cbar_kws={'label': 'Número de denuncias'},
+                annot_kws={"size": 10},
+                ax=ax2
+            )
+            ax2.set_title('Mapa de calor de delitos denunciados en Valencia por tipo y año')
+            ax2.set_xlabel('Año')
+            ax2.set_ylabel('Tipo de delito')
+            plt.xticks(rotation=45)
+            plt.tight_layout()
+            st.pyplot(fig2)
+        else:
+            st.info("No hay datos de delincuencia para mostrar.")
 
-        elif ciudad_actual.lower() == "malaga":
-            st.subheader("Análisis Avanzado")
 
-            if not df_malaga.empty:
-                # Relación entre precio medio de alquiler y ROI neto por barrio
-                st.markdown("#### Relación entre precio medio de alquiler y ROI neto por barrio")
-                if 'price' in df_malaga.columns and 'net_roi' in df_malaga.columns:
-                    fig_malaga = px.scatter(
+    elif ciudad_actual.lower() == "malaga":
+        st.subheader("Análisis Avanzado")
+
+        if not df_malaga.empty:
+            # Relación entre precio medio de alquiler y ROI neto por barrio
+            st.markdown("#### Relación entre precio medio de alquiler y ROI neto por barrio")
+            if 'price' in df_malaga.columns and 'net_roi' in df_malaga.columns:
+                zona = zona_seleccionada("bar_2337")
+                mostrar_zona(len(df_malaga), zona)
+                def construir_fig_malaga():
+                    fig_malaga = dispersion(
                         df_malaga,
                         x='price',
                         y='net_roi',
+                        zona=zona,
+                        estratos='neighbourhood',
                         color='neighbourhood',
                         hover_data=['neighbourhood'],
                         opacity=0.6,
@@ -1147,106 +1529,106 @@ if len(main_tabs) > 4:
                         height=500,
                         margin=dict(l=40, r=40, t=60, b=40)
                     )
-                    st.plotly_chart(fig_malaga, use_container_width=True, key="bar_2337")
-                else:
-                    st.info("No hay datos suficientes para mostrar el gráfico de dispersión para Málaga.")
-
-                # Número medio de amenities por barrio
-                st.markdown("#### Top 15 barrios por número medio de amenities")
-                if 'amenities' in df_malaga.columns:
-                    # Convertir string de lista a lista real si es necesario
-                    if df_malaga['amenities'].apply(lambda x: isinstance(x, str) and x.startswith('[')).all():
-                        df_malaga['n_amenities'] = df_malaga['amenities'].apply(lambda x: len(eval(x)) if pd.notnull(x) else 0)
-                    else:
-                        df_malaga['n_amenities'] = df_malaga['amenities'].str.count(',') + 1
-                    barrio_amenities = df_malaga.groupby('neighbourhood')['n_amenities'].mean().reset_index()
-                    barrio_amenities = barrio_amenities.sort_values(by='n_amenities', ascending=False).head(15)
-                    if not barrio_amenities.empty:
-                        fig_amenities = px.bar(
-                            barrio_amenities,
-                            x='n_amenities',
-                            y='neighbourhood',
-                            orientation='h',
-                            labels={'n_amenities': 'Nº medio de amenities', 'neighbourhood': 'Barrio'},
-                            title='Top 15 barrios por número medio de amenities',
-                            color='n_amenities',
-                            color_continuous_scale='Purples'
-                        )
-                        fig_amenities.update_layout(
-                            height=500,
-                            margin=dict(l=40, r=40, t=60, b=40),
-                            yaxis=dict(tickfont=dict(size=12)),
-                            xaxis=dict(tickfont=dict(size=12))
-                        )
-                        st.plotly_chart(fig_amenities, use_container_width=True, key="bar_2368")
-                    else:
-                        st.info("No hay datos de amenities para mostrar.")
-                else:
+                    return fig_malaga
+                mostrar_figura("bar_2337", huella_seleccion(HUELLA_SELECCION, zona), construir_fig_malaga, **OPCIONES_ZONA)
+            else:
+                st.info("No hay datos suficientes para mostrar el gráfico de dispersión para Málaga.")
+
+            # Número medio de amenities por barrio
+            st.markdown("#### Top 15 barrios por número medio de amenities")
+            if ('n_amenities', 'mean') in cubo_ciudad.columns:
+                def construir_fig_amenities():
+                    barrio_amenities = top_barrios(cubo_ciudad, 'n_amenities').reset_index()
+                    if barrio_amenities.empty:
+                        return None
+                    fig_amenities = px.bar(
+                        barrio_amenities,
+                        x='n_amenities',
+                        y='neighbourhood',
+                        orientation='h',
+                        labels={'n_amenities': 'Nº medio de amenities', 'neighbourhood': 'Barrio'},
+                        title='Top 15 barrios por número medio de amenities',
+                        color='n_amenities',
+                        color_continuous_scale='Purples'
+                    )
+                    fig_amenities.update_layout(
+                        height=500,
+                        margin=dict(l=40, r=40, t=60, b=40),
+                        yaxis=dict(tickfont=dict(size=12)),
+                        xaxis=dict(tickfont=dict(size=12))
+                    )
+                    return fig_amenities
+                if not mostrar_figura("bar_2368", HUELLA_SELECCION, construir_fig_amenities):
                     st.info("No hay datos de amenities para mostrar.")
+            else:
+                st.info("No hay datos de amenities para mostrar.")
 
-                # Número total de reseñas por barrio
-                st.markdown("#### Top 15 barrios por número total de reseñas")
-                if 'number_of_reviews' in df_malaga.columns:
-                    barrio_mas_resenas = df_malaga.groupby('neighbourhood')['number_of_reviews'].sum().reset_index()
-                    barrio_mas_resenas = barrio_mas_resenas.sort_values(by='number_of_reviews', ascending=False).head(15)
-                    if not barrio_mas_resenas.empty:
-                        fig_resenas = px.bar(
-                            barrio_mas_resenas,
-                            x='number_of_reviews',
-                            y='neighbourhood',
-                            orientation='h',
-                            labels={'number_of_reviews': 'Número total de reseñas', 'neighbourhood': 'Barrio'},
-                            title='Top 15 barrios por número total de reseñas',
-                            color='number_of_reviews',
-                            color_continuous_scale='Blues'
-                        )
-                        fig_resenas.update_layout(
-                            height=500,
-                            margin=dict(l=40, r=40, t=60, b=40),
-                            yaxis=dict(tickfont=dict(size=12)),
-                            xaxis=dict(tickfont=dict(size=12))
-                        )
-                        st.plotly_chart(fig_resenas, use_container_width=True, key="bar_2396")
-                    else:
-                        st.info("No hay datos de reseñas para mostrar.")
-                else:
+            # Número total de reseñas por barrio
+            st.markdown("#### Top 15 barrios por número total de reseñas")
+            if 'number_of_reviews' in df_malaga.columns:
+                def construir_fig_resenas():
+                    barrio_mas_resenas = top_barrios(cubo_ciudad, 'number_of_reviews', 'sum').reset_index()
+                    if barrio_mas_resenas.empty:
+                        return None
+                    fig_resenas = px.bar(
+                        barrio_mas_resenas,
+                        x='number_of_reviews',
+                        y='neighbourhood',
+                        orientation='h',
+                        labels={'number_of_reviews': 'Número total de reseñas', 'neighbourhood': 'Barrio'},
+                        title='Top 15 barrios por número total de reseñas',
+                        color='number_of_reviews',
+                        color_continuous_scale='Blues'
+                    )
+                    fig_resenas.update_layout(
+                        height=500,
+                        margin=dict(l=40, r=40, t=60, b=40),
+                        yaxis=dict(tickfont=dict(size=12)),
+                        xaxis=dict(tickfont=dict(size=12))
+                    )
+                    return fig_resenas
+                if not mostrar_figura("bar_2396", HUELLA_SELECCION, construir_fig_resenas):
                     st.info("No hay datos de reseñas para mostrar.")
+            else:
+                st.info("No hay datos de reseñas para mostrar.")
 
-                # Habitaciones y baños por barrio
-                st.markdown("#### Top 15 barrios por número medio de habitaciones y baños")
-                if 'bedrooms' in df_malaga.columns and 'bathrooms' in df_malaga.columns:
-                    barrio_habitaciones_banos = df_malaga.groupby('neighbourhood').agg({
-                        'bedrooms': 'mean',
-                        'bathrooms': 'mean'
-                    }).reset_index()
-                    barrio_habitaciones_banos = barrio_habitaciones_banos.sort_values(by='bedrooms', ascending=False).head(15)
-                    if not barrio_habitaciones_banos.empty:
-                        fig_hab = px.bar(
-                            barrio_habitaciones_banos,
-                            x='bedrooms',
-                            y='neighbourhood',
-                            orientation='h',
-                            labels={'bedrooms': 'Habitaciones medias', 'neighbourhood': 'Barrio'},
-                            title='Top 15 barrios por número medio de habitaciones',
-                            color='bedrooms',
-                            color_continuous_scale='Teal'
-                        )
-                        fig_hab.update_layout(
-                            height=500,
-                            margin=dict(l=40, r=40, t=60, b=40),
-                            yaxis=dict(tickfont=dict(size=12)),
-                            xaxis=dict(tickfont=dict(size=12))
-                        )
-                        st.plotly_chart(fig_hab, use_container_width=True, key="bar_2427")
-                    else:
-                        st.info("No hay datos de habitaciones para mostrar.")
-                else:
-                    st.info("No hay datos de habitaciones o baños para mostrar.")
+            # Habitaciones y baños por barrio
+            st.markdown("#### Top 15 barrios por número medio de habitaciones y baños")
+            if 'bedrooms' in df_malaga.columns and 'bathrooms' in df_malaga.columns:
+                def construir_fig_hab():
+                    barrio_habitaciones_banos = (
+                        estadistico(cubo_ciudad)[['bedrooms', 'bathrooms']]
+                        .sort_values(by='bedrooms', ascending=False).head(15).reset_index()
+                    )
+                    if barrio_habitaciones_banos.empty:
+                        return None
+                    fig_hab = px.bar(
+                        barrio_habitaciones_banos,
+                        x='bedrooms',
+                        y='neighbourhood',
+                        orientation='h',
+                        labels={'bedrooms': 'Habitaciones medias', 'neighbourhood': 'Barrio'},
+                        title='Top 15 barrios por número medio de habitaciones',
+                        color='bedrooms',
+                        color_continuous_scale='Teal'
+                    )
+                    fig_hab.update_layout(
+                        height=500,
+                        margin=dict(l=40, r=40, t=60, b=40),
+                        yaxis=dict(tickfont=dict(size=12)),
+                        xaxis=dict(tickfont=dict(size=12))
+                    )
+                    return fig_hab
+                if not mostrar_figura("bar_2427", HUELLA_SELECCION, construir_fig_hab):
+                    st.info("No hay datos de habitaciones para mostrar.")
+            else:
+                st.info("No hay datos de habitaciones o baños para mostrar.")
 
-                # Histograma de precios de alquiler
-                st.markdown("#### Histograma de precios de alquiler")
-                if 'price' in df_malaga.columns:
-                    fig_hist = px.histogram(
+            # Histograma de precios de alquiler
+            st.markdown("#### Histograma de precios de alquiler")
+            if 'price' in df_malaga.columns:
+                def construir_fig_hist():
+                    fig_hist = histograma(
                         df_malaga, x='price', nbins=40, color='neighbourhood',
                         labels={'price': 'Precio alquiler (€)'},
                         title='Distribución de precios de alquiler por barrio',
@@ -1259,16 +1641,18 @@ if len(main_tabs) > 4:
                         yaxis=dict(tickfont=dict(size=12)),
                         barmode='overlay'
                     )
-                    st.plotly_chart(fig_hist, use_container_width=True, key="bar_2449")
-                else:
-                    st.info("No hay datos de precios para mostrar histograma.")
-
-                # Boxplot de precios de alquiler por barrio (solo top 15 barrios)
-                st.markdown("#### Boxplot de precios de alquiler por barrio (Top 15)")
-                if 'price' in df_malaga.columns:
-                    top_barrios = df_malaga['neighbourhood'].value_counts().head(15).index
-                    df_top = df_malaga[df_malaga['neighbourhood'].isin(top_barrios)]
-                    fig_box = px.box(
+                    return fig_hist
+                mostrar_figura("bar_2449", HUELLA_SELECCION, construir_fig_hist)
+            else:
+                st.info("No hay datos de precios para mostrar histograma.")
+
+            # Boxplot de precios de alquiler por barrio (solo top 15 barrios)
+            st.markdown("#### Boxplot de precios de alquiler por barrio (Top 15)")
+            if 'price' in df_malaga.columns:
+                def construir_fig_box():
+                    barrios_top = df_malaga['neighbourhood'].value_counts().head(15).index
+                    df_top = df_malaga[df_malaga['neighbourhood'].isin(barrios_top)]
+                    fig_box = cajas(
                         df_top, x='neighbourhood', y='price', points='outliers',
                         labels={'price': 'Precio alquiler (€)', 'neighbourhood': 'Barrio'},
                         title='Boxplot de precios de alquiler por barrio (Top 15)'
@@ -1279,14 +1663,16 @@ if len(main_tabs) > 4:
                         xaxis=dict(tickangle=45, tickfont=dict(size=12)),
                         yaxis=dict(tickfont=dict(size=12))
                     )
-                    st.plotly_chart(fig_box, use_container_width=True, key="bar_2469")
-                else:
-                    st.info("No hay datos de precios para mostrar boxplot.")
+                    return fig_box
+                mostrar_figura("bar_2469", HUELLA_SELECCION, construir_fig_box)
+            else:
+                st.info("No hay datos de precios para mostrar boxplot.")
 
-                # Histograma de ROI Neto
-                st.markdown("#### Histograma de ROI Neto (%)")
-                if 'net_roi' in df_malaga.columns:
-                    fig_hist_roi = px.histogram(
+            # Histograma de ROI Neto
+            st.markdown("#### Histograma de ROI Neto (%)")
+            if 'net_roi' in df_malaga.columns:
+                def construir_fig_hist_roi():
+                    fig_hist_roi = histograma(
                         df_malaga, x='net_roi', nbins=40, color='neighbourhood',
                         labels={'net_roi': 'ROI Neto (%)'},
                         title='Distribución de ROI Neto por barrio',
@@ -1299,16 +1685,18 @@ if len(main_tabs) > 4:
                         yaxis=dict(tickfont=dict(size=12)),
                         barmode='overlay'
                     )
-                    st.plotly_chart(fig_hist_roi, use_container_width=True, key="bar_2489")
-                else:
-                    st.info("No hay datos de ROI Neto para mostrar histograma.")
-
-                # Boxplot de ROI Neto por barrio (solo top 15 barrios)
-                st.markdown("#### Boxplot de ROI Neto por barrio (Top 15)")
-                if 'net_roi' in df_malaga.columns:
-                    top_barrios = df_malaga['neighbourhood'].value_counts().head(15).index
-                    df_top = df_malaga[df_malaga['neighbourhood'].isin(top_barrios)]
-                    fig_box_roi = px.box(
+                    return fig_hist_roi
+                mostrar_figura("bar_2489", HUELLA_SELECCION, construir_fig_hist_roi)
+            else:
+                st.info("No hay datos de ROI Neto para mostrar histograma.")
+
+            # Boxplot de ROI Neto por barrio (solo top 15 barrios)
+            st.markdown("#### Boxplot de ROI Neto por barrio (Top 15)")
+            if 'net_roi' in df_malaga.columns:
+                def construir_fig_box_roi():
+                    barrios_top = df_malaga['neighbourhood'].value_counts().head(15).index
+                    df_top = df_malaga[df_malaga['neighbourhood'].isin(barrios_top)]
+                    fig_box_roi = cajas(
                         df_top, x='neighbourhood', y='net_roi', points='outliers',
                         labels={'net_roi': 'ROI Neto (%)', 'neighbourhood': 'Barrio'},
                         title='Boxplot de ROI Neto por barrio (Top 15)'
@@ -1319,14 +1707,16 @@ if len(main_tabs) > 4:
                         xaxis=dict(tickangle=45, tickfont=dict(size=12)),
                         yaxis=dict(tickfont=dict(size=12))
                     )
-                    st.plotly_chart(fig_box_roi, use_container_width=True, key="bar_2509")
-                else:
-                    st.info("No hay datos de ROI Neto para mostrar boxplot.")
+                    return fig_box_roi
+                mostrar_figura("bar_2509", HUELLA_SELECCION, construir_fig_box_roi)
+            else:
+                st.info("No hay datos de ROI Neto para mostrar boxplot.")
 
-                # Histograma de ocupación estimada
-                st.markdown("#### Histograma de ocupación estimada (días al año)")
-                if 'estimated_occupancy_l365d' in df_malaga.columns:
-                    fig_hist_days = px.histogram(
+            # Histograma de ocupación estimada
+            st.markdown("#### Histograma de ocupación estimada (días al año)")
+            if 'estimated_occupancy_l365d' in df_malaga.columns:
+                def construir_fig_hist_days():
+                    fig_hist_days = histograma(
                         df_malaga, x='estimated_occupancy_l365d', nbins=40, color='neighbourhood',
                         labels={'estimated_occupancy_l365d': 'Días ocupados'},
                         title='Distribución de días ocupados por barrio',
@@ -1339,16 +1729,18 @@ if len(main_tabs) > 4:
                         yaxis=dict(tickfont=dict(size=12)),
                         barmode='overlay'
                     )
-                    st.plotly_chart(fig_hist_days, use_container_width=True, key="bar_2529")
-                else:
-                    st.info("No hay datos de ocupación estimada para mostrar histograma.")
-
-                # Boxplot de ocupación estimada por barrio (solo top 15 barrios)
-                st.markdown("#### Boxplot de ocupación estimada por barrio (Top 15)")
-                if 'estimated_occupancy_l365d' in df_malaga.columns:
-                        top_barrios = df_malaga['neighbourhood'].value_counts().head(15).index
-                        df_top = df_malaga[df_malaga['neighbourhood'].isin(top_barrios)]
-                        fig_box_days = px.box(
+                    return fig_hist_days
+                mostrar_figura("bar_2529", HUELLA_SELECCION, construir_fig_hist_days)
+            else:
+                st.info("No hay datos de ocupación estimada para mostrar histograma.")
+
+            # Boxplot de ocupación estimada por barrio (solo top 15 barrios)
+            st.markdown("#### Boxplot de ocupación estimada por barrio (Top 15)")
+            if 'estimated_occupancy_l365d' in df_malaga.columns:
+                    def construir_fig_box_days():
+                        barrios_top = df_malaga['neighbourhood'].value_counts().head(15).index
+                        df_top = df_malaga[df_malaga['neighbourhood'].isin(barrios_top)]
+                        fig_box_days = cajas(
                             df_top, x='neighbourhood', y='estimated_occupancy_l365d', points='outliers',
                             labels={'estimated_occupancy_l365d': 'Días ocupados', 'neighbourhood': 'Barrio'},
                             title='Boxplot de días ocupados por barrio (Top 15)'
@@ -1359,68 +1751,69 @@ if len(main_tabs) > 4:
                             xaxis=dict(tickangle=45, tickfont=dict(size=12)),
                             yaxis=dict(tickfont=dict(size=12))
                         )
-                        st.plotly_chart(fig_box_days, use_container_width=True, key="bar_2549")
-                else:
-                    st.info("No hay datos de ocupación estimada para mostrar boxplot.")
-
-
-                # Delincuencia: Gráfico de barras agrupadas y heatmap
-                st.markdown("#### Delitos denunciados en Málaga por año")
-                if df_malaga_crimen is not None and not df_malaga_crimen.empty:
-                    if 'crime_type' in df_malaga_crimen.columns and 'year' in df_malaga_crimen.columns and 'reported_cases' in df_malaga_crimen.columns:
-                        df_malaga_crimen_filtrado = df_malaga_crimen.copy()
-                        fig, ax = plt.subplots(figsize=(14, 7))
-                        sns.barplot(
-                            data=df_malaga_crimen_filtrado,
-                            x='year',
-                            y='reported_cases',
-                            hue='crime_type',
-                            ax=ax
-                        )
-                        ax.set_title('Delitos denunciados en Málaga por año')
-                        ax.set_ylabel('Número de denuncias')
-                        ax.set_xlabel('Año')
-                        ax.legend(title='Tipo de delito', bbox_to_anchor=(1.05, 1), loc='upper left')
-                        plt.tight_layout()
-                        st.pyplot(fig)
-
-                        st.markdown("#### Mapa de calor de delitos denunciados en Málaga por tipo y año")
-                        fig2, ax2 = plt.subplots(figsize=(14, 7))
-                        heatmap_data = df_malaga_crimen_filtrado.pivot_table(
-                            index='crime_type',
-                            columns='year',
-                            values='reported_cases',
-                            aggfunc='sum'
-                        ).fillna(0)
-                        sns.heatmap(
-                            heatmap_data,
-                            cmap='YlOrRd',
-                            annot=True,
-                            fmt='.0f',
-                            linewidths=.5,
-                            cbar_kws={'label': 'Número de denuncias'},
-                            annot_kws={"size": 10},
-                            ax=ax2
-                        )
-                        ax2.set_title('Mapa de calor de delitos denunciados en Málaga por tipo y año')
-                        ax2.set_xlabel('Año')
-                        ax2.set_ylabel('Tipo de delito')
-                        plt.xticks(rotation=45)
-                        plt.tight_layout()
-                        st.pyplot(fig2)
-                    else:
-                        st.info("No hay columnas adecuadas de delincuencia para mostrar.")
+                        return fig_box_days
+                    mostrar_figura("bar_2549", HUELLA_SELECCION, construir_fig_box_days)
+            else:
+                st.info("No hay datos de ocupación estimada para mostrar boxplot.")
+
+
+            # Delincuencia: Gráfico de barras agrupadas y heatmap
+            st.markdown("#### Delitos denunciados en Málaga por año")
+            if df_malaga_crimen is not None and not df_malaga_crimen.empty:
+                if 'crime_type' in df_malaga_crimen.columns and 'year' in df_malaga_crimen.columns and 'reported_cases' in df_malaga_crimen.columns:
+                    df_malaga_crimen_filtrado = df_malaga_crimen.copy()
+                    fig, ax = plt.subplots(figsize=(14, 7))
+                    sns.barplot(
+                        data=df_malaga_crimen_filtrado,
+                        x='year',
+                        y='reported_cases',
+                        hue='crime_type',
+                        ax=ax
+                    )
+                    ax.set_title('Delitos denunciados en Málaga por año')
+                    ax.set_ylabel('Número de denuncias')
+                    ax.set_xlabel('Año')
+                    ax.legend(title='Tipo de delito', bbox_to_anchor=(1.05, 1), loc='upper left')
+                    plt.tight_layout()
+                    st.pyplot(fig)
+
+                    st.markdown("#### Mapa de calor de delitos denunciados en Málaga por tipo y año")
+                    fig2, ax2 = plt.subplots(figsize=(14, 7))
+                    heatmap_data = df_malaga_crimen_filtrado.pivot_table(
+                        index='crime_type',
+                        columns='year',
+                        values='reported_cases',
+                        aggfunc='sum'
+                    ).fillna(0)
+                    sns.heatmap(
+                        heatmap_data,
+                        cmap='YlOrRd',
+                        annot=True,
+                        fmt='.0f',
+                        linewidths=.5,
+                        cbar_kws={'label': 'Número de denuncias'},
+                        annot_kws={"size": 10},
+                        ax=ax2
+                    )
+                    ax2.set_title('Mapa de calor de delitos denunciados en Málaga por tipo y año')
+                    ax2.set_xlabel('Año')
+                    ax2.set_ylabel('Tipo de delito')
+                    plt.xticks(rotation=45)
+                    plt.tight_layout()
+                    st.pyplot(fig2)
                 else:
-                    st.info("No hay datos de delincuencia para mostrar.")
+                    st.info("No hay columnas adecuadas de delincuencia para mostrar.")
             else:
-                st.info("No hay datos para mostrar en esta pestaña.")
-
-        elif ciudad_actual.lower() == "barcelona":
-            st.subheader("Análisis Avanzado de Barcelona")
-
+                st.info("No hay datos de delincuencia para mostrar.")
         else:
             st.info("No hay datos para mostrar en esta pestaña.")
 
+    elif ciudad_actual.lower() == "barcelona":
+        st.subheader("Análisis Avanzado de Barcelona")
+
+    else:
+        st.info("No hay datos para mostrar en esta pestaña.")
+
 # ------------------ Pestaña 6: Conclusiones ------------------
 
 # Función para mostrar conclusiones por ciudad
@@ -1450,6 +1843,9 @@ def mostrar_conclusiones(ciudad_actual, ciudad_seleccionada):
         st.markdown("---")
 
         try:
+            # Se genera al pedirlo (antes se escribía al importar maps_utils en cada worker)
+            if not os.path.exists("mapa_completo_valencia.html"):
+                crear_mapa_valencia()
             display_interactive_map("mapa_completo_valencia.html", "Recomendaciones Estratégicas por Barrio - Valencia")
         except Exception as e:
             st.warning(f"No se pudo cargar el mapa de recomendaciones estratégicas: {e}")
@@ -1478,20 +1874,17 @@ Invertir en zonas con demanda estable, alto ROI y competencia controlada.
         st.info(f"Conclusiones para {ciudad_seleccionada} no implementadas.")
 
 
-# Uso de la función en la pestaña 6 (índice 5)
-if len(main_tabs) > 5:
-    with main_tabs[5]:
-        mostrar_conclusiones(ciudad_actual, ciudad_seleccionada)
+def seccion_conclusiones():
+    mostrar_conclusiones(ciudad_actual, ciudad_seleccionada)
 
 
 
 
 # Pestaña 7: Conclusiones Generales
 # Pestaña 7: Conclusiones Generales
-if len(main_tabs) > 6:
-    with main_tabs[6]:
-        st.title("🧭 Conclusiones Generales: Estrategia de Inversión por Ciudad")
-        st.markdown("""
+def seccion_conclusiones_generales():
+    st.title("🧭 Conclusiones Generales: Estrategia de Inversión por Ciudad")
+    st.markdown("""
 **Resumen Ejecutivo**
 
 Tras analizar el mercado de alquiler turístico en Barcelona, Málaga y Valencia, la estrategia de inversión propuesta para el fondo familiar de 5 millones de euros es la siguiente:
@@ -1503,8 +1896,9 @@ Tras analizar el mercado de alquiler turístico en Barcelona, Málaga y Valencia
 La estrategia equilibra agresividad en Málaga, solidez en Valencia y prudencia táctica en Barcelona.
         """)
 
-        # Gráfico 1: Distribución del presupuesto recomendado
-        st.subheader("Distribución Recomendada del Presupuesto de Inversión")
+    # Gráfico 1: Distribución del presupuesto recomendado
+    st.subheader("Distribución Recomendada del Presupuesto de Inversión")
+    def construir_fig_pie():
         presupuesto = pd.DataFrame({
             "Ciudad": ["Málaga", "Valencia", "Barcelona"],
             "Porcentaje": [40, 30, 20]
@@ -1517,18 +1911,23 @@ La estrategia equilibra agresividad en Málaga, solidez en Valencia y prudencia
             color_discrete_sequence=px.colors.qualitative.Pastel,
             title="Distribución del presupuesto (%)"
         )
-        st.plotly_chart(fig_pie, use_container_width=True, key="bar_2773")
-
-        # Gráfico 2: Comparativa de ROI Neto Medio (si los datos están cargados)
-        st.subheader("Comparativa de ROI Neto Medio por Ciudad")
-        roi_data = []
-        if df_malaga is not None and not df_malaga.empty:
-            roi_data.append({"Ciudad": "Málaga", "ROI Neto (%)": df_malaga['net_roi'].mean()})
-        if df_valencia is not None and not df_valencia.empty:
-            roi_data.append({"Ciudad": "Valencia", "ROI Neto (%)": df_valencia['Net ROI (%)'].mean()})
-        if df_barcelona is not None and not df_barcelona.empty and 'Net ROI (%)' in df_barcelona.columns:
-            roi_data.append({"Ciudad": "Barcelona", "ROI Neto (%)": df_barcelona['Net ROI (%)'].mean()})
-        if roi_data:
+        return fig_pie
+    # Reparto fijo: no depende de la ciudad ni de los filtros
+    mostrar_figura("bar_2773", huella_seleccion(), construir_fig_pie)
+
+    # Gráfico 2: Comparativa de ROI Neto Medio (si los datos están cargados)
+    st.subheader("Comparativa de ROI Neto Medio por Ciudad")
+    roi_data = []
+    for ciudad, nombre, columna_roi in [
+        ("malaga", "Málaga", "net_roi"),
+        ("valencia", "Valencia", "Net ROI (%)"),
+        ("barcelona", "Barcelona", "Net ROI (%)"),
+    ]:
+        roi_medio = roi_neto_medio(ciudad, columna_roi)
+        if roi_medio is not None:
+            roi_data.append({"Ciudad": nombre, "ROI Neto (%)": roi_medio})
+    if roi_data:
+        def construir_fig_bar():
             df_roi = pd.DataFrame(roi_data)
             fig_bar = px.bar(
                 df_roi,
@@ -1538,13 +1937,16 @@ La estrategia equilibra agresividad en Málaga, solidez en Valencia y prudencia
                 color_discrete_sequence=px.colors.qualitative.Pastel,
                 title="ROI Neto Medio por Ciudad"
             )
-            st.plotly_chart(fig_bar, use_container_width=True, key=f"fig_bar_{ciudad_actual}_3")
-        else:
-            st.info("No hay datos suficientes para mostrar la comparativa de ROI.")
+            return fig_bar
+        # Depende de las tres ciudades, no de la seleccionada: la huella son los propios ROI medios
+        huella_roi = huella_seleccion(*((d["Ciudad"], d["ROI Neto (%)"]) for d in roi_data))
+        mostrar_figura("fig_bar_roi_ciudades", huella_roi, construir_fig_bar)
+    else:
+        st.info("No hay datos suficientes para mostrar la comparativa de ROI.")
 
-        # Tabla resumen de barrios recomendados
-        st.subheader("Barrios Recomendados por Ciudad")
-        st.markdown("""
+    # Tabla resumen de barrios recomendados
+    st.subheader("Barrios Recomendados por Ciudad")
+    st.markdown("""
 | Ciudad    | Barrios Recomendados                                      | Tipo de Inmueble Sugerido         | Precio Aproximado  |
 |-----------|----------------------------------------------------------|----------------------------------|-------------------|
 | Málaga    | Bailen-Miraflores, Churriana, Puerto de la Torre         | Piso completo, 2 hab, 1-2 baños  | 180,000 - 250,000 |
@@ -1552,7 +1954,7 @@ La estrategia equilibra agresividad en Málaga, solidez en Valencia y prudencia
 | Barcelona | Solo con licencia existente (diversos barrios)           | Piso con licencia                | Según oportunidad |
         """)
 
-        st.markdown("""
+    st.markdown("""
 **Conclusión:**  
 La diversificación entre Málaga y Valencia permite aprovechar el potencial de crecimiento y rentabilidad, mientras que la cautela en Barcelona protege el capital ante cambios regulatorios.  
 La clave será la gestión activa, la selección de barrios con demanda sostenida y la adaptación a la normativa y tendencias del mercado. 
@@ -1561,6 +1963,19 @@ La clave será la gestión activa, la selección de barrios con demanda sostenid
 Seleccionar barrios con alta rentabilidad, demanda estable y competencia controlada. Apostar por calidad y diversificación es clave.
         """)
 
+# ------------------ Sección visible ------------------
+# Cada pestaña es una función; las demás no se ejecutan (sus cachés siguen vivas)
+SECCIONES = {
+    "📊 Resumen General": seccion_resumen,
+    "🏠 Precios de Vivienda": seccion_precios,
+    "💸 Rentabilidad por Barrio": seccion_rentabilidad,
+    "📈 Competencia y Demanda": seccion_competencia,
+    "🔍 Análisis Avanzado": seccion_avanzado,
+    "📝 Conclusiones": seccion_conclusiones,
+    "🧭 Conclusiones Generales": seccion_conclusiones_generales,
+}
+SECCIONES[seccion]()
+
 
 # ------------------ Descargable ------------------
 with st.expander("Ver y descargar datos filtrados"):
@@ -1577,6 +1992,21 @@ with st.expander("Ver y descargar datos filtrados"):
         st.info("No hay datos para mostrar o descargar.")
 
 
+# ------------ Memoria de los datos cargados ------------
+informe_mem = datos_ciudad.get("informe_memoria")
+if informe_mem is not None and informe_mem['bytes_antes'].sum() > 0:
+    with st.sidebar.expander("Uso de memoria de los datos"):
+        total_antes = informe_mem['bytes_antes'].sum()
+        total_despues = informe_mem['bytes_despues'].sum()
+        st.metric(
+            "Anuncios en memoria",
+            f"{total_despues / 1e6:.1f} MB",
+            f"{total_antes / max(total_despues, 1):.1f}x menos que sin tipar",
+            delta_color="off"
+        )
+        st.dataframe(informe_mem, use_container_width=True)
+
+
 # ------------ Información del dashboard ------------
 # Sidebar de información
 st.sidebar.info(
@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+import sys
+import threading
+import types
+
+import pandas as pd
+
+
+# Mapas e imágenes generados a partir de los datos, en la raíz del proyecto
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "artefactos")
+MAX_ARTEFACTOS = 64
+MAX_BYTES = 512 * 1024 * 1024
+# Se sube a mano para invalidar todos los artefactos (p. ej. si cambia una dependencia)
+VERSION = 1
+# Candados repartidos por clave: memoria fija, sea cual sea el nº de artefactos
+N_CANDADOS = 64
+
+_APP_DIR = os.path.dirname(os.path.abspath(__file__))
+_candados = [threading.Lock() for _ in range(N_CANDADOS)]
+
+
+def huella_frame(df, columnas=None):
+    """SHA-1 de las filas (valores e índice) y del esquema de ``df``"""
+    if columnas is not None:
+        df = df[[c for c in columnas if c in df.columns]]
+    h = hashlib.sha1()
+    h.update(json.dumps([[str(c), str(t)] for c, t in df.dtypes.items()]).encode("utf-8"))
+    h.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def _del_proyecto(funcion):
+    modulo = sys.modules.get(getattr(funcion, "__module__", None))
+    ruta = getattr(modulo, "__file__", None)
+    return ruta is not None and os.path.dirname(os.path.abspath(ruta)) == _APP_DIR
+
+
+def _actualizar_codigo(h, codigo):
+    # Las funciones anidadas (lambdas, closures) se recorren en lugar de usar su
+    # repr, que lleva la dirección de memoria y cambiaría en cada proceso
+    h.update(codigo.co_code)
+    for constante in codigo.co_consts:
+        if isinstance(constante, types.CodeType):
+            _actualizar_codigo(h, constante)
+        else:
+            h.update(repr(constante).encode("utf-8"))
+
+
+def _huella_codigo(funcion, h, vistas):
+    """Código de ``funcion`` y de las funciones del proyecto a las que llama, recursivamente"""
+    if funcion in vistas:
+        return
+    vistas.add(funcion)
+    h.update(f"{funcion.__module__}.{funcion.__qualname__}".encode("utf-8"))
+    _actualizar_codigo(h, funcion.__code__)
+    pendientes = [funcion.__code__]
+    while pendientes:
+        codigo = pendientes.pop()
+        pendientes += [c for c in codigo.co_consts if isinstance(c, types.CodeType)]
+        for nombre in codigo.co_names:
+            auxiliar = funcion.__globals__.get(nombre)
+            if isinstance(auxiliar, types.FunctionType) and _del_proyecto(auxiliar):
+                _huella_codigo(auxiliar, h, vistas)
+
+
+def clave_artefacto(funcion, df, columnas=None, **params):
+    """Clave de contenido: filas de entrada + código de la función y sus auxiliares + parámetros"""
+    h = hashlib.sha1()
+    h.update(f"v{VERSION}".encode("ascii"))
+    # Si cambia el código de la función o de una auxiliar del proyecto, cambia la clave
+    _huella_codigo(funcion, h, set())
+    h.update(huella_frame(df, columnas).encode("ascii"))
+    h.update(json.dumps(params, sort_keys=True, default=str).encode("utf-8"))
+    return h.hexdigest()
+
+
+def _candado(clave):
+    return _candados[int(clave[:8], 16) % N_CANDADOS]
+
+
+def _desalojar(conservar):
+    # LRU por mtime: cada acierto hace touch del archivo
+    try:
+        # Los temporales en curso empiezan por "." y no cuentan
+        entradas = [e for e in os.scandir(CACHE_DIR) if e.is_file() and not e.name.startswith(".")]
+    except OSError:
+        return
+    entradas.sort(key=lambda e: e.stat().st_mtime, reverse=True)
+    total = 0
+    for i, entrada in enumerate(entradas):
+        total += entrada.stat().st_size
+        if entrada.path != conservar and (i >= MAX_ARTEFACTOS or total > MAX_BYTES):
+            try:
+                os.remove(entrada.path)
+            except OSError:
+                pass
+
+
+def obtener_artefacto(funcion, df, extension, columnas=None, **params):
+    """Ruta del archivo que genera ``funcion(df, ruta, **params)``, reutilizado mientras no cambien sus entradas.
+
+    ``columnas`` limita el hash a las columnas que usa la función. El archivo se
+    escribe en un temporal propio de cada proceso/hilo y se publica con
+    ``os.replace``, así que sesiones concurrentes nunca leen uno a medias.
+    Devuelve None si la función no generó nada (p. ej. sin datos).
+    """
+    clave = clave_artefacto(funcion, df, columnas, **params)
+    ruta = os.path.join(CACHE_DIR, f"{funcion.__name__}-{clave[:20]}{extension}")
+
+    with _candado(clave):
+        if os.path.exists(ruta):
+            try:
+                os.utime(ruta)
+            except OSError:
+                pass
+            return ruta
+
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        # La extensión va al final para que folium/matplotlib elijan bien el formato
+        tmp = os.path.join(CACHE_DIR, f".{clave[:20]}.{os.getpid()}.{threading.get_ident()}.tmp{extension}")
+        try:
+            funcion(df, tmp, **params)
+            if not os.path.exists(tmp):
+                return None
+            os.replace(tmp, ruta)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    _desalojar(conservar=ruta)
+    return ruta
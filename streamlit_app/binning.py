@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+
+
+RADIO_TIERRA_M = 6_371_008.8
+
+# Radio (centro a vértice) de los hexágonos de cada resolución, en metros
+RESOLUCIONES_M = (150, 300, 600, 1200)
+
+_RAIZ3 = np.sqrt(3.0)
+
+
+def proyectar_metros(lat, lon, origen=None):
+    """Proyección equirectangular local en metros, precisa a escala de ciudad.
+
+    ``origen`` es (lat, lon); por defecto el centro de los puntos. Devuelve x, y
+    y el origen usado, para poder deshacer la proyección con ``desproyectar``.
+    """
+    lat = np.asarray(lat, dtype="float64")
+    lon = np.asarray(lon, dtype="float64")
+    if origen is None:
+        origen = (float(np.nanmean(lat)), float(np.nanmean(lon)))
+    lat0, lon0 = origen
+    x = np.radians(lon - lon0) * np.cos(np.radians(lat0)) * RADIO_TIERRA_M
+    y = np.radians(lat - lat0) * RADIO_TIERRA_M
+    return x, y, origen
+
+
+def desproyectar(x, y, origen):
+    lat0, lon0 = origen
+    lat = lat0 + np.degrees(np.asarray(y) / RADIO_TIERRA_M)
+    lon = lon0 + np.degrees(np.asarray(x) / (RADIO_TIERRA_M * np.cos(np.radians(lat0))))
+    return lat, lon
+
+
+def _hexagono(x, y, tamano):
+    """Coordenadas axiales (q, r) del hexágono (punta arriba) que contiene cada punto"""
+    q = (_RAIZ3 / 3 * x - y / 3) / tamano
+    r = (2 / 3 * y) / tamano
+    # Redondeo en coordenadas cúbicas: se corrige el eje con mayor error
+    s = -q - r
+    rq, rr, rs = np.round(q), np.round(r), np.round(s)
+    dq, dr, ds = np.abs(rq - q), np.abs(rr - r), np.abs(rs - s)
+    corregir_q = (dq > dr) & (dq > ds)
+    corregir_r = ~corregir_q & (dr > ds)
+    rq = np.where(corregir_q, -rr - rs, rq)
+    rr = np.where(corregir_r, -rq - rs, rr)
+    return rq.astype("int64"), rr.astype("int64")
+
+
+def agregar_hexagonos(
+    df,
+    tamano_m=RESOLUCIONES_M[1],
+    precio="price",
+    roi="Net ROI (%)",
+    ocupacion="days_rented",
+    origen=None,
+):
+    """Agrega los anuncios en una rejilla hexagonal de ``tamano_m`` metros.
+
+    Devuelve un DataFrame con una fila por hexágono ocupado: q, r, centro
+    (lat, lon), n_anuncios, precio_medio, roi_mediano y ocupacion_media. Las
+    columnas de métricas que no existan se devuelven vacías.
+    """
+    validos = df.dropna(subset=["latitude", "longitude"])
+    x, y, origen = proyectar_metros(validos["latitude"], validos["longitude"], origen)
+    q, r = _hexagono(x, y, tamano_m)
+
+    datos = pd.DataFrame({"q": q, "r": r}, index=validos.index)
+    metricas = {"precio_medio": (precio, "mean"), "roi_mediano": (roi, "median"), "ocupacion_media": (ocupacion, "mean")}
+    for nombre, (columna, _) in metricas.items():
+        datos[nombre] = validos[columna].astype("float64") if columna in validos.columns else np.nan
+
+    celdas = datos.groupby(["q", "r"], sort=False).agg(
+        n_anuncios=("q", "size"),
+        **{nombre: (nombre, func) for nombre, (_, func) in metricas.items()},
+    ).reset_index()
+
+    cx = tamano_m * (_RAIZ3 * celdas["q"] + _RAIZ3 / 2 * celdas["r"])
+    cy = tamano_m * 1.5 * celdas["r"]
+    celdas["lat"], celdas["lon"] = desproyectar(cx.to_numpy(), cy.to_numpy(), origen)
+    celdas.attrs.update(tamano_m=tamano_m, origen=origen)
+    return celdas
+
+
+def geojson_hexagonos(celdas, decimales=5):
+    """FeatureCollection con el polígono de cada hexágono y sus métricas como propiedades"""
+    tamano_m, origen = celdas.attrs["tamano_m"], celdas.attrs["origen"]
+    cx = tamano_m * (_RAIZ3 * celdas["q"].to_numpy() + _RAIZ3 / 2 * celdas["r"].to_numpy())
+    cy = tamano_m * 1.5 * celdas["r"].to_numpy()
+
+    # Los 6 vértices (punta arriba) de todos los hexágonos de una vez: matrices (celdas, 7)
+    angulos = np.radians(30 + 60 * np.arange(7))
+    vx = cx[:, None] + tamano_m * np.cos(angulos)[None, :]
+    vy = cy[:, None] + tamano_m * np.sin(angulos)[None, :]
+    lat, lon = desproyectar(vx, vy, origen)
+    anillos = np.stack([np.round(lon, decimales), np.round(lat, decimales)], axis=-1).tolist()
+
+    propiedades = celdas.drop(columns=["q", "r", "lat", "lon"]).round(2)
+    propiedades = propiedades.astype(object).where(propiedades.notna(), None).to_dict("records")
+    return {
+        "type": "FeatureCollection",
+        "features": [
+            {"type": "Feature", "geometry": {"type": "Polygon", "coordinates": [anillo]}, "properties": props}
+            for anillo, props in zip(anillos, propiedades)
+        ],
+    }
@@ -0,0 +1,185 @@
+import ast
+import os
+
+import pandas as pd
+
+from data_cache import leer_csv_cacheado
+from esquemas import COLUMNAS_IDENTIFICADOR, aplicar_esquema, informe_memoria, uso_memoria
+from precios_m2 import asignar_precio_m2, distritos_geojson, normalizar_barrio, tabla_precio_m2
+from roi import NOMBRES_MALAGA, NOMBRES_VALENCIA, calcular_roi
+
+
+# Registro de datasets por ciudad: nombre lógico -> (ruta CSV, opciones de lectura).
+# Solo se leen los archivos de la ciudad seleccionada en la barra lateral.
+CIUDADES = {
+    "valencia": {
+        "anuncios": ("data/Valencia_limpio.csv", {}),
+        "vivienda": ("data/valencia_vivienda_limpio.csv", {}),
+        "crimen": ("data/crimenValencia.csv", {"sep": ";"}),
+    },
+    "barcelona": {
+        "anuncios": ("data/barcelona_limpio_completo.csv", {}),
+        "inversores": ("data/barcelona_inversores.csv", {}),
+    },
+    "malaga": {
+        "anuncios": ("data/malaga_completed_clean.csv", {}),
+        "crimen": ("data/malaga_crimen_clean.csv", {"sep": ",", "quotechar": '"'}),
+        "precio_m2": ("data/malaga_precio_m2_clean.csv", {}),
+    },
+    "madrid": {
+        "anuncios": ("data/madrid_limpio.csv", {}),
+    },
+}
+
+# Columnas de entrada del ROI de cada ciudad, tras la preparación (escenarios, simulación...)
+PARAMETROS_ROI = {
+    "valencia": {"precio_m2": "precio_m2"},
+    "malaga": {"precio_m2": "price_per_m2", "ingresos": "estimated_revenue_l365d",
+               "ocupacion": "estimated_occupancy_l365d"},
+}
+
+# Polígonos de barrios con su distrito (neighbourhood_group), para el fallback de €/m²
+GEOJSON_BARRIOS = {
+    "valencia": "data/neighbourhoods.geojson",
+}
+
+# Versión simplificada por niveles de zoom para dibujar (geometria.py)
+TOPOJSON_BARRIOS = {
+    "valencia": "data/neighbourhoods.topo.json",
+}
+
+
+# Columnas del frame de anuncios que usa cada pestaña. load_data() lee solo la
+# unión de las pestañas pedidas; las que no existan en el CSV se ignoran.
+# Ningún otro módulo lee los CSV de anuncios: los helpers de maps_utils (p. ej.
+# mostrar_rentabilidad_barrios, que usa las de "rentabilidad") reciben el frame ya leído.
+COLUMNAS_BASE = ["id", "neighbourhood", "city", "price", "days_rented"]
+COLUMNAS_POR_PESTANA = {
+    "resumen": ["room_type", "latitude", "longitude", "ROI (%)", "Net ROI (%)", "roi", "net_roi"],
+    "precios": ["room_type", "latitude", "longitude", "estimated_occupancy_l365d", "price_per_m2"],
+    "rentabilidad": ["room_type", "latitude", "longitude", "ROI (%)", "Net ROI (%)", "roi", "net_roi",
+                     "estimated_revenue_l365d", "estimated_occupancy_l365d", "price_per_m2"],
+    "competencia": ["number_of_reviews", "last_review", "estimated_occupancy_l365d", "latitude", "longitude"],
+    "avanzado": ["room_type", "latitude", "longitude", "review_scores_rating", "bedrooms", "bathrooms",
+                 "number_of_reviews", "estimated_occupancy_l365d", "Net ROI (%)", "roi", "net_roi"],
+}
+
+# Texto libre pesado: nunca entra en load_data(), se pide con leer_columnas()
+COLUMNAS_PESADAS = ["amenities", "description", "neighborhood_overview", "host_about"]
+
+
+def columnas_necesarias(pestanas=None):
+    """Unión de columnas de las pestañas indicadas (todas si ``pestanas`` es None)"""
+    pestanas = COLUMNAS_POR_PESTANA if pestanas is None else pestanas
+    columnas = list(COLUMNAS_BASE)
+    for pestana in pestanas:
+        columnas += [c for c in COLUMNAS_POR_PESTANA[pestana] if c not in columnas]
+    return columnas
+
+
+def _distritos(ciudad):
+    path = GEOJSON_BARRIOS.get(ciudad)
+    if path is None or not os.path.exists(path):
+        return None
+    return distritos_geojson(path)
+
+
+def _preparar_valencia(datos):
+    df_valencia = datos["anuncios"]
+    df_inmobiliario = datos["vivienda"]
+    if {'neighbourhood', 'precio'} <= set(df_inmobiliario.columns) and 'neighbourhood' in df_valencia.columns:
+        # €/m² del barrio de cada anuncio, con el distrito y la media de la ciudad como respaldo
+        df_valencia['precio_m2'], df_valencia['nivel_precio_m2'] = asignar_precio_m2(
+            df_valencia['neighbourhood'],
+            tabla_precio_m2(df_inmobiliario, precio='precio'),
+            distritos=_distritos("valencia"),
+            media_ciudad=df_inmobiliario['precio'].mean(),
+        )
+        precio_m2_valencia = 'precio_m2'
+    else:
+        precio_m2_valencia = 2000  # fallback
+    calcular_roi(df_valencia, precio_m2=precio_m2_valencia, nombres=NOMBRES_VALENCIA)
+    return datos
+
+
+def _preparar_malaga(datos):
+    df_malaga = datos["anuncios"]
+    df_precios = datos.get("precio_m2")
+    if df_precios is not None and 'neighbourhood' in df_malaga.columns:
+        # La fila 'Malaga' de la tabla es el valor de toda la ciudad
+        es_ciudad = normalizar_barrio(df_precios['neighbourhood']) == 'MALAGA'
+        media_ciudad = df_precios.loc[es_ciudad, 'price_per_m2'].mean() if es_ciudad.any() else None
+        df_malaga['price_per_m2'], df_malaga['nivel_precio_m2'] = asignar_precio_m2(
+            df_malaga['neighbourhood'],
+            tabla_precio_m2(df_precios[~es_ciudad], precio='price_per_m2'),
+            media_ciudad=media_ciudad,
+        )
+    # Mismo cálculo que calcular_roi() de malaga_eda.ipynb; si faltan las columnas
+    # de origen se conservan los 'roi'/'net_roi' precalculados del CSV
+    if {'estimated_revenue_l365d', 'price_per_m2'} <= set(df_malaga.columns):
+        calcular_roi(
+            df_malaga,
+            precio_m2='price_per_m2',
+            ingresos='estimated_revenue_l365d',
+            nombres=NOMBRES_MALAGA,
+        )
+    return datos
+
+
+# Preprocesamiento propio de cada ciudad, aplicado una vez tras la lectura
+PREPARACION = {
+    "valencia": _preparar_valencia,
+    "malaga": _preparar_malaga,
+}
+
+
+def _opciones_lectura(dataset, opciones):
+    # Los ids de los anuncios se leen como texto para no perder precisión (ver esquemas.py);
+    # las mismas opciones en todas las lecturas comparten la copia Parquet
+    if dataset == "anuncios":
+        return dict(opciones, dtype={c: str for c in COLUMNAS_IDENTIFICADOR})
+    return opciones
+
+
+def leer_ciudad(ciudad, pestanas=None):
+    """Lee y prepara los datasets registrados para una sola ciudad.
+
+    Del frame de anuncios solo se leen las columnas de ``pestanas`` (ver
+    COLUMNAS_POR_PESTANA); el resto de datasets son pequeños y se leen enteros.
+    """
+    ciudad = ciudad.lower()
+    datos = {}
+    for nombre, (path, opciones) in CIUDADES[ciudad].items():
+        columnas = columnas_necesarias(pestanas) if nombre == "anuncios" else None
+        datos[nombre] = leer_csv_cacheado(path, columnas=columnas, **_opciones_lectura(nombre, opciones))
+
+    preparar = PREPARACION.get(ciudad)
+    if preparar is not None:
+        datos = preparar(datos)
+
+    # Tipos compactos para los anuncios, con informe de bytes ahorrados por columna
+    if "anuncios" in datos:
+        uso_antes = uso_memoria(datos["anuncios"])
+        aplicar_esquema(datos["anuncios"])
+        datos["informe_memoria"] = informe_memoria(uso_antes, uso_memoria(datos["anuncios"]))
+    return datos
+
+
+def leer_columnas(ciudad, columnas, dataset="anuncios"):
+    """Lee solo ``columnas`` de un dataset (p. ej. el texto pesado de COLUMNAS_PESADAS).
+
+    Las filas mantienen el orden y el índice del frame de ``leer_ciudad``.
+    """
+    path, opciones = CIUDADES[ciudad.lower()][dataset]
+    return leer_csv_cacheado(path, columnas=columnas, **_opciones_lectura(dataset, opciones))
+
+
+def contar_amenities(ciudad):
+    """Nº de amenities por anuncio, leyendo solo la columna de texto 'amenities'"""
+    amenities = leer_columnas(ciudad, ["amenities"]).get("amenities")
+    if amenities is None:
+        return None
+    # Listas serializadas ('["Wifi", "Kitchen"]') o texto separado por comas
+    if amenities.apply(lambda x: isinstance(x, str) and x.startswith('[')).all():
+        return amenities.apply(lambda x: len(ast.literal_eval(x)) if pd.notnull(x) else 0).astype("int16")
+    return (amenities.str.count(',') + 1).astype("float32")
@@ -0,0 +1,110 @@
+import numpy as np
+
+
+# Rejilla jerárquica sobre Web Mercator: en el zoom z hay 2**(z + 2) celdas por
+# lado (64 px con teselas de 256 px) y cada celda es la unión de 4 del nivel z + 1
+MIN_ZOOM = 0
+MAX_ZOOM = 16           # por encima se devuelven anuncios sueltos
+MAX_PUNTOS = 5000       # tope de anuncios sueltos por respuesta
+
+
+def _mercator(lat, lon):
+    x = (np.asarray(lon, dtype="float64") + 180) / 360
+    s = np.sin(np.radians(np.clip(np.asarray(lat, dtype="float64"), -85.05, 85.05)))
+    y = 0.5 - np.log((1 + s) / (1 - s)) / (4 * np.pi)
+    return x, y
+
+
+def _latlon(x, y):
+    lon = x * 360 - 180
+    lat = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * y))))
+    return lat, lon
+
+
+def _ordenar_por_x(nivel):
+    orden = np.argsort(nivel["x"], kind="stable")
+    return {k: v[orden] for k, v in nivel.items()}
+
+
+def indice_clusters(lat, lon, valores=None):
+    """Índice de clusters por nivel de zoom para consultas por viewport.
+
+    ``valores`` es un dict nombre -> array por anuncio (precio, ROI...) del que
+    se guarda la media de cada cluster. El nivel más fino se agrupa desde los
+    puntos y cada nivel inferior sumando las 4 celdas hijas, así que el coste
+    es O(n) para el primero y O(celdas) para el resto.
+    """
+    valores = valores or {}
+    lat = np.asarray(lat, dtype="float64")
+    lon = np.asarray(lon, dtype="float64")
+    validos = np.isfinite(lat) & np.isfinite(lon)
+    x, y = _mercator(lat[validos], lon[validos])
+    valores = {k: np.asarray(v, dtype="float64")[validos] for k, v in valores.items()}
+
+    puntos = _ordenar_por_x({"x": x, "y": y, "lat": lat[validos], "lon": lon[validos], **valores})
+
+    # Parciales sumables de cada celda: nº, suma de x/y y suma y nº de cada valor
+    lado = 2 ** (MAX_ZOOM + 2)
+    cx = np.minimum((x * lado).astype("int64"), lado - 1)
+    cy = np.minimum((y * lado).astype("int64"), lado - 1)
+    parciales = {"n": np.ones(len(x)), "sx": x, "sy": y}
+    for k, v in valores.items():
+        finitos = np.isfinite(v)
+        parciales[f"s_{k}"] = np.where(finitos, v, 0.0)
+        parciales[f"n_{k}"] = finitos.astype("float64")
+
+    niveles = {}
+    for zoom in range(MAX_ZOOM, MIN_ZOOM - 1, -1):
+        celdas, inversa = np.unique(cx * lado + cy, return_inverse=True)
+        parciales = {k: np.bincount(inversa, weights=v, minlength=len(celdas)) for k, v in parciales.items()}
+        cx, cy = celdas // lado, celdas % lado
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            nivel = {"x": parciales["sx"] / parciales["n"], "y": parciales["sy"] / parciales["n"], "n": parciales["n"]}
+            for k in valores:
+                nivel[k] = parciales[f"s_{k}"] / parciales[f"n_{k}"]
+        nivel["lat"], nivel["lon"] = _latlon(nivel["x"], nivel["y"])
+        niveles[zoom] = _ordenar_por_x(nivel)
+
+        # Celdas del nivel siguiente (más grueso)
+        cx, cy, lado = cx // 2, cy // 2, lado // 2
+
+    return {"niveles": niveles, "puntos": puntos, "valores": list(valores)}
+
+
+def _en_bbox(nivel, bbox):
+    oeste, sur, este, norte = bbox
+    x0, y1 = _mercator(sur, oeste)
+    x1, y0 = _mercator(norte, este)
+    inicio, fin = np.searchsorted(nivel["x"], [x0, x1])
+    y = nivel["y"][inicio:fin]
+    return np.arange(inicio, fin)[(y >= y0) & (y <= y1)]
+
+
+def consultar_clusters(indice, bbox, zoom):
+    """Clusters (o anuncios sueltos en zoom alto) cuyo centro cae en ``bbox``.
+
+    ``bbox`` es (oeste, sur, este, norte) en grados. Devuelve un dict listo para
+    JSON con filas [lat, lon, n, valores...] y [lat, lon, valores...].
+    """
+    columnas = indice["valores"]
+    zoom = int(round(zoom))
+    if zoom > MAX_ZOOM:
+        puntos = indice["puntos"]
+        filas = _en_bbox(puntos, bbox)[:MAX_PUNTOS]
+        return {"clusters": [], "puntos": _a_lista(puntos, filas, ["lat", "lon"], columnas), "valores": columnas}
+
+    nivel = indice["niveles"][max(zoom, MIN_ZOOM)]
+    filas = _en_bbox(nivel, bbox)
+    return {"clusters": _a_lista(nivel, filas, ["lat", "lon", "n"], columnas), "puntos": [], "valores": columnas}
+
+
+def _a_lista(nivel, filas, fijas, columnas):
+    # Coordenadas a 6 decimales (~10 cm) y valores a 2; NaN no es JSON válido y va como null
+    datos = np.column_stack(
+        [np.round(nivel[k][filas], 6) for k in fijas] + [np.round(nivel[k][filas], 2) for k in columnas]
+    )
+    finitos = np.isfinite(datos)
+    datos = datos.astype(object)
+    datos[~finitos] = None
+    return datos.tolist()
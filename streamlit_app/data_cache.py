@@ -0,0 +1,146 @@
+import hashlib
+import json
+import os
+import threading
+
+import pandas as pd
+
+try:
+    import pyarrow.parquet as pq
+    PARQUET_DISPONIBLE = True
+except ImportError:
+    PARQUET_DISPONIBLE = False
+
+
+# Carpeta (junto a cada CSV) donde se guardan las copias columnares
+CACHE_DIRNAME = ".cache"
+_TAM_BLOQUE = 1 << 20
+
+
+def _hash_archivo(path):
+    """SHA-1 del contenido del archivo, leído por bloques"""
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for bloque in iter(lambda: f.read(_TAM_BLOQUE), b""):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def _rutas_cache(path, read_csv_kwargs):
+    # Las opciones de lectura (sep, quotechar...) forman parte de la clave:
+    # el mismo CSV leído con otro separador produce otra tabla.
+    opciones = json.dumps(read_csv_kwargs, sort_keys=True, default=str)
+    sufijo = hashlib.sha1(opciones.encode("utf-8")).hexdigest()[:8]
+    carpeta = os.path.join(os.path.dirname(os.path.abspath(path)), CACHE_DIRNAME)
+    nombre = f"{os.path.splitext(os.path.basename(path))[0]}-{sufijo}"
+    return os.path.join(carpeta, nombre + ".parquet"), os.path.join(carpeta, nombre + ".json")
+
+
+def _leer_meta(path_meta):
+    try:
+        with open(path_meta, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _escribir_atomico(path, escribir):
+    # Se escribe en un temporal de la misma carpeta y se renombra, para que
+    # otro proceso nunca lea un parquet a medio escribir. El hilo forma parte
+    # del nombre: el precálculo en segundo plano puede escribir a la vez que load_data.
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        escribir(tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def _guardar_meta(path_meta, meta):
+    def escribir(tmp):
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+    _escribir_atomico(path_meta, escribir)
+
+
+def _leer_parquet(path_parquet, path_meta, columnas):
+    """Lee la copia Parquet; si está corrupta o truncada la borra y devuelve None"""
+    try:
+        if columnas is None:
+            return pd.read_parquet(path_parquet)
+        disponibles = set(pq.read_schema(path_parquet).names)
+        return pd.read_parquet(path_parquet, columns=[c for c in columnas if c in disponibles])
+    except (OSError, ValueError):
+        for ruta in (path_parquet, path_meta):
+            try:
+                os.remove(ruta)
+            except OSError:
+                pass
+        return None
+
+
+def _proyectar(df, columnas):
+    if columnas is None:
+        return df
+    seleccion = set(columnas)
+    return df.drop(columns=[c for c in df.columns if c not in seleccion])
+
+
+def leer_csv_cacheado(path, columnas=None, **read_csv_kwargs):
+    """Lee un CSV usando una copia Parquet invalidada por mtime y hash del contenido.
+
+    Si el mtime y el tamaño coinciden con los guardados se carga el Parquet
+    directamente. Si no, se calcula el hash: con el mismo contenido (p. ej. tras
+    un ``git checkout``) se reutiliza la copia; si cambió, o la copia no se
+    puede leer, se vuelve a parsear el CSV y se regenera. Sin pyarrow se comporta como ``pd.read_csv``.
+
+    ``columnas`` limita la lectura a esas columnas (las que no existan se
+    ignoran); el Parquet guarda siempre la tabla completa.
+    """
+    if not PARQUET_DISPONIBLE:
+        if columnas is not None:
+            seleccion = set(columnas)
+            read_csv_kwargs = dict(read_csv_kwargs, usecols=lambda c: c in seleccion)
+        return pd.read_csv(path, **read_csv_kwargs)
+
+    estado = os.stat(path)
+    path_parquet, path_meta = _rutas_cache(path, read_csv_kwargs)
+    meta = _leer_meta(path_meta)
+
+    sha1 = None
+    if meta is not None and os.path.exists(path_parquet):
+        if meta.get("mtime_ns") == estado.st_mtime_ns and meta.get("size") == estado.st_size:
+            df = _leer_parquet(path_parquet, path_meta, columnas)
+            if df is not None:
+                return df
+        else:
+            sha1 = _hash_archivo(path)
+            if meta.get("sha1") == sha1:
+                df = _leer_parquet(path_parquet, path_meta, columnas)
+                if df is not None:
+                    meta.update(mtime_ns=estado.st_mtime_ns, size=estado.st_size)
+                    try:
+                        _guardar_meta(path_meta, meta)
+                    except OSError:
+                        pass
+                    return df
+
+    if sha1 is None:
+        sha1 = _hash_archivo(path)
+    df = pd.read_csv(path, **read_csv_kwargs)
+
+    try:
+        os.makedirs(os.path.dirname(path_parquet), exist_ok=True)
+        _escribir_atomico(path_parquet, lambda tmp: df.to_parquet(tmp, index=False))
+        _guardar_meta(path_meta, {
+            "source": os.path.basename(path),
+            "sha1": sha1,
+            "mtime_ns": estado.st_mtime_ns,
+            "size": estado.st_size,
+        })
+    except Exception:
+        # Columnas con tipos mezclados o disco de solo lectura: se sigue sin caché
+        pass
+
+    return _proyectar(df, columnas)
@@ -0,0 +1,127 @@
+import numpy as np
+import plotly.express as px
+import streamlit as st
+
+
+# A partir de estos puntos se dibuja con WebGL (scattergl) en lugar de SVG
+UMBRAL_WEBGL = 2000
+# Puntos que se envían al navegador por defecto
+MAX_PUNTOS = 10_000
+# Celdas por eje de la rejilla de submuestreo
+CELDAS = 64
+
+
+def _celdas(valores, celdas):
+    v = np.asarray(valores, dtype="float64")
+    minimo, maximo = np.nanmin(v), np.nanmax(v)
+    escala = (maximo - minimo) or 1.0
+    return np.clip(((v - minimo) / escala * celdas).astype("int64"), 0, celdas - 1)
+
+
+def indices_submuestra(x, y, max_puntos=MAX_PUNTOS, estratos=None, celdas=CELDAS, semilla=0):
+    """Posiciones de una submuestra de ~``max_puntos`` que conserva la densidad.
+
+    Cada celda ocupada de una rejilla ``celdas`` x ``celdas`` conserva un punto,
+    para que las zonas poco densas y los extremos no desaparezcan; el resto del
+    presupuesto se reparte en proporción a los puntos de cada celda (y de cada
+    estrato, si se da), con redondeo aleatorio.
+    """
+    x = np.asarray(x, dtype="float64")
+    y = np.asarray(y, dtype="float64")
+    n = len(x)
+    if n <= max_puntos:
+        return np.arange(n)
+    rng = np.random.default_rng(semilla)
+    celda = _celdas(x, celdas) * celdas + _celdas(y, celdas)
+    grupo = celda
+    if estratos is not None:
+        codigos = np.unique(np.asarray(estratos, dtype=object).astype(str), return_inverse=True)[1]
+        grupo = codigos * celdas * celdas + celda
+
+    # Orden aleatorio agrupado por (estrato, celda): los primeros de cada grupo son una muestra al azar
+    orden = np.lexsort((rng.random(n), grupo))
+    _, grupo_ordenado, conteos = np.unique(grupo[orden], return_inverse=True, return_counts=True)
+    rango = np.arange(n) - np.r_[0, np.cumsum(conteos)[:-1]][grupo_ordenado]
+
+    elegidos = np.zeros(n, dtype=bool)
+    primeros_celda = np.unique(celda[orden], return_index=True)[1]
+    if len(primeros_celda) <= max_puntos // 2:
+        elegidos[primeros_celda] = True
+    fraccion = (max_puntos - elegidos.sum()) / (n - elegidos.sum())
+    cuota = np.floor(conteos * fraccion + rng.random(len(conteos))).astype("int64")
+    elegidos |= rango < cuota[grupo_ordenado]
+    return np.sort(orden[elegidos])
+
+
+def submuestra(df, x, y, max_puntos=MAX_PUNTOS, estratos=None):
+    """Filas de ``df`` con ``x`` e ``y`` informadas, submuestreadas si pasan de ``max_puntos``"""
+    df = df.dropna(subset=[x, y])
+    grupos = df[estratos] if estratos is not None else None
+    return df.iloc[indices_submuestra(df[x], df[y], max_puntos, grupos)]
+
+
+# Opciones de st.plotly_chart para que seleccionar una zona (caja o lazo) provoque un rerun
+OPCIONES_ZONA = {"on_select": "rerun", "selection_mode": ("box", "lasso")}
+
+
+def zona_seleccionada(clave, x="x", y="y"):
+    """(x0, x1, y0, y1) de la última selección en el gráfico ``clave``, o None si no hay.
+
+    Streamlit no informa del zoom, pero sí de la selección: la zona elegida
+    sobre la muestra se vuelve a dibujar con todos sus anuncios. En mapas
+    se pasa ``x="lon"``, ``y="lat"`` y la zona es la que cubren los puntos elegidos.
+    """
+    estado = st.session_state.get(clave)
+    seleccion = (estado or {}).get("selection") or {}
+    cajas = seleccion.get("box") or []
+    if cajas and x == "x" and y == "y":
+        caja = cajas[-1]
+        (x0, x1), (y0, y1) = sorted(caja["x"]), sorted(caja["y"])
+        return float(x0), float(x1), float(y0), float(y1)
+    puntos = [p for p in seleccion.get("points") or [] if x in p and y in p]
+    if not puntos:
+        return None
+    xs, ys = [float(p[x]) for p in puntos], [float(p[y]) for p in puntos]
+    return min(xs), max(xs), min(ys), max(ys)
+
+
+def en_zona(df, x, y, zona):
+    """Filas de ``df`` con ``x`` e ``y`` dentro de ``zona`` (bordes incluidos)"""
+    x0, x1, y0, y1 = zona
+    return df[df[x].between(x0, x1) & df[y].between(y0, y1)]
+
+
+def mostrar_zona(n_total, zona, max_puntos=MAX_PUNTOS):
+    """Explica qué se está dibujando: la muestra de la ciudad o todos los anuncios de la zona"""
+    if zona is not None:
+        st.caption("Zona seleccionada con todos sus anuncios; doble clic en el gráfico para volver a la ciudad.")
+    elif n_total > max_puntos:
+        st.caption(
+            f"Muestra de ~{max_puntos:,} de {n_total:,} anuncios que conserva la densidad por zona. "
+            "Selecciona una zona (caja o lazo) para verla con todos sus anuncios."
+        )
+
+
+def dispersion(df, x, y, zona=None, estratos=None, max_puntos=MAX_PUNTOS, **kwargs):
+    """px.scatter submuestreado o, con ``zona``, con todos los anuncios de la zona.
+
+    Se dibuja en WebGL a partir de UMBRAL_WEBGL puntos; arrastrar selecciona
+    (en lugar de hacer zoom) para que la zona llegue al servidor.
+    """
+    if zona is not None:
+        datos = en_zona(df.dropna(subset=[x, y]), x, y, zona)
+    else:
+        datos = submuestra(df, x, y, max_puntos, estratos)
+    modo = "webgl" if len(datos) > UMBRAL_WEBGL else "svg"
+    fig = px.scatter(datos, x=x, y=y, render_mode=modo, **kwargs)
+    fig.update_layout(dragmode="select")
+    return fig
+
+
+def dispersion_mapa(df, lat, lon, zona=None, estratos=None, max_puntos=MAX_PUNTOS, **kwargs):
+    """px.scatter_mapbox submuestreado o, con ``zona`` (lon0, lon1, lat0, lat1), completo en ella"""
+    if zona is not None:
+        datos = en_zona(df.dropna(subset=[lat, lon]), lon, lat, zona)
+    else:
+        datos = submuestra(df, lon, lat, max_puntos, estratos)
+    return px.scatter_mapbox(datos, lat=lat, lon=lon, **kwargs)
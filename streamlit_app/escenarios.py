@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+
+from roi import GASTOS_ANUALES, M2_MEDIOS, valores_por_fila
+
+
+# Rejillas por defecto de cada supuesto (4 x 5 x 4 x 5 = 400 escenarios)
+GASTOS = (2000, 3000, 4000, 5000)
+M2 = (50, 60, 70, 80, 90)
+AJUSTE_OCUPACION = (0.0, 0.1, 0.2, 0.3)      # fracción de ocupación que se pierde
+VARIACION_PRECIO_M2 = (-0.1, -0.05, 0.0, 0.05, 0.1)
+PERCENTILES = (10, 50, 90)
+
+# Escenario que reproduce el cálculo del dashboard
+ESCENARIO_BASE = {
+    "gastos": GASTOS_ANUALES,
+    "m2": M2_MEDIOS,
+    "ajuste_ocupacion": 0.0,
+    "variacion_precio_m2": 0.0,
+}
+
+
+def barrer_escenarios(
+    df,
+    precio_m2,
+    ingresos=None,
+    precio="price",
+    ocupacion="days_rented",
+    barrio="neighbourhood",
+    gastos=GASTOS,
+    m2=M2,
+    ajuste_ocupacion=AJUSTE_OCUPACION,
+    variacion_precio_m2=VARIACION_PRECIO_M2,
+    percentiles=PERCENTILES,
+):
+    """ROI neto de cada anuncio bajo todas las combinaciones de supuestos, resumido por barrio.
+
+    Para cada barrio se evalúa de una vez el array (gastos, m2, ajuste, variación,
+    anuncios) por broadcasting y se reduce a percentiles, así la memoria depende
+    del barrio más grande y no del total. Devuelve un DataFrame con índice
+    (gastos, m2, ajuste_ocupacion, variacion_precio_m2, barrio) y una columna por
+    percentil (p10, p50...), que se corta con ``.xs`` sin recalcular.
+    """
+    if ingresos is not None:
+        ingresos_base = valores_por_fila(df, ingresos)
+    else:
+        ingresos_base = valores_por_fila(df, precio) * valores_por_fila(df, ocupacion)
+    precio_base = valores_por_fila(df, precio_m2)
+
+    validos = np.isfinite(ingresos_base) & np.isfinite(precio_base) & df[barrio].notna().to_numpy()
+    codigos, barrios = pd.factorize(df[barrio][validos], sort=True)
+    orden = np.argsort(codigos, kind="stable")
+    ingresos_base = ingresos_base[validos][orden].astype("float32")
+    precio_base = precio_base[validos][orden].astype("float32")
+    cortes = np.searchsorted(codigos[orden], np.arange(1, len(barrios)))
+
+    g = np.asarray(gastos, dtype="float32")[:, None, None, None, None]
+    m = np.asarray(m2, dtype="float32")[None, :, None, None, None]
+    h = np.asarray(ajuste_ocupacion, dtype="float32")[None, None, :, None, None]
+    s = np.asarray(variacion_precio_m2, dtype="float32")[None, None, None, :, None]
+
+    forma = (len(gastos), len(m2), len(ajuste_ocupacion), len(variacion_precio_m2))
+    cubo = np.empty(forma + (len(barrios), len(percentiles)), dtype="float32")
+    for b, (ing, pm2) in enumerate(zip(np.split(ingresos_base, cortes), np.split(precio_base, cortes))):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            roi_neto = (ing * (1 - h) - g) / (pm2 * (1 + s) * m) * 100
+        cubo[..., b, :] = np.moveaxis(np.percentile(roi_neto, percentiles, axis=-1), 0, -1)
+
+    indice = pd.MultiIndex.from_product(
+        [list(gastos), list(m2), list(ajuste_ocupacion), list(variacion_precio_m2), pd.Index(barrios).astype(str)],
+        names=["gastos", "m2", "ajuste_ocupacion", "variacion_precio_m2", "barrio"],
+    )
+    return pd.DataFrame(cubo.reshape(-1, len(percentiles)), index=indice, columns=[f"p{q}" for q in percentiles])
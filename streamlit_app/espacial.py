@@ -0,0 +1,52 @@
+import numpy as np
+from scipy.spatial import cKDTree
+
+from binning import proyectar_metros
+
+
+def indice_espacial(lat, lon):
+    """KD-tree sobre las coordenadas proyectadas a metros (equirectangular local).
+
+    Devuelve un dict con el árbol, el origen de la proyección y ``filas``: la
+    posición en la entrada de cada punto del árbol (se descartan los nulos).
+    """
+    lat = np.asarray(lat, dtype="float64")
+    lon = np.asarray(lon, dtype="float64")
+    filas = np.flatnonzero(np.isfinite(lat) & np.isfinite(lon))
+    x, y, origen = proyectar_metros(lat[filas], lon[filas])
+    return {"arbol": cKDTree(np.column_stack([x, y])), "origen": origen, "filas": filas}
+
+
+def _puntos(indice, lat, lon):
+    x, y, _ = proyectar_metros(np.atleast_1d(lat), np.atleast_1d(lon), indice["origen"])
+    return np.column_stack([x, y])
+
+
+def en_radio(indice, lat, lon, radio_m):
+    """Para cada punto consultado, posiciones de los anuncios a menos de ``radio_m`` metros"""
+    vecinos = indice["arbol"].query_ball_point(_puntos(indice, lat, lon), r=radio_m)
+    return [indice["filas"][np.sort(v)] for v in vecinos]
+
+
+def mas_cercanos(indice, lat, lon, k=10, excluir_propio=False):
+    """Distancias (m) y posiciones de los ``k`` anuncios más cercanos a cada punto.
+
+    Con ``excluir_propio`` se descarta el primer vecino, útil cuando los puntos
+    consultados son los propios anuncios del índice.
+    """
+    k_consulta = min(k + int(excluir_propio), indice["arbol"].n)
+    distancias, posiciones = indice["arbol"].query(_puntos(indice, lat, lon), k=k_consulta)
+    distancias, posiciones = np.atleast_2d(distancias), np.atleast_2d(posiciones)
+    if excluir_propio:
+        distancias, posiciones = distancias[:, 1:], posiciones[:, 1:]
+    return distancias, indice["filas"][posiciones]
+
+
+def densidad_competencia(indice, radio_m=500):
+    """Nº de otros anuncios a menos de ``radio_m`` metros de cada anuncio del índice.
+
+    Se resuelve en una sola consulta por lotes del árbol (sin pares O(n²)). El
+    resultado va alineado con ``indice["filas"]``.
+    """
+    arbol = indice["arbol"]
+    return arbol.query_ball_point(arbol.data, r=radio_m, return_length=True) - 1
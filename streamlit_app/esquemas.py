@@ -0,0 +1,125 @@
+import pandas as pd
+
+
+# Tipos compactos para los frames de anuncios (InsideAirbnb + columnas derivadas).
+#   "categoria": texto de baja cardinalidad -> category
+#   "identificador": ids -> int64 exacto (Int64 si hay nulos); nunca float, que los corrompe
+#   "entero":    conteos -> el entero más pequeño que admita el rango (float32 si hay nulos)
+#   "decimal":   medias, puntuaciones y ROI -> float32
+#   "fecha":     texto ISO -> datetime64, parseado una sola vez al cargar
+# Las columnas que no aparecen (coordenadas, texto libre...) se dejan como están.
+ESQUEMA_ANUNCIOS = {
+    "neighbourhood": "categoria",
+    "neighbourhood_cleansed": "categoria",
+    "neighbourhood_group_cleansed": "categoria",
+    "room_type": "categoria",
+    "city": "categoria",
+    "property_type": "categoria",
+    "host_response_time": "categoria",
+    "id": "identificador",
+    "host_id": "identificador",
+    "accommodates": "entero",
+    "bedrooms": "entero",
+    "beds": "entero",
+    "minimum_nights": "entero",
+    "maximum_nights": "entero",
+    "availability_365": "entero",
+    "number_of_reviews": "entero",
+    "number_of_reviews_ltm": "entero",
+    "calculated_host_listings_count": "entero",
+    "days_rented": "entero",
+    "estimated_occupancy_l365d": "entero",
+    "bathrooms": "decimal",
+    "price": "decimal",
+    "price_per_m2": "decimal",
+    "precio_m2": "decimal",
+    "nivel_precio_m2": "categoria",
+    "reviews_per_month": "decimal",
+    "review_scores_rating": "decimal",
+    "review_scores_accuracy": "decimal",
+    "review_scores_cleanliness": "decimal",
+    "review_scores_checkin": "decimal",
+    "review_scores_communication": "decimal",
+    "review_scores_location": "decimal",
+    "review_scores_value": "decimal",
+    "estimated_revenue_l365d": "decimal",
+    "annual_income": "decimal",
+    "estimated_property_value": "decimal",
+    "net_annual_income": "decimal",
+    "ROI (%)": "decimal",
+    "Net ROI (%)": "decimal",
+    "roi": "decimal",
+    "net_roi": "decimal",
+    "Yield (%)": "decimal",
+    "Payback (años)": "decimal",
+    "last_review": "fecha",
+    "first_review": "fecha",
+    "host_since": "fecha",
+}
+
+# Se leen del CSV como texto: con un solo nulo read_csv los pasaría a float64,
+# que ya no representa ids por encima de 2**53
+COLUMNAS_IDENTIFICADOR = [c for c, tipo in ESQUEMA_ANUNCIOS.items() if tipo == "identificador"]
+
+# Por encima de esta proporción de valores únicos una columna no se convierte a category
+MAX_RATIO_CATEGORIA = 0.5
+
+
+def _a_entero(serie):
+    numerica = pd.to_numeric(serie, errors="coerce")
+    if not numerica.isna().any():
+        numerica = pd.to_numeric(numerica, downcast="integer")
+    # Con nulos o decimales no hay entero posible: float32
+    if pd.api.types.is_float_dtype(numerica):
+        return numerica.astype("float32")
+    return numerica
+
+
+def _a_identificador(serie):
+    if not pd.api.types.is_integer_dtype(serie.dtype):
+        # Texto -> Int64 sin pasar por float
+        serie = pd.to_numeric(serie, errors="coerce", dtype_backend="numpy_nullable")
+    if pd.api.types.is_integer_dtype(serie.dtype):
+        return serie.astype("Int64") if serie.isna().any() else serie.astype("int64")
+    return serie
+
+
+def _a_categoria(serie):
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        return serie
+    if len(serie) and serie.nunique(dropna=True) / len(serie) > MAX_RATIO_CATEGORIA:
+        return serie
+    return serie.astype("category")
+
+
+_CONVERSORES = {
+    "categoria": _a_categoria,
+    "identificador": _a_identificador,
+    "entero": _a_entero,
+    "decimal": lambda serie: pd.to_numeric(serie, errors="coerce").astype("float32"),
+    "fecha": lambda serie: pd.to_datetime(serie, errors="coerce"),
+}
+
+
+def aplicar_esquema(df, esquema=ESQUEMA_ANUNCIOS):
+    """Convierte in situ las columnas presentes en ``df`` a los tipos del esquema"""
+    for columna, tipo in esquema.items():
+        if columna in df.columns:
+            df[columna] = _CONVERSORES[tipo](df[columna])
+    return df
+
+
+def uso_memoria(df):
+    """Tipo y bytes (deep) de cada columna"""
+    return pd.DataFrame({
+        "tipo": df.dtypes.astype(str),
+        "bytes": df.memory_usage(deep=True, index=False),
+    })
+
+
+def informe_memoria(uso_antes, uso_despues):
+    """Compara dos ``uso_memoria`` del mismo frame: bytes ahorrados por columna"""
+    informe = uso_antes.join(uso_despues, lsuffix="_antes", rsuffix="_despues")
+    informe["bytes_ahorrados"] = informe["bytes_antes"] - informe["bytes_despues"]
+    informe.index.name = "columna"
+    return informe.sort_values("bytes_ahorrados", ascending=False)
@@ -0,0 +1,69 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import plotly.io as pio
+import streamlit as st
+
+
+MAX_FIGURAS = 256
+MAX_BYTES = 256 * 1024 ** 2
+
+_figuras = OrderedDict()    # (id del gráfico, huella) -> JSON de la figura
+_bytes = 0
+_candado = threading.Lock()
+
+
+def huella_seleccion(*partes):
+    """Huella estable de lo que determina un gráfico: ciudad, versión de los datos, filtros..."""
+    h = hashlib.sha1()
+    for parte in partes:
+        h.update(repr(parte).encode("utf-8"))
+        h.update(b"\x1f")
+    return h.hexdigest()
+
+
+def figura(id_grafico, huella, construir):
+    """Figura de ``construir()`` memoizada por (``id_grafico``, ``huella``) en un LRU acotado.
+
+    Se guarda el JSON serializado y cada acierto devuelve una Figure nueva:
+    el caché es compartido entre sesiones y un ``fig.update_*`` sobre un
+    objeto guardado se vería en todas. La memoria se acota por bytes de JSON.
+    """
+    global _bytes
+    clave = (id_grafico, huella)
+    with _candado:
+        if clave in _figuras:
+            _figuras.move_to_end(clave)
+            texto = _figuras[clave]
+        else:
+            texto = None
+    if texto is not None:
+        return pio.from_json(texto, skip_invalid=True)
+
+    fig = construir()
+    if fig is None:
+        return None
+    texto = pio.to_json(fig, validate=False)
+    with _candado:
+        if clave not in _figuras:
+            _figuras[clave] = texto
+            _bytes += len(texto)
+        while len(_figuras) > MAX_FIGURAS or (_bytes > MAX_BYTES and len(_figuras) > 1):
+            _bytes -= len(_figuras.popitem(last=False)[1])
+    return fig
+
+
+def mostrar_figura(id_grafico, huella, construir, **opciones):
+    """st.plotly_chart de la figura memoizada; ``id_grafico`` es también la key del elemento.
+
+    ``construir`` hace también la agregación que alimenta el gráfico, así que
+    un acierto no recalcula nada; devuelve None si no hay datos, y entonces
+    esta función devuelve False para que quien llama muestre su aviso.
+    ``opciones`` van a st.plotly_chart (p. ej. dispersion.OPCIONES_ZONA).
+    """
+    fig = figura(id_grafico, huella, construir)
+    if fig is None:
+        return False
+    st.plotly_chart(fig, use_container_width=True, key=id_grafico, **opciones)
+    return True
@@ -0,0 +1,191 @@
+import json
+import sys
+
+import numpy as np
+
+from binning import proyectar_metros
+
+
+# Niveles de detalle: (zoom mínimo de Leaflet, tolerancia de simplificación en m).
+# La tolerancia ronda 1 px a ese zoom en la latitud de Valencia; el último nivel
+# ya está al límite de la cuantización
+NIVELES_ZOOM = ((0, 60.0), (13, 10.0), (15, 2.0))
+
+# Rejilla de cuantización por eje sobre el bbox (~2 m en el término de Valencia)
+CUANTIZACION = 10_000
+
+
+def _anillos(geometria):
+    """Polígonos (lista de anillos) de una geometría Polygon o MultiPolygon"""
+    if geometria["type"] == "Polygon":
+        return [geometria["coordinates"]]
+    if geometria["type"] == "MultiPolygon":
+        return geometria["coordinates"]
+    raise ValueError(f"geometría no soportada: {geometria['type']}")
+
+
+def _cuantizar(features, n):
+    coords = np.concatenate([
+        np.asarray(anillo, dtype="float64")[:, :2]
+        for feature in features for poligono in _anillos(feature["geometry"]) for anillo in poligono
+    ])
+    x0, y0 = coords.min(axis=0)
+    x1, y1 = coords.max(axis=0)
+    escala = [(x1 - x0) / (n - 1) or 1.0, (y1 - y0) / (n - 1) or 1.0]
+
+    poligonos = []
+    for feature in features:
+        partes = []
+        for poligono in _anillos(feature["geometry"]):
+            anillos = []
+            for anillo in poligono:
+                a = np.asarray(anillo, dtype="float64")[:, :2]
+                q = np.round((a - [x0, y0]) / escala).astype("int64")
+                # Vértices repetidos tras cuantizar, y sin el punto de cierre
+                q = q[np.r_[True, np.any(q[1:] != q[:-1], axis=1)]]
+                if len(q) > 1 and np.array_equal(q[0], q[-1]):
+                    q = q[:-1]
+                if len(q) >= 3:
+                    anillos.append([tuple(p) for p in q.tolist()])
+            if anillos:
+                partes.append(anillos)
+        poligonos.append(partes)
+    return poligonos, {"scale": escala, "translate": [float(x0), float(y0)]}
+
+
+def _uniones(anillos):
+    """Vértices donde se separan los bordes compartidos (vecinos distintos según el anillo)"""
+    vecinos, uniones = {}, set()
+    for anillo in anillos:
+        n = len(anillo)
+        for i, p in enumerate(anillo):
+            par = (anillo[i - 1], anillo[(i + 1) % n])
+            visto = vecinos.setdefault(p, par)
+            if visto != par and visto != par[::-1]:
+                uniones.add(p)
+    return uniones
+
+
+def _cortar(anillo, uniones):
+    """Arcos de un anillo cortado en sus uniones; cada arco incluye ambos extremos"""
+    cortes = [i for i, p in enumerate(anillo) if p in uniones]
+    if not cortes:
+        # Anillo sin vecinos distintos: un solo arco cerrado desde un inicio canónico
+        inicio = anillo.index(min(anillo))
+        rotado = anillo[inicio:] + anillo[:inicio]
+        return [rotado + [rotado[0]]]
+    rotado = anillo[cortes[0]:] + anillo[:cortes[0]]
+    rotado.append(rotado[0])
+    arcos, desde = [], 0
+    for i in range(1, len(rotado)):
+        if rotado[i] in uniones:
+            arcos.append(rotado[desde:i + 1])
+            desde = i
+    return arcos
+
+
+def _registrar(arco, arcos, indices):
+    """Índice TopoJSON del arco: ~i si ya existe recorrido al revés"""
+    clave = tuple(arco)
+    if clave in indices:
+        return indices[clave]
+    inverso = clave[::-1]
+    if inverso in indices:
+        return ~indices[inverso]
+    if clave[0] == clave[-1]:
+        # Arco cerrado: el mismo anillo puede llegar con otro sentido de giro
+        inverso = (clave[0],) + clave[-2:0:-1] + (clave[0],)
+        if inverso in indices:
+            return ~indices[inverso]
+    indices[clave] = len(arcos)
+    arcos.append(arco)
+    return indices[clave]
+
+
+def _douglas_peucker(xy, tolerancia):
+    """Máscara de los vértices que se conservan; los extremos siempre se conservan"""
+    conservar = np.zeros(len(xy), dtype=bool)
+    conservar[[0, -1]] = True
+    pendientes = [(0, len(xy) - 1)]
+    while pendientes:
+        i, j = pendientes.pop()
+        if j - i < 2:
+            continue
+        a, b = xy[i], xy[j]
+        tramo = xy[i + 1:j] - a
+        ab = b - a
+        largo = np.hypot(*ab)
+        if largo == 0:
+            distancias = np.hypot(tramo[:, 0], tramo[:, 1])
+        else:
+            distancias = np.abs(ab[0] * tramo[:, 1] - ab[1] * tramo[:, 0]) / largo
+        k = int(np.argmax(distancias))
+        if distancias[k] > tolerancia:
+            conservar[i + 1 + k] = True
+            pendientes += [(i, i + 1 + k), (i + 1 + k, j)]
+    return conservar
+
+
+def _simplificar(arcos, transform, tolerancia):
+    """Arcos simplificados y codificados en deltas (formato de arcos cuantizados)"""
+    escala = np.asarray(transform["scale"])
+    traslacion = np.asarray(transform["translate"])
+    resultado = []
+    for arco in arcos:
+        q = np.asarray(arco, dtype="int64")
+        lon, lat = (q * escala + traslacion).T
+        x, y, _ = proyectar_metros(lat, lon, origen=(traslacion[1], traslacion[0]))
+        conservar = _douglas_peucker(np.column_stack([x, y]), tolerancia)
+        # Un arco cerrado necesita al menos un triángulo para seguir siendo un anillo
+        if np.array_equal(q[0], q[-1]) and conservar.sum() < 4 and len(q) >= 4:
+            conservar[np.linspace(0, len(q) - 1, 4).round().astype(int)] = True
+        q = q[conservar]
+        resultado.append(np.vstack([q[:1], np.diff(q, axis=0)]).tolist())
+    return resultado
+
+
+def construir_topologia(geojson, niveles=NIVELES_ZOOM, cuantizacion=CUANTIZACION, objeto="barrios"):
+    """Topología con arcos compartidos y varios niveles de detalle de un GeoJSON.
+
+    Los bordes comunes entre barrios se guardan una sola vez y se simplifican
+    por arco, así que los niveles simplificados no abren huecos entre vecinos.
+    ``arcs`` es el nivel más detallado (TopoJSON válido por sí solo) y
+    ``niveles`` es una lista [zoom mínimo, arcos] en la que ``None`` remite a
+    ``arcs``.
+    """
+    features = geojson["features"]
+    poligonos, transform = _cuantizar(features, cuantizacion)
+    uniones = _uniones([anillo for partes in poligonos for anillos in partes for anillo in anillos])
+
+    arcos, indices, geometrias = [], {}, []
+    for feature, partes in zip(features, poligonos):
+        referencias = [
+            [[_registrar(arco, arcos, indices) for arco in _cortar(anillo, uniones)] for anillo in anillos]
+            for anillos in partes
+        ]
+        geometrias.append({"type": "MultiPolygon", "arcs": referencias, "properties": feature.get("properties", {})})
+
+    niveles = sorted(niveles)
+    por_nivel = [[zoom, _simplificar(arcos, transform, tolerancia)] for zoom, tolerancia in niveles]
+    detalle = por_nivel[-1][1]
+    por_nivel[-1][1] = None
+    return {
+        "type": "Topology",
+        "transform": transform,
+        "objects": {objeto: {"type": "GeometryCollection", "geometries": geometrias}},
+        "arcs": detalle,
+        "niveles": por_nivel,
+    }
+
+
+def guardar_topologia(path_geojson, path_salida, **kwargs):
+    with open(path_geojson, "r", encoding="utf-8") as f:
+        topologia = construir_topologia(json.load(f), **kwargs)
+    with open(path_salida, "w", encoding="utf-8") as f:
+        json.dump(topologia, f, separators=(",", ":"), ensure_ascii=False)
+    return topologia
+
+
+if __name__ == "__main__":
+    # python streamlit_app/geometria.py data/neighbourhoods.geojson data/neighbourhoods.topo.json
+    guardar_topologia(sys.argv[1], sys.argv[2])
@@ -0,0 +1,175 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+# Nodos de la rejilla en la zona evaluada (seaborn usa 200)
+TAMANO_1D = 512
+TAMANO_2D = 256
+# La rejilla se extiende CORTE anchos de banda más allá de los datos, como en seaborn
+CORTE = 3
+# El núcleo se trunca a TRUNCADO desviaciones (su peso más allá es < 1e-3 del máximo)
+TRUNCADO = 4
+
+MAX_ENTRADAS = 64
+
+_densidades = OrderedDict()     # huella de datos y parámetros -> (ejes..., densidad)
+_candado = threading.Lock()
+
+
+def _huella(*partes):
+    h = hashlib.sha1()
+    for parte in partes:
+        if isinstance(parte, np.ndarray):
+            h.update(str(parte.dtype).encode("utf-8"))
+            h.update(np.ascontiguousarray(parte).tobytes())
+        else:
+            h.update(repr(parte).encode("utf-8"))
+        h.update(b"\x1f")
+    return h.hexdigest()
+
+
+def _memoizar(clave, calcular):
+    with _candado:
+        if clave in _densidades:
+            _densidades.move_to_end(clave)
+            return _densidades[clave]
+    resultado = calcular()
+    with _candado:
+        _densidades[clave] = resultado
+        while len(_densidades) > MAX_ENTRADAS:
+            _densidades.popitem(last=False)
+    return resultado
+
+
+def _preparar(columnas, pesos):
+    """Matriz (n, d) de las filas finitas y sus pesos"""
+    datos = np.column_stack([np.asarray(c, dtype="float64") for c in columnas])
+    pesos = np.ones(len(datos)) if pesos is None else np.asarray(pesos, dtype="float64")
+    validos = np.isfinite(datos).all(axis=1) & np.isfinite(pesos) & (pesos > 0)
+    return datos[validos], pesos[validos]
+
+
+def covarianza_scott(datos, pesos, bw_adjust=1.0):
+    """Covarianza del núcleo como scipy.stats.gaussian_kde: regla de Scott con n efectivo"""
+    d = datos.shape[1]
+    n_efectivo = pesos.sum() ** 2 / (pesos ** 2).sum()
+    factor = n_efectivo ** (-1.0 / (d + 4)) * bw_adjust
+    covarianza = np.atleast_2d(np.cov(datos, rowvar=False, aweights=pesos))
+    return covarianza * factor ** 2
+
+
+def _binning_lineal(datos, pesos, inicio, paso, forma):
+    """Reparte el peso de cada punto entre los 2^d nodos vecinos de la rejilla"""
+    rejilla = np.zeros(forma)
+    posicion = (datos - inicio) / paso
+    base = np.floor(posicion).astype("int64")
+    resto = posicion - base
+    d = datos.shape[1]
+    for esquina in range(2 ** d):
+        desplazamiento = np.array([(esquina >> k) & 1 for k in range(d)])
+        nodo = base + desplazamiento
+        peso = pesos * np.prod(np.where(desplazamiento, resto, 1 - resto), axis=1)
+        dentro = np.all((nodo >= 0) & (nodo < forma), axis=1)
+        np.add.at(rejilla, tuple(nodo[dentro].T), peso[dentro])
+    return rejilla
+
+
+def _densidad_rejilla(datos, pesos, covarianza, bajo, alto, tamano):
+    """Densidad en una rejilla regular entre ``bajo`` y ``alto`` (d dims) por convolución FFT.
+
+    Coste O(n + G log G): el binning es lineal en n y la convolución depende
+    solo del tamaño G de la rejilla.
+    """
+    d = datos.shape[1]
+    paso = (alto - bajo) / (tamano - 1)
+    desviaciones = np.sqrt(np.diag(covarianza))
+    radio = np.ceil(TRUNCADO * desviaciones / paso).astype("int64")
+
+    # Los puntos a más de TRUNCADO desviaciones de la zona evaluada no contribuyen
+    inicio = bajo - radio * paso
+    forma = tuple(tamano + 2 * radio)
+    cerca = np.all((datos >= inicio) & (datos <= inicio + (np.array(forma) - 1) * paso), axis=1)
+    rejilla = _binning_lineal(datos[cerca], pesos[cerca], inicio, paso, forma)
+
+    # Núcleo gaussiano (con covarianza completa) evaluado en los desplazamientos de la rejilla
+    ejes = [np.arange(-r, r + 1) * p for r, p in zip(radio, paso)]
+    offsets = np.stack(np.meshgrid(*ejes, indexing="ij"), axis=-1)
+    inversa = np.linalg.inv(covarianza)
+    exponente = np.einsum("...i,ij,...j->...", offsets, inversa, offsets)
+    nucleo = np.exp(-0.5 * exponente) / np.sqrt((2 * np.pi) ** d * np.linalg.det(covarianza))
+
+    tamano_fft = [f + k - 1 for f, k in zip(forma, nucleo.shape)]
+    ejes_fft = tuple(range(d))
+    convolucion = np.fft.irfftn(
+        np.fft.rfftn(rejilla, tamano_fft, ejes_fft) * np.fft.rfftn(nucleo, tamano_fft, ejes_fft), tamano_fft, ejes_fft
+    )
+    # Recorte "same" y después la zona evaluada, sin el margen
+    recorte = tuple(slice(k // 2 + r, k // 2 + r + tamano) for k, r in zip(nucleo.shape, radio))
+    densidad = np.clip(convolucion[recorte], 0, None) / pesos.sum()
+    return [np.linspace(b, a, tamano) for b, a in zip(bajo, alto)], densidad
+
+
+def kde_1d(valores, pesos=None, bw_adjust=1.0, clip=None, tamano=TAMANO_1D):
+    """(x, densidad) de un KDE gaussiano ponderado, como sns.kdeplot con los mismos parámetros.
+
+    ``clip`` limita la zona evaluada, no los datos: la densidad sigue
+    normalizada sobre todos los puntos.
+    """
+    datos, pesos = _preparar([valores], pesos)
+    clave = _huella("1d", datos, pesos, bw_adjust, clip, tamano)
+
+    def calcular():
+        if len(datos) < 2:
+            return np.empty(0), np.empty(0)
+        covarianza = covarianza_scott(datos, pesos, bw_adjust)
+        ancho = np.sqrt(covarianza[0, 0])
+        bajo, alto = datos.min() - CORTE * ancho, datos.max() + CORTE * ancho
+        if clip is not None:
+            bajo, alto = max(bajo, clip[0]), min(alto, clip[1])
+        if not ancho > 0 or not alto > bajo:
+            return np.empty(0), np.empty(0)
+        (x,), densidad = _densidad_rejilla(datos, pesos, covarianza, np.array([bajo]), np.array([alto]), tamano)
+        return x, densidad
+
+    return _memoizar(clave, calcular)
+
+
+def kde_2d(x, y, pesos=None, bw_adjust=1.0, tamano=TAMANO_2D):
+    """(xs, ys, densidad[len(ys), len(xs)]) de un KDE gaussiano ponderado en 2D
+
+    La densidad va indexada [fila=y, columna=x], lista para contourf(xs, ys, densidad).
+    """
+    datos, pesos = _preparar([x, y], pesos)
+    clave = _huella("2d", datos, pesos, bw_adjust, tamano)
+
+    def calcular():
+        if len(datos) < 3:
+            return np.empty(0), np.empty(0), np.empty((0, 0))
+        covarianza = covarianza_scott(datos, pesos, bw_adjust)
+        if not np.linalg.det(covarianza) > 0:
+            return np.empty(0), np.empty(0), np.empty((0, 0))
+        anchos = np.sqrt(np.diag(covarianza))
+        bajo, alto = datos.min(axis=0) - CORTE * anchos, datos.max(axis=0) + CORTE * anchos
+        (xs, ys), densidad = _densidad_rejilla(datos, pesos, covarianza, bajo, alto, tamano)
+        return xs, ys, densidad.T
+
+    return _memoizar(clave, calcular)
+
+
+def niveles_isoproporcion(densidad, thresh=0.05, niveles=10):
+    """Niveles de contorno que encierran proporciones de masa, como seaborn (thresh, levels)"""
+    valores = np.sort(np.ravel(densidad))[::-1]
+    acumulada = np.cumsum(valores) / valores.sum()
+    proporciones = np.linspace(thresh, 1, niveles)
+    limites = np.take(valores, np.searchsorted(acumulada, 1 - proporciones), mode="clip")
+    return np.unique(np.r_[limites, valores[0]])
+
+
+def dibujar_kde_1d(ax, valores, color=None, label=None, **kwargs):
+    """Curva rellena en ``ax`` como sns.kdeplot(fill=True); kwargs van a kde_1d"""
+    x, densidad = kde_1d(valores, **kwargs)
+    ax.fill_between(x, densidad, color=color, alpha=0.25, linewidth=0, label=label)
+    ax.plot(x, densidad, color=color)
@@ -1,101 +1,288 @@
+import json
 import os
+from string import Template
 import folium
-from folium.plugins import MarkerCluster, HeatMap
+from folium.plugins import FastMarkerCluster
+from branca.colormap import StepColormap
+from branca.element import MacroElement
+from jinja2 import Template as PlantillaJinja
+import numpy as np
 import pandas as pd
 import seaborn as sns
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 from PIL import Image
 import streamlit as st
+from binning import RESOLUCIONES_M, agregar_hexagonos, geojson_hexagonos
+from kde import kde_2d, niveles_isoproporcion
+from dispersion import OPCIONES_ZONA, dispersion, dispersion_mapa, mostrar_zona, zona_seleccionada
+
+
+CENTRO_VALENCIA = [39.4699, -0.3763]
+
+# Los marcadores y sus popups se crean en el navegador a partir de filas
+# [lat, lon, valor1, valor2...]; el HTML solo lleva los valores
+_CALLBACK_MARCADOR = """function (row) {
+    var icono = L.AwesomeMarkers.icon({icon: %s, markerColor: %s, prefix: 'glyphicon'});
+    return L.marker(new L.LatLng(row[0], row[1]), {icon: icono}).bindPopup(%s);
+}"""
+
+
+def _con_coordenadas(df, columnas=()):
+    """Filas con latitud, longitud y el resto de ``columnas`` informadas"""
+    requeridas = ['latitude', 'longitude', *columnas]
+    if any(c not in df.columns for c in requeridas):
+        return df.iloc[0:0]
+    return df.dropna(subset=requeridas)
+
+
+def _valores_popup(df, columna):
+    """Columna lista para el popup: números a 2 decimales y N/A en los vacíos"""
+    if columna not in df.columns:
+        return pd.Series("N/A", index=df.index, dtype=object)
+    valores = df[columna]
+    if pd.api.types.is_numeric_dtype(valores):
+        valores = valores.astype(float).round(2)
+    return valores.astype(object).where(valores.notna(), "N/A")
+
+
+def _popup_js(campos, desde=2):
+    """Expresión JS que arma el popup desde row[desde], row[desde + 1]...
+
+    ``campos`` es una lista de (etiqueta, columna, plantilla) con ``{}`` donde va el valor.
+    """
+    partes = []
+    for i, (etiqueta, _, plantilla) in enumerate(campos):
+        antes, despues = plantilla.split("{}")
+        prefijo = ("<br>" if i else "") + f"<b>{etiqueta}:</b> {antes}"
+        partes.append(f"{json.dumps(prefijo)} + row[{i + desde}] + {json.dumps(despues)}")
+    return " + ".join(partes)
+
+
+def capa_marcadores(df, campos, color="blue", icono="home"):
+    """Un FastMarkerCluster con todos los anuncios en un único array de datos"""
+    validos = _con_coordenadas(df)
+    datos = pd.DataFrame({
+        "lat": validos['latitude'].astype(float).round(6),
+        "lon": validos['longitude'].astype(float).round(6),
+        **{columna: _valores_popup(validos, columna) for _, columna, _ in campos},
+    })
+    callback = _CALLBACK_MARCADOR % (json.dumps(icono), json.dumps(color), _popup_js(campos))
+    return FastMarkerCluster(datos.values.tolist(), callback=callback)
+
+
+_COLORES_HEXAGONOS = ['#ffffb2', '#fed976', '#feb24c', '#fd8d3c', '#fc4e2a', '#e31a1c', '#b10026']
+
+
+def _colores_cuantiles(valores, etiqueta, paleta=_COLORES_HEXAGONOS):
+    """Color de cada valor por clases de cuantiles (gris si falta) y la leyenda"""
+    valores = pd.Series(valores, dtype="float64")
+    cortes = np.unique(np.quantile(valores.dropna(), np.linspace(0, 1, len(paleta) + 1)))
+    if len(cortes) < 2:
+        cortes = np.array([cortes[0], cortes[0] + 1])
+    colores = paleta[:len(cortes) - 1]
+    clase = np.clip(np.searchsorted(cortes, valores.to_numpy(), side="right") - 1, 0, len(colores) - 1)
+    por_fila = np.where(valores.isna(), "#cccccc", np.asarray(colores, dtype=object)[clase])
+    leyenda = StepColormap(colores, index=list(cortes), vmin=float(cortes[0]), vmax=float(cortes[-1]), caption=etiqueta)
+    return por_fila, leyenda
+
+
+def capa_hexagonos(df, tamano_m=RESOLUCIONES_M[1], metrica="precio_medio", etiqueta="Precio medio (€)"):
+    """Coropleta de hexágonos coloreados por ``metrica`` y su leyenda.
+
+    Cada hexágono lleva su color en properties.style (clases por cuantiles) y un
+    tooltip con nº de anuncios, precio medio, ROI mediano y ocupación media.
+    """
+    celdas = agregar_hexagonos(df, tamano_m)
+    if celdas[metrica].isna().all():
+        return None, None
+
+    colores, leyenda = _colores_cuantiles(celdas[metrica], etiqueta)
+    geojson = geojson_hexagonos(celdas)
+    for feature, color in zip(geojson["features"], colores):
+        feature["properties"]["style"] = {"fillColor": color, "color": color, "weight": 1, "fillOpacity": 0.6}
+
+    capa = folium.GeoJson(
+        geojson,
+        name=etiqueta,
+        tooltip=folium.GeoJsonTooltip(
+            fields=["n_anuncios", "precio_medio", "roi_mediano", "ocupacion_media"],
+            aliases=["Anuncios:", "Precio medio (€):", "ROI mediano (%):", "Ocupación media (días):"],
+        ),
+    )
+    return capa, leyenda
+
+
+# Capa de barrios desde la topología de geometria.py: decodifica en el navegador
+# solo el nivel de detalle del zoom actual y lo sustituye al cambiar de nivel
+_SCRIPT_CAPA_TOPOLOGIA = """
+{% macro script(this, kwargs) %}
+(function () {
+    var mapa = {{ this._parent.get_name() }};
+    var topologia = {{ this.datos }};
+    var campos = {{ this.campos }};
+    var detalle = topologia.arcs, decodificados = {}, actual = null;
+    var capa = L.geoJson(null, {
+        style: function (f) { return f.properties.style; },
+        onEachFeature: function (f, l) {
+            l.bindTooltip(campos.map(function (c) {
+                var v = f.properties[c[1]];
+                return '<b>' + c[0] + ':</b> ' + (v === null || v === undefined ? '-' : v);
+            }).join('<br>'));
+        }
+    }).addTo(mapa);
+
+    function dibujar() {
+        var z = mapa.getZoom(), nivel = 0;
+        topologia.niveles.forEach(function (n, i) { if (z >= n[0]) { nivel = i; } });
+        if (nivel === actual) { return; }
+        actual = nivel;
+        if (!(nivel in decodificados)) {
+            topologia.arcs = topologia.niveles[nivel][1] || detalle;
+            decodificados[nivel] = topojson.feature(topologia, topologia.objects.{{ this.objeto }});
+        }
+        capa.clearLayers();
+        capa.addData(decodificados[nivel]);
+    }
+    mapa.on('zoomend', dibujar);
+    dibujar();
+})();
+{% endmacro %}
+"""
 
+_TOPOJSON_CLIENT = "https://unpkg.com/topojson-client@3/dist/topojson-client.min.js"
 
 
+def crear_mapa_barrios(agregados, ruta_guardado, topologia, metrica, etiqueta, objeto="barrios"):
+    """Coropleta de los barrios de ``topologia`` (geometria.py) con los agregados.
 
+    ``agregados`` está indexado por el nombre del barrio del polígono; sus
+    columnas se añaden como propiedades para el tooltip.
+    """
+    with open(topologia, "r", encoding="utf-8") as f:
+        datos = json.load(f)
+    if agregados.empty or agregados[metrica].isna().all():
+        return
 
-def crear_mapa_oportunidades(df, nombre_archivo="mapa_oportunidad_valencia.html"):
-    centro_valencia = [39.4699, -0.3763]
-    mapa = folium.Map(location=centro_valencia, zoom_start=13)
-    marker_cluster = MarkerCluster().add_to(mapa)
-
-    for _, row in df.iterrows():
-        lat = row.get('latitude')
-        lon = row.get('longitude')
-        price = row.get('price', 'N/A')
-        roi = row.get('ROI (%)', 'N/A')
-
-        if pd.notna(lat) and pd.notna(lon):
-            popup_text = f"""
-            <b>Precio:</b> €{price}<br>
-            <b>ROI Bruto:</b> {roi}%
-            """
-            folium.Marker(
-                location=[lat, lon],
-                popup=popup_text,
-                icon=folium.Icon(color='blue', icon='home')
-            ).add_to(marker_cluster)
+    colores, leyenda = _colores_cuantiles(agregados[metrica], etiqueta)
+    color_barrio = dict(zip(agregados.index.astype(str), colores))
+    propiedades = agregados.round(2).astype(object).where(agregados.notna(), None)
+    propiedades.index = propiedades.index.astype(str)
+    vacias = {c: None for c in agregados.columns}
+    for geometria in datos["objects"][objeto]["geometries"]:
+        nombre = geometria["properties"].get("neighbourhood")
+        fila = propiedades.loc[nombre].to_dict() if nombre in propiedades.index else vacias
+        color = color_barrio.get(nombre, "#cccccc")
+        geometria["properties"].update(fila, style={"fillColor": color, "color": "#555555", "weight": 1, "fillOpacity": 0.7})
+
+    mapa = folium.Map(location=CENTRO_VALENCIA, zoom_start=12)
+    mapa.get_root().header.add_child(folium.JavascriptLink(_TOPOJSON_CLIENT))
+    capa = MacroElement()
+    capa._template = PlantillaJinja(_SCRIPT_CAPA_TOPOLOGIA)
+    # JSON compacto ya serializado: el filtro tojson de jinja lo engordaría con espacios
+    capa.datos = json.dumps(datos, separators=(",", ":"), ensure_ascii=False).replace("</", "<\\/")
+    capa.campos = json.dumps([["Barrio", "neighbourhood"], *[[c, c] for c in agregados.columns]])
+    capa.objeto = objeto
+    mapa.add_child(capa)
+    leyenda.add_to(mapa)
+    mapa.save(ruta_guardado)
 
-    mapa.save(nombre_archivo)
 
+def _añadir_hexagonos(mapa, df, tamano_m=RESOLUCIONES_M[1]):
+    capa, leyenda = capa_hexagonos(df, tamano_m)
+    if capa is not None:
+        capa.add_to(mapa)
+        leyenda.add_to(mapa)
 
-def crear_mapa_precios_valencia(df, nombre_archivo="mapa_precio_valencia.html"):
-    centro_valencia = [39.4699, -0.3763]
-    mapa = folium.Map(location=centro_valencia, zoom_start=13)
 
-    heat_data = []
+def crear_mapa_oportunidades(df, nombre_archivo="mapa_oportunidad_valencia.html"):
+    mapa = folium.Map(location=CENTRO_VALENCIA, zoom_start=13)
+    campos = [("Precio", 'price', "€{}"), ("ROI Bruto", 'ROI (%)', "{}%")]
+    capa_marcadores(df, campos, color='blue').add_to(mapa)
+    mapa.save(nombre_archivo)
+
 
-    for _, row in df.iterrows():
-        lat = row.get('latitude')
-        lon = row.get('longitude')
-        price = row.get('price')
-        if pd.notna(lat) and pd.notna(lon) and pd.notna(price):
-            heat_data.append([lat, lon, price])
+# Mapa Leaflet mínimo que pide al servidor local (servidor_mapas.py) solo los
+# clusters o anuncios del viewport actual; el HTML no contiene datos
+_PLANTILLA_MAPA_CLUSTERS = Template("""<!DOCTYPE html>
+<html><head><meta charset="utf-8">
+<link rel="stylesheet" href="https://unpkg.com/leaflet@1.9.4/dist/leaflet.css">
+<script src="https://unpkg.com/leaflet@1.9.4/dist/leaflet.js"></script>
+<style>
+html, body, #mapa {height: 100%; margin: 0;}
+.cluster {background: rgba(49, 130, 189, 0.75); color: #fff; border-radius: 50%; text-align: center;
+          font: bold 12px sans-serif; border: 2px solid #fff;}
+</style></head>
+<body><div id="mapa"></div>
+<script>
+var mapa = L.map('mapa').setView($centro, $zoom);
+L.tileLayer('https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png',
+            {attribution: '&copy; OpenStreetMap contributors'}).addTo(mapa);
+var capa = L.layerGroup().addTo(mapa);
+var peticion = 0;
+
+function cargar() {
+    var b = mapa.getBounds(), id = ++peticion;
+    var url = $url + '/clusters?indice=' + encodeURIComponent($indice)
+        + '&bbox=' + [b.getWest(), b.getSouth(), b.getEast(), b.getNorth()].join(',')
+        + '&zoom=' + mapa.getZoom();
+    fetch(url).then(function (r) { return r.json(); }).then(function (datos) {
+        if (id !== peticion) { return; }  // respuesta de un viewport anterior
+        capa.clearLayers();
+        datos.clusters.forEach(function (row) {
+            var lado = Math.round(24 + 8 * Math.log10(row[2]));
+            var icono = L.divIcon({className: 'cluster', iconSize: [lado, lado],
+                                   html: '<div style="line-height:' + (lado - 4) + 'px">' + row[2] + '</div>'});
+            // Resumen al pasar el ratón; al pulsar se acerca el zoom sobre el cluster
+            L.marker([row[0], row[1]], {icon: icono}).bindTooltip($popup_cluster)
+                .on('click', function () { mapa.setView([row[0], row[1]], mapa.getZoom() + 2); })
+                .addTo(capa);
+        });
+        datos.puntos.forEach(function (row) {
+            L.circleMarker([row[0], row[1]], {radius: 5, color: '#3182bd', fillOpacity: 0.8})
+                .bindPopup($popup_punto).addTo(capa);
+        });
+    });
+}
+mapa.on('moveend', cargar);
+cargar();
+</script></body></html>
+""")
+
+
+def html_mapa_clusters(url_base, indice, campos, centro=CENTRO_VALENCIA, zoom=13):
+    """HTML de un mapa que carga clusters por viewport desde ``url_base``/clusters.
+
+    ``campos`` es una lista de (etiqueta, valor, plantilla) en el orden de los
+    valores con los que se construyó el índice.
+    """
+    popup_cluster = '"<b>Anuncios:</b> " + row[2] + "<br>" + ' + _popup_js(campos, desde=3)
+    return _PLANTILLA_MAPA_CLUSTERS.substitute(
+        centro=json.dumps(list(centro)),
+        zoom=int(zoom),
+        url=json.dumps(url_base.rstrip("/")),
+        indice=json.dumps(indice),
+        popup_cluster=popup_cluster,
+        popup_punto=_popup_js(campos),
+    )
 
-    if heat_data:
-        HeatMap(heat_data, radius=10, blur=15, max_zoom=13).add_to(mapa)
 
+def crear_mapa_precios_valencia(df, nombre_archivo="mapa_precio_valencia.html", tamano_m=RESOLUCIONES_M[1]):
+    mapa = folium.Map(location=CENTRO_VALENCIA, zoom_start=13)
+    _añadir_hexagonos(mapa, df, tamano_m)
     mapa.save(nombre_archivo)
 
 
 def crear_mapa_propiedades_valencia(df, nombre_archivo="mapa_propiedades_valencia.html"):
-    centro_valencia = [39.4699, -0.3763]
-    mapa = folium.Map(location=centro_valencia, zoom_start=13)
-    marker_cluster = MarkerCluster().add_to(mapa)
-
-    for _, row in df.iterrows():
-        lat = row.get('latitude')
-        lon = row.get('longitude')
-        price = row.get('price', 'N/A')
-        room_type = row.get('room_type', 'N/A')
-
-        if pd.notna(lat) and pd.notna(lon):
-            popup_text = f"""
-            <b>Precio:</b> €{price}<br>
-            <b>Tipo:</b> {room_type}
-            """
-            folium.Marker(
-                location=[lat, lon],
-                popup=popup_text,
-                icon=folium.Icon(color='green', icon='home')
-            ).add_to(marker_cluster)
-
+    mapa = folium.Map(location=CENTRO_VALENCIA, zoom_start=13)
+    campos = [("Precio", 'price', "€{}"), ("Tipo", 'room_type', "{}")]
+    capa_marcadores(df, campos, color='green').add_to(mapa)
     mapa.save(nombre_archivo)
 
 
-def crear_mapa_calor_valencia(df, nombre_archivo="mapa_calor_precios_valencia.html"):
-    centro_valencia = [39.4699, -0.3763]
-    mapa = folium.Map(location=centro_valencia, zoom_start=13)
-
-    heat_data = []
-
-    for _, row in df.iterrows():
-        lat = row.get('latitude')
-        lon = row.get('longitude')
-        price = row.get('price')
-        if pd.notna(lat) and pd.notna(lon) and pd.notna(price):
-            heat_data.append([lat, lon, price])
-
-    if heat_data:
-        HeatMap(heat_data, radius=10, blur=15, max_zoom=13).add_to(mapa)
-
+def crear_mapa_calor_valencia(df, nombre_archivo="mapa_calor_precios_valencia.html", tamano_m=RESOLUCIONES_M[1]):
+    mapa = folium.Map(location=CENTRO_VALENCIA, zoom_start=13)
+    _añadir_hexagonos(mapa, df, tamano_m)
     mapa.save(nombre_archivo)
 
 import os
@@ -111,42 +298,32 @@ def crear_heatmap_ocupacion_valencia(df, ruta_guardado="../img/valencia_heatmap_
         print("No hay datos para Valencia con ocupación estimada.")
         return
     
-    plt.figure(figsize=(10,8))
-    sns.kdeplot(
-        x=df_valencia['longitude'],
-        y=df_valencia['latitude'],
-        weights=df_valencia['estimated_occupancy_l365d'],
-        fill=True,
-        cmap="Reds",
+    # Figure sin pyplot: no toca el estado global y se puede generar desde varios hilos
+    fig = Figure(figsize=(10,8))
+    ax = fig.subplots()
+    # KDE ponderado por rejilla + FFT; mismos bw_adjust y thresh que el sns.kdeplot anterior
+    xs, ys, densidad = kde_2d(
+        df_valencia['longitude'],
+        df_valencia['latitude'],
+        pesos=df_valencia['estimated_occupancy_l365d'],
         bw_adjust=0.5,
-        thresh=0.1
     )
-    plt.title("Heatmap de Ocupación Estimada en Valencia")
-    plt.xlabel("Longitud")
-    plt.ylabel("Latitud")
+    if densidad.size:
+        ax.contourf(xs, ys, densidad, levels=niveles_isoproporcion(densidad, thresh=0.1), cmap="Reds")
+    ax.set_title("Heatmap de Ocupación Estimada en Valencia")
+    ax.set_xlabel("Longitud")
+    ax.set_ylabel("Latitud")
     
-    plt.savefig(ruta_guardado)
-    plt.close()
+    fig.savefig(ruta_guardado)
     print(f"Heatmap guardado en {ruta_guardado}")
 
-def crear_mapa_precios_valencia(df, ruta_guardado="../docs/mapa_precio_valencia.html"):
+def crear_mapa_precios_valencia(df, ruta_guardado="../docs/mapa_precio_valencia.html", tamano_m=RESOLUCIONES_M[1]):
     # Crear carpeta si no existe
     os.makedirs(os.path.dirname(ruta_guardado), exist_ok=True)
 
-    centro_valencia = [39.4699, -0.3763]
-    mapa = folium.Map(location=centro_valencia, zoom_start=13)
-
-    heat_data = []
-
-    for _, row in df.iterrows():
-        lat = row.get('latitude')
-        lon = row.get('longitude')
-        price = row.get('price')
-        if pd.notna(lat) and pd.notna(lon) and pd.notna(price):
-            heat_data.append([lat, lon, price])
-
-    if heat_data:
-        HeatMap(heat_data, radius=15, blur=20, max_zoom=13).add_to(mapa)
+    # Precio medio por hexágono (el HeatMap mostraba densidad de anuncios, no precio)
+    mapa = folium.Map(location=CENTRO_VALENCIA, zoom_start=13)
+    _añadir_hexagonos(mapa, df, tamano_m)
 
     mapa.save(ruta_guardado)
     print(f"Mapa de precios guardado en {ruta_guardado}")
@@ -167,8 +344,7 @@ def display_interactive_map(path_html, titulo):
 def crear_mapa_roi_por_tipo(df, ruta_guardado="../docs/valencia_roi_by_type_map.html"):
     os.makedirs(os.path.dirname(ruta_guardado), exist_ok=True)
 
-    centro_valencia = [39.4699, -0.3763]
-    mapa = folium.Map(location=centro_valencia, zoom_start=13)
+    mapa = folium.Map(location=CENTRO_VALENCIA, zoom_start=13)
 
     colores = {
         "Entire home/apt": "blue",
@@ -177,24 +353,31 @@ def crear_mapa_roi_por_tipo(df, ruta_guardado="../docs/valencia_roi_by_type_map.
         "Hotel room": "purple"
     }
 
-    for _, row in df.iterrows():
-        lat = row.get("latitude")
-        lon = row.get("longitude")
-        roi = row.get("ROI (%)")
-        tipo = row.get("room_type", "Otro")
-
-        if pd.notna(lat) and pd.notna(lon) and pd.notna(roi):
-            popup = f"<b>Tipo:</b> {tipo}<br><b>ROI:</b> {roi:.2f}%"
-            color = colores.get(tipo, "gray")
-            folium.CircleMarker(
-                location=[lat, lon],
-                radius=6,
-                popup=popup,
-                color=color,
-                fill=True,
-                fill_color=color,
-                fill_opacity=0.7
-            ).add_to(mapa)
+    # Una sola capa GeoJSON. El color va en properties.style, que folium aplica
+    # en el navegador sin style_function (el relleno hereda el color en Leaflet)
+    validos = _con_coordenadas(df, ["ROI (%)"])
+    tipo = validos["room_type"].astype(object).fillna("Otro") if "room_type" in validos.columns \
+        else pd.Series("Otro", index=validos.index, dtype=object)
+    puntos = pd.DataFrame({
+        "lon": validos["longitude"].astype(float).round(6),
+        "lat": validos["latitude"].astype(float).round(6),
+        "color": tipo.map(colores).fillna("gray"),
+        "tipo": tipo.astype(str),
+        "roi": validos["ROI (%)"].astype(float).round(2),
+    })
+    geojson = {
+        "type": "FeatureCollection",
+        "features": [
+            {"type": "Feature", "geometry": {"type": "Point", "coordinates": [lon, lat]},
+             "properties": {"style": {"color": color}, "tipo": tipo, "roi": roi}}
+            for lon, lat, color, tipo, roi in puntos.itertuples(index=False, name=None)
+        ],
+    }
+    folium.GeoJson(
+        geojson,
+        marker=folium.CircleMarker(radius=6, fill=True, fill_opacity=0.7),
+        popup=folium.GeoJsonPopup(fields=["tipo", "roi"], aliases=["Tipo:", "ROI (%):"]),
+    ).add_to(mapa)
 
     mapa.save(ruta_guardado)
     print(f"Mapa ROI por tipo guardado en {ruta_guardado}")
@@ -234,17 +417,6 @@ import pandas as pd
 import plotly.express as px
 from PIL import Image
 
-# Cargar datos
-@st.cache_data
-def load_data(path):
-    try:
-        return pd.read_csv(path)
-    except FileNotFoundError:
-        st.error(f"No se pudo encontrar el archivo de datos: {path}")
-        return pd.DataFrame()  # Devuelve un df vacío si no encuentra archivo
-
-df_ciudad = load_data("data/Valencia_limpio.csv")
-
 # Función para mostrar mapas interactivos
 def display_interactive_map(path, title=None):
     try:
@@ -264,10 +436,12 @@ def display_image(path, caption=None):
     except FileNotFoundError:
         st.warning(f"No se pudo encontrar la imagen: {path}")
 
+# ROI por barrio y mapa de rentabilidad; ``df_ciudad`` es el de la ciudad en uso (load_data(ciudad))
+def mostrar_rentabilidad_barrios(df_ciudad):
     if not df_ciudad.empty:
         # ROI neto por barrio (Valencia)
         if 'Net ROI (%)' in df_ciudad.columns and 'neighbourhood' in df_ciudad.columns:
-            roi_barrio = df_ciudad.groupby('neighbourhood')['Net ROI (%)'].mean().sort_values(ascending=False).head(15)
+            roi_barrio = df_ciudad.groupby('neighbourhood', observed=True)['Net ROI (%)'].mean().sort_values(ascending=False).head(15)
             if not roi_barrio.empty:
                 fig_roi = px.bar(
                     roi_barrio,
@@ -285,7 +459,7 @@ def display_image(path, caption=None):
 
         # ROI bruto por barrio (Valencia)
         if 'ROI (%)' in df_ciudad.columns and 'neighbourhood' in df_ciudad.columns:
-            roi_barrio_bruto = df_ciudad.groupby('neighbourhood')['ROI (%)'].mean().sort_values(ascending=False).head(15)
+            roi_barrio_bruto = df_ciudad.groupby('neighbourhood', observed=True)['ROI (%)'].mean().sort_values(ascending=False).head(15)
             if not roi_barrio_bruto.empty:
                 fig_roi_bruto = px.bar(
                     roi_barrio_bruto,
@@ -339,16 +513,16 @@ def crear_evolucion_reseñas(df, ruta_guardado):
         print("No hay datos de reseñas para crear evolución")
         return
     
-    plt.figure(figsize=(12,6))
-    resumen.plot(kind='line', marker='o')
-    plt.title('Evolución mensual de número de reseñas en Valencia')
-    plt.xlabel('Mes')
-    plt.ylabel('Número de reseñas')
-    plt.grid(True)
-    plt.tight_layout()
+    fig = Figure(figsize=(12,6))
+    ax = fig.subplots()
+    resumen.plot(kind='line', marker='o', ax=ax)
+    ax.set_title('Evolución mensual de número de reseñas en Valencia')
+    ax.set_xlabel('Mes')
+    ax.set_ylabel('Número de reseñas')
+    ax.grid(True)
+    fig.tight_layout()
     
-    plt.savefig(ruta_guardado)
-    plt.close()
+    fig.savefig(ruta_guardado)
     print(f"Imagen de evolución de reseñas guardada en {ruta_guardado}")
 
     import streamlit as st
@@ -409,15 +583,20 @@ def mostrar_matriz_correlacion(df, columnas):
 def mostrar_relacion_precio_calificacion(df):
     st.markdown("#### Relación entre precio y calificación")
     if 'price' in df.columns and 'review_scores_rating' in df.columns:
-        fig = px.scatter(
+        color = 'room_type' if 'room_type' in df.columns else None
+        zona = zona_seleccionada("precio")
+        mostrar_zona(len(df), zona)
+        fig = dispersion(
             df,
             x='price',
             y='review_scores_rating',
-            color='room_type' if 'room_type' in df.columns else None,
+            zona=zona,
+            estratos=color,
+            color=color,
             title='Relación entre precio y calificación',
             labels={'price': 'Precio (€)', 'review_scores_rating': 'Calificación (0-100)', 'room_type': 'Tipo de habitación'}
         )
-        st.plotly_chart(fig, use_container_width=True, key="precio")
+        st.plotly_chart(fig, use_container_width=True, key="precio", **OPCIONES_ZONA)
     else:
         st.info("No hay datos suficientes de precio y calificación.")
 
@@ -451,11 +630,15 @@ def mostrar_mapa_correlaciones(df):
     else:
         df_plot['size_positive'] = df_plot['Net ROI (%)']
 
-    # Crear el mapa
-    fig = px.scatter_mapbox(
+    # Crear el mapa (submuestreado por barrio salvo en la zona seleccionada, que va completa)
+    zona = zona_seleccionada("mapa", x="lon", y="lat")
+    mostrar_zona(len(df_plot), zona)
+    fig = dispersion_mapa(
         df_plot,
         lat='latitude',
         lon='longitude',
+        zona=zona,
+        estratos='neighbourhood' if 'neighbourhood' in df_plot.columns else None,
         color='Net ROI (%)',
         size='size_positive',
         color_continuous_scale='Viridis',
@@ -465,7 +648,7 @@ def mostrar_mapa_correlaciones(df):
         title="Mapa de Correlaciones: ROI Neto por ubicación"
     )
 
-    st.plotly_chart(fig, use_container_width=True, key="mapa")
+    st.plotly_chart(fig, use_container_width=True, key="mapa", **OPCIONES_ZONA)
 
     import folium
 
@@ -483,5 +666,3 @@ def crear_mapa_valencia():
         folium.Marker(coords, tooltip=nombre).add_to(m)
 
     m.save("mapa_completo_valencia.html")
-
-crear_mapa_valencia()
@@ -0,0 +1,57 @@
+import json
+
+import numpy as np
+import pandas as pd
+import shapely
+from shapely import STRtree
+
+from precios_m2 import normalizar_barrio
+
+
+def cargar_poligonos(path):
+    """Geometrías de neighbourhoods.geojson y sus propiedades (barrio, distrito)"""
+    with open(path, "r", encoding="utf-8") as f:
+        features = json.load(f)["features"]
+    geometrias = shapely.from_geojson([json.dumps(feat["geometry"]) for feat in features])
+    props = pd.DataFrame([feat["properties"] for feat in features])
+    return geometrias, props
+
+
+def asignar_poligono(lat, lon, geometrias):
+    """Posición del polígono que contiene cada punto (-1 si ninguno), con un STRtree.
+
+    Los puntos en el borde entre dos polígonos se quedan con el primero.
+    """
+    lat = np.asarray(lat, dtype="float64")
+    lon = np.asarray(lon, dtype="float64")
+    resultado = np.full(len(lat), -1, dtype="int64")
+    validos = np.flatnonzero(np.isfinite(lat) & np.isfinite(lon))
+    puntos = shapely.points(lon[validos], lat[validos])
+    # Filtro por rectángulo en el árbol y test exacto solo sobre los candidatos
+    en_punto, en_poligono = STRtree(geometrias).query(puntos, predicate="within")
+    primeros = np.unique(en_punto, return_index=True)[1]
+    resultado[validos[en_punto[primeros]]] = en_poligono[primeros]
+    return resultado
+
+
+def unir_barrios(df, path, barrio="neighbourhood"):
+    """Barrio y distrito del polígono de cada anuncio y si coinciden con la etiqueta.
+
+    Devuelve un DataFrame alineado con ``df``: barrio_poligono, distrito_poligono
+    (nulos fuera de todos los polígonos) y coincide (la etiqueta de ``barrio``
+    normalizada es la del polígono).
+    """
+    geometrias, props = cargar_poligonos(path)
+    posiciones = asignar_poligono(df["latitude"], df["longitude"], geometrias)
+    dentro = posiciones >= 0
+
+    union = pd.DataFrame(index=df.index)
+    for columna, origen in (("barrio_poligono", "neighbourhood"), ("distrito_poligono", "neighbourhood_group")):
+        valores = np.full(len(df), None, dtype=object)
+        if origen in props.columns:
+            valores[dentro] = props[origen].to_numpy()[posiciones[dentro]]
+        union[columna] = pd.Categorical(valores)
+    union["coincide"] = (
+        normalizar_barrio(df[barrio]).to_numpy() == normalizar_barrio(union["barrio_poligono"]).to_numpy()
+    )
+    return union
@@ -0,0 +1,74 @@
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from artefactos import clave_artefacto, obtener_artefacto
+
+
+# Hilos de fondo: folium y matplotlib (con Figure, sin pyplot) se pueden generar
+# en paralelo sin compartir estado, y el hilo de Streamlit no espera por ellos
+MAX_HILOS = 2
+MAX_TAREAS = 256
+
+_pool = ThreadPoolExecutor(max_workers=MAX_HILOS, thread_name_prefix="precalculo")
+_tareas = OrderedDict()     # clave del artefacto -> Future con su ruta
+_candado = threading.Lock()
+
+
+def _caducada(futuro):
+    # Terminada con éxito pero el archivo ya se desalojó de la caché de artefactos.
+    # Las fallidas no: artefacto_listo informa del error y las descarta para reintentarlas
+    return futuro.done() and futuro.exception() is None and futuro.result() is not None \
+        and not os.path.exists(futuro.result())
+
+
+def programar(funcion, df, extension, columnas=None, **params):
+    """Encola ``obtener_artefacto`` en segundo plano y devuelve su Future.
+
+    Hay una sola tarea por clave de contenido: si los datos no cambian, volver a
+    programar el mismo artefacto no genera nada nuevo.
+    """
+    clave = clave_artefacto(funcion, df, columnas, **params)
+    with _candado:
+        futuro = _tareas.get(clave)
+        if futuro is None or _caducada(futuro):
+            futuro = _pool.submit(obtener_artefacto, funcion, df, extension, columnas, **params)
+            _tareas[clave] = futuro
+        _tareas.move_to_end(clave)
+        while len(_tareas) > MAX_TAREAS and _tareas[next(iter(_tareas))].done():
+            _tareas.popitem(last=False)
+    return futuro
+
+
+def artefacto_listo(funcion, df, extension, columnas=None, **params):
+    """(listo, ruta): ruta del artefacto si ya se generó; si no, queda encolado.
+
+    ``ruta`` es None si la función no generó nada. Si la generación falló, el
+    error se lanza una sola vez y la tarea se descarta: la siguiente consulta
+    la vuelve a encolar.
+    """
+    futuro = programar(funcion, df, extension, columnas, **params)
+    if not futuro.done():
+        return False, None
+    if futuro.exception() is not None:
+        clave = clave_artefacto(funcion, df, columnas, **params)
+        with _candado:
+            if _tareas.get(clave) is futuro:
+                del _tareas[clave]
+        raise futuro.exception()
+    return True, futuro.result()
+
+
+def precalentar(cargar, tareas):
+    """Carga los datos con ``cargar()`` en el pool y encola sobre ellos ``tareas``.
+
+    ``tareas`` es una lista de (funcion, extension, columnas, params). La carga
+    también va en segundo plano para no retrasar la primera pintura.
+    """
+    def _lanzar():
+        df = cargar()
+        if df is None:
+            return []
+        return [programar(funcion, df, extension, columnas, **params) for funcion, extension, columnas, params in tareas]
+    return _pool.submit(_lanzar)
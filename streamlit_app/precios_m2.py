@@ -0,0 +1,71 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+
+def normalizar_barrio(serie):
+    """Clave de unión para nombres de barrio: mayúsculas, sin tildes ni guiones.
+
+    Se normalizan solo los valores únicos y se mapean de vuelta, así que el coste
+    depende del nº de barrios y no del nº de anuncios.
+    """
+    unicos = pd.Series(pd.unique(serie.dropna().astype(str)))
+    claves = (
+        unicos.str.normalize("NFKD")
+        .str.encode("ascii", errors="ignore")
+        .str.decode("ascii")
+        .str.upper()
+        .str.replace(r"[-'’./]", " ", regex=True)
+        .str.replace(r"\s+", " ", regex=True)
+        .str.strip()
+    )
+    mapa = dict(zip(unicos, claves))
+    return serie.astype(object).map(mapa)
+
+
+def tabla_precio_m2(df, barrio="neighbourhood", precio="precio"):
+    """€/m² medio por barrio, indexado por la clave normalizada"""
+    tabla = df.assign(_clave=normalizar_barrio(df[barrio])).groupby("_clave")[precio].mean()
+    tabla.index.name = "clave_barrio"
+    return tabla
+
+
+def distritos_geojson(path):
+    """barrio -> distrito (clave normalizada) a partir de neighbourhoods.geojson"""
+    with open(path, "r", encoding="utf-8") as f:
+        features = json.load(f)["features"]
+    props = pd.DataFrame([feat["properties"] for feat in features])
+    if "neighbourhood_group" not in props.columns:
+        return pd.Series(dtype=object)
+    return pd.Series(
+        normalizar_barrio(props["neighbourhood_group"]).to_numpy(),
+        index=normalizar_barrio(props["neighbourhood"]).to_numpy(),
+    )
+
+
+def asignar_precio_m2(barrios, tabla, distritos=None, media_ciudad=None):
+    """€/m² para cada anuncio con un join vectorizado barrio -> distrito -> ciudad.
+
+    ``barrios`` es la columna de barrio de los anuncios; ``tabla`` sale de
+    ``tabla_precio_m2``; ``distritos`` (opcional) mapea clave de barrio a clave
+    de distrito. Devuelve el precio por fila y el nivel usado en cada una.
+    """
+    claves = normalizar_barrio(barrios)
+    precio = claves.map(tabla)
+    nivel = pd.Series(np.where(precio.notna(), "barrio", None), index=barrios.index, dtype=object)
+
+    if distritos is not None and len(distritos):
+        # Media del distrito: promedio de los barrios de la tabla que pertenecen a él
+        por_distrito = tabla.groupby(tabla.index.map(distritos)).mean()
+        faltan = precio.isna()
+        precio_distrito = claves[faltan].map(distritos).map(por_distrito)
+        precio[faltan] = precio_distrito
+        nivel[faltan & precio.notna()] = "distrito"
+
+    if media_ciudad is None:
+        media_ciudad = tabla.mean()
+    faltan = precio.isna()
+    precio[faltan] = media_ciudad
+    nivel[faltan] = "ciudad"
+    return precio.astype("float64"), nivel.astype("category")
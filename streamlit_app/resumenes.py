@@ -0,0 +1,177 @@
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+
+# Atípicos que se dibujan como mucho por caja; con más se toman estadísticos de
+# orden equiespaciados (siempre incluye el mínimo y el máximo)
+MAX_ATIPICOS = 200
+
+# Color de la primera traza en la plantilla por defecto, como px.box sin color
+COLOR_CAJAS = px.colors.qualitative.Plotly[0]
+
+
+def _finitos(valores):
+    valores = np.asarray(valores, dtype="float64")
+    return valores[np.isfinite(valores)]
+
+
+def _paso_redondo(bruto):
+    """Menor paso 1, 2, 5 x 10^k que no baja de ``bruto`` (como el autobin de plotly)"""
+    if not bruto > 0:
+        return 1.0
+    base = 10.0 ** np.floor(np.log10(bruto))
+    return next(base * m for m in (1, 2, 5, 10) if base * m >= bruto * (1 - 1e-9))
+
+
+def bordes_histograma(*series, nbins=40):
+    """Bordes comunes de como mucho ``nbins`` clases con un ancho redondo para todas las series"""
+    valores = np.concatenate([_finitos(s) for s in series]) if series else np.empty(0)
+    if valores.size == 0:
+        return np.array([0.0, 1.0])
+    minimo, maximo = valores.min(), valores.max()
+    paso = _paso_redondo((maximo - minimo) / nbins)
+    inicio = np.floor(minimo / paso) * paso
+    n = max(int(np.floor((maximo - inicio) / paso)) + 1, 1)
+    return inicio + paso * np.arange(n + 1)
+
+
+def conteos_histograma(valores, bordes, grupos=None):
+    """Conteos por clase: array (clases,) o, con ``grupos`` (códigos >= 0), (grupos, clases).
+
+    Una sola pasada con searchsorted + bincount; la última clase es cerrada por
+    la derecha como en np.histogram.
+    """
+    valores = np.asarray(valores, dtype="float64")
+    validos = np.isfinite(valores) & (valores >= bordes[0]) & (valores <= bordes[-1])
+    n_clases = len(bordes) - 1
+    clase = np.clip(np.searchsorted(bordes, valores[validos], side="right") - 1, 0, n_clases - 1)
+    if grupos is None:
+        return np.bincount(clase, minlength=n_clases)
+    grupos = np.asarray(grupos)[validos]
+    en_grupo = grupos >= 0
+    n_grupos = int(grupos.max()) + 1 if en_grupo.any() else 0
+    planos = np.bincount(grupos[en_grupo] * n_clases + clase[en_grupo], minlength=n_grupos * n_clases)
+    return planos.reshape(n_grupos, n_clases)
+
+
+def _normalizar(conteos, anchos, histnorm):
+    if histnorm is None:
+        return conteos
+    total = conteos.sum() or 1
+    if histnorm == "probability":
+        return conteos / total
+    if histnorm == "percent":
+        return 100 * conteos / total
+    if histnorm == "probability density":
+        return conteos / (total * anchos)
+    raise ValueError(f"histnorm no soportado: {histnorm}")
+
+
+def traza_histograma(conteos, bordes, histnorm=None, etiqueta_x=None, **kwargs):
+    """go.Bar con las clases ya contadas: un valor por clase en lugar de uno por fila"""
+    anchos = np.diff(bordes)
+    y = _normalizar(np.asarray(conteos), anchos, histnorm)
+    return go.Bar(
+        x=(bordes[:-1] + anchos / 2).tolist(),
+        y=y.tolist(),
+        width=anchos.tolist(),
+        customdata=np.column_stack([bordes[:-1], bordes[1:]]).tolist(),
+        hovertemplate=f"{etiqueta_x or 'x'}=%{{customdata[0]:.4g}} - %{{customdata[1]:.4g}}<br>"
+                      f"{histnorm or 'count'}=%{{y}}<extra>%{{fullData.name}}</extra>",
+        **kwargs,
+    )
+
+
+def histograma(df, x, nbins=40, color=None, histnorm=None, opacity=None, labels=None, title=None, range_x=None):
+    """Equivalente a px.histogram(..., barmode='overlay') con las clases calculadas en el servidor.
+
+    Todas las trazas comparten bordes, como en plotly; el tamaño de la figura
+    depende del nº de clases y de grupos, no del nº de anuncios.
+    """
+    labels = labels or {}
+    bordes = bordes_histograma(df[x], nbins=nbins)
+    fig = go.Figure()
+    if color is None:
+        fig.add_trace(traza_histograma(
+            conteos_histograma(df[x], bordes), bordes, histnorm, labels.get(x, x), opacity=opacity, name=""
+        ))
+    else:
+        codigos, nombres = pd.factorize(df[color])   # orden de aparición, como px
+        conteos = conteos_histograma(df[x], bordes, codigos)
+        for nombre, fila in zip(nombres, conteos):
+            fig.add_trace(traza_histograma(
+                fila, bordes, histnorm, labels.get(x, x), opacity=opacity, name=str(nombre), legendgroup=str(nombre)
+            ))
+        fig.update_layout(legend_title_text=labels.get(color, color))
+    fig.update_layout(
+        title=title, barmode="overlay", bargap=0,
+        xaxis_title=labels.get(x, x), yaxis_title=labels.get(histnorm or "count", histnorm or "count"),
+    )
+    if range_x is not None:
+        fig.update_xaxes(range=range_x)
+    return fig
+
+
+def resumen_caja(valores, max_atipicos=MAX_ATIPICOS):
+    """Cuartiles (interpolación lineal, como plotly), bigotes de Tukey y atípicos acotados"""
+    v = np.sort(_finitos(valores))
+    if v.size == 0:
+        return None
+    q1, mediana, q3 = np.percentile(v, [25, 50, 75])
+    rango = q3 - q1
+    # Los bigotes llegan al dato más extremo dentro de 1.5 IQR
+    dentro = v[(v >= q1 - 1.5 * rango) & (v <= q3 + 1.5 * rango)]
+    inferior, superior = (dentro[0], dentro[-1]) if dentro.size else (q1, q3)
+    atipicos = v[(v < inferior) | (v > superior)]
+    if atipicos.size > max_atipicos:
+        atipicos = atipicos[np.linspace(0, atipicos.size - 1, max_atipicos).round().astype(int)]
+    return {
+        "q1": q1, "mediana": mediana, "q3": q3, "inferior": inferior, "superior": superior,
+        "atipicos": atipicos, "n": int(v.size),
+    }
+
+
+def cajas(df, x, y, points="outliers", labels=None, title=None, max_atipicos=MAX_ATIPICOS):
+    """Equivalente a px.box(df, x=grupo, y=valor) con cuartiles precalculados.
+
+    Se envían cinco números por caja y como mucho ``max_atipicos`` puntos, en
+    una traza de marcadores aparte (go.Box no dibuja puntos con estadísticos dados).
+    """
+    labels = labels or {}
+    codigos, nombres = pd.factorize(df[x])
+    valores = df[y].to_numpy(dtype="float64")
+    # Filas ordenadas por grupo: cada grupo es un tramo contiguo
+    orden = np.argsort(codigos, kind="stable")
+    limites = np.searchsorted(codigos[orden], np.arange(len(nombres) + 1))
+
+    grupos, resumenes = [], []
+    for i, nombre in enumerate(nombres):
+        resumen = resumen_caja(valores[orden[limites[i]:limites[i + 1]]], max_atipicos)
+        if resumen is not None:
+            grupos.append(str(nombre))
+            resumenes.append(resumen)
+
+    fig = go.Figure(go.Box(
+        x=grupos,
+        q1=[r["q1"] for r in resumenes],
+        median=[r["mediana"] for r in resumenes],
+        q3=[r["q3"] for r in resumenes],
+        lowerfence=[r["inferior"] for r in resumenes],
+        upperfence=[r["superior"] for r in resumenes],
+        boxpoints=False,
+        marker_color=COLOR_CAJAS,
+        name="",
+        showlegend=False,
+    ))
+    if points:
+        atipicos_x = [g for g, r in zip(grupos, resumenes) for _ in range(r["atipicos"].size)]
+        atipicos_y = [float(v) for r in resumenes for v in r["atipicos"]]
+        fig.add_trace(go.Scatter(
+            x=atipicos_x, y=atipicos_y, mode="markers", marker=dict(color=COLOR_CAJAS, size=4),
+            name="", showlegend=False,
+            hovertemplate=f"{labels.get(x, x)}=%{{x}}<br>{labels.get(y, y)}=%{{y}}<extra></extra>",
+        ))
+    fig.update_layout(title=title, xaxis_title=labels.get(x, x), yaxis_title=labels.get(y, y))
+    return fig
@@ -0,0 +1,58 @@
+import numpy as np
+
+
+# Supuestos por defecto del análisis (mismos valores que los notebooks)
+GASTOS_ANUALES = 3000
+M2_MEDIOS = 70
+
+# Nombre de las columnas de ROI en cada ciudad: Valencia usa las etiquetas del
+# dashboard y Málaga las de calcular_roi() en malaga_eda.ipynb
+NOMBRES_VALENCIA = {"roi": "ROI (%)", "roi_neto": "Net ROI (%)"}
+NOMBRES_MALAGA = {"roi": "roi", "roi_neto": "net_roi"}
+
+
+def valores_por_fila(df, valor):
+    """Escalar, nombre de columna o array -> array float64 de longitud len(df)"""
+    if isinstance(valor, str):
+        return df[valor].to_numpy(dtype="float64", na_value=np.nan)
+    return np.broadcast_to(np.asarray(valor, dtype="float64"), (len(df),))
+
+
+def calcular_roi(
+    df,
+    precio_m2,
+    m2=M2_MEDIOS,
+    gastos_anuales=GASTOS_ANUALES,
+    ingresos=None,
+    precio="price",
+    ocupacion="days_rented",
+    costes_compra=0.0,
+    nombres=NOMBRES_VALENCIA,
+):
+    """Calcula ROI bruto/neto, yield y payback de cada anuncio con operaciones por columna.
+
+    Cada parámetro puede ser un escalar, el nombre de una columna de ``df`` o un
+    array con un valor por fila. Los ingresos anuales son la columna
+    ``ingresos`` si se indica y, si no, ``precio * ocupacion``.
+    ``costes_compra`` es la fracción sobre el valor del inmueble (ITP, notaría...)
+    que se suma a la inversión. Las columnas se añaden a ``df``, que se devuelve.
+    """
+    if ingresos is not None:
+        ingresos_anuales = valores_por_fila(df, ingresos)
+    else:
+        ingresos_anuales = valores_por_fila(df, precio) * valores_por_fila(df, ocupacion)
+
+    valor = valores_por_fila(df, precio_m2) * valores_por_fila(df, m2)
+    inversion = valor * (1 + valores_por_fila(df, costes_compra))
+    ingresos_netos = ingresos_anuales - valores_por_fila(df, gastos_anuales)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        df["annual_income"] = ingresos_anuales
+        df["estimated_property_value"] = valor
+        df[nombres["roi"]] = ingresos_anuales / inversion * 100
+        df["net_annual_income"] = ingresos_netos
+        df[nombres["roi_neto"]] = ingresos_netos / inversion * 100
+        df["Yield (%)"] = ingresos_anuales / valor * 100
+        # Años para recuperar la inversión; sin sentido si el ingreso neto no es positivo
+        df["Payback (años)"] = np.where(ingresos_netos > 0, inversion / ingresos_netos, np.nan)
+    return df
@@ -0,0 +1,247 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from clusters import consultar_clusters
+
+try:
+    import brotli
+    BROTLI_DISPONIBLE = True
+except ImportError:
+    BROTLI_DISPONIBLE = False
+
+
+# Puerto/host del servidor local y URL con la que lo ve el navegador. Solo se
+# arranca si MAPAS_URL_BASE está definida: un navegador remoto no llega a
+# localhost (el devcontainer solo reenvía el 8501) y bajo HTTPS un iframe HTTP
+# se bloquea como contenido mixto, así que por defecto los mapas van en línea
+PUERTO = int(os.environ.get("MAPAS_PUERTO", "8765"))
+HOST = os.environ.get("MAPAS_HOST", "127.0.0.1")
+URL_BASE = os.environ.get("MAPAS_URL_BASE")
+MAX_INDICES = 16
+
+# Copias precomprimidas de los mapas publicados, con nombre = hash del contenido
+ESTATICOS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "estaticos")
+MAX_ESTATICOS = 64
+
+_indices = OrderedDict()
+_estaticos = OrderedDict()  # nombre -> {"etag", "tipo", "variantes": {codificación: ruta}}
+_publicados = OrderedDict()  # (ruta, versión) -> nombre, acotado junto con _estaticos
+_candado = threading.Lock()
+
+
+def registrar_indice(nombre, indice):
+    """Publica un índice de ``clusters.indice_clusters`` bajo ``nombre`` (LRU de MAX_INDICES)"""
+    with _candado:
+        _indices[nombre] = indice
+        _indices.move_to_end(nombre)
+        while len(_indices) > MAX_INDICES:
+            _indices.popitem(last=False)
+
+
+def _obtener_indice(nombre):
+    with _candado:
+        indice = _indices.get(nombre)
+        if indice is not None:
+            _indices.move_to_end(nombre)
+        return indice
+
+
+def _comprimir(datos, destino, compresor):
+    if os.path.exists(destino):
+        # Reutilizada de un arranque anterior: el mtime marca su último uso
+        try:
+            os.utime(destino)
+        except OSError:
+            pass
+    else:
+        tmp = f"{destino}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(compresor(datos))
+        os.replace(tmp, destino)
+    return destino
+
+
+def publicar_estatico(ruta, version=None):
+    """Publica ``ruta`` precomprimida (gzip y brotli si está instalado) y devuelve su URL relativa.
+
+    ``version`` (p. ej. el mtime) identifica el contenido actual sin volver a
+    leerlo; sin ella se usa el mtime del archivo. La URL y el ETag son el hash
+    del contenido, así que un mapa que no cambia se revalida con un 304.
+    """
+    ruta = os.path.abspath(ruta)
+    if version is None:
+        version = os.stat(ruta).st_mtime_ns
+    with _candado:
+        nombre = _publicados.get((ruta, version))
+        if nombre in _estaticos:
+            _estaticos.move_to_end(nombre)
+            _publicados.move_to_end((ruta, version))
+            return f"/estaticos/{nombre}"
+
+    with open(ruta, "rb") as f:
+        datos = f.read()
+    etag = hashlib.sha1(datos).hexdigest()[:20]
+    nombre = etag + os.path.splitext(ruta)[1]
+    os.makedirs(ESTATICOS_DIR, exist_ok=True)
+    base = os.path.join(ESTATICOS_DIR, nombre)
+    variantes = {"gzip": _comprimir(datos, base + ".gz", lambda d: gzip.compress(d, compresslevel=9))}
+    if BROTLI_DISPONIBLE:
+        variantes["br"] = _comprimir(datos, base + ".br", lambda d: brotli.compress(d, quality=9))
+    tipo = mimetypes.guess_type(ruta)[0] or "application/octet-stream"
+
+    with _candado:
+        _estaticos[nombre] = {"etag": etag, "tipo": tipo, "variantes": variantes}
+        _estaticos.move_to_end(nombre)
+        _publicados[(ruta, version)] = nombre
+        _publicados.move_to_end((ruta, version))
+        while len(_estaticos) > MAX_ESTATICOS:
+            _, antiguo = _estaticos.popitem(last=False)
+            for destino in antiguo["variantes"].values():
+                try:
+                    os.remove(destino)
+                except OSError:
+                    pass
+        # Versiones cuyo archivo ya se desalojó, y como mucho una entrada por archivo vivo
+        for clave in [k for k, n in _publicados.items() if n not in _estaticos]:
+            del _publicados[clave]
+        while len(_publicados) > MAX_ESTATICOS:
+            _publicados.popitem(last=False)
+    return f"/estaticos/{nombre}"
+
+
+def limpiar_estaticos(maximo=MAX_ESTATICOS):
+    """Borra de ESTATICOS_DIR temporales huérfanos y todo salvo los ``maximo`` mapas usados más recientemente"""
+    try:
+        entradas = [e for e in os.scandir(ESTATICOS_DIR) if e.is_file()]
+    except OSError:
+        return
+    grupos = {}
+    for entrada in entradas:
+        if entrada.name.endswith(".tmp"):
+            grupos.setdefault(None, []).append(entrada)
+        else:
+            # nombre.html.gz / nombre.html.br -> nombre.html
+            grupos.setdefault(os.path.splitext(entrada.name)[0], []).append(entrada)
+    huerfanos = grupos.pop(None, [])
+    recientes = sorted(grupos.values(), key=lambda g: max(e.stat().st_mtime for e in g), reverse=True)
+    for entrada in huerfanos + [e for grupo in recientes[maximo:] for e in grupo]:
+        try:
+            os.remove(entrada.path)
+        except OSError:
+            pass
+
+
+def _obtener_estatico(nombre):
+    with _candado:
+        return _estaticos.get(nombre)
+
+
+class _Manejador(BaseHTTPRequestHandler):
+    def _responder(self, estado, cuerpo, tipo="application/json"):
+        self.send_response(estado)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(len(cuerpo)))
+        # Los mapas se incrustan en iframes de Streamlit (otro origen)
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def _error(self, estado, mensaje):
+        self._responder(estado, json.dumps({"error": mensaje}).encode("utf-8"))
+
+    def _estatico(self, nombre):
+        estatico = _obtener_estatico(nombre)
+        if estatico is None:
+            self._error(404, "archivo no publicado")
+            return
+        etag = f'"{estatico["etag"]}"'
+        if etag in self.headers.get("If-None-Match", ""):
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            return
+
+        aceptadas = self.headers.get("Accept-Encoding", "")
+        codificacion = next((c for c in ("br", "gzip") if c in aceptadas and c in estatico["variantes"]), None)
+        if codificacion is None:
+            # Cliente sin gzip (raro): se descomprime al vuelo
+            with open(estatico["variantes"]["gzip"], "rb") as f:
+                cuerpo = gzip.decompress(f.read())
+            longitud = len(cuerpo)
+        else:
+            longitud = os.path.getsize(estatico["variantes"][codificacion])
+
+        self.send_response(200)
+        self.send_header("Content-Type", estatico["tipo"])
+        self.send_header("Content-Length", str(longitud))
+        if codificacion is not None:
+            self.send_header("Content-Encoding", codificacion)
+        self.send_header("Vary", "Accept-Encoding")
+        # Sin max-age: el navegador revalida cada vez y, si no cambió, recibe un 304 vacío
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        if codificacion is None:
+            self.wfile.write(cuerpo)
+        else:
+            with open(estatico["variantes"][codificacion], "rb") as f:
+                shutil.copyfileobj(f, self.wfile)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path.startswith("/estaticos/"):
+            self._estatico(url.path[len("/estaticos/"):])
+            return
+        if url.path != "/clusters":
+            self._error(404, "ruta no encontrada")
+            return
+
+        params = parse_qs(url.query)
+        indice = _obtener_indice(params.get("indice", [""])[0])
+        if indice is None:
+            self._error(404, "índice no registrado")
+            return
+        try:
+            bbox = [float(v) for v in params["bbox"][0].split(",")]
+            zoom = float(params["zoom"][0])
+            if len(bbox) != 4:
+                raise ValueError(bbox)
+        except (KeyError, ValueError):
+            self._error(400, "parámetros esperados: bbox=oeste,sur,este,norte&zoom=z")
+            return
+
+        cuerpo = json.dumps(consultar_clusters(indice, bbox, zoom), separators=(",", ":"))
+        self._responder(200, cuerpo.encode("utf-8"))
+
+    def log_message(self, format, *args):
+        # Sin una línea en la consola de Streamlit por cada movimiento del mapa
+        pass
+
+
+def iniciar_servidor(url_base=URL_BASE, puerto=PUERTO, host=HOST):
+    """Arranca el servidor en un hilo daemon y devuelve ``url_base``, o None si no hay URL configurada.
+
+    No se cambia de puerto si el configurado está ocupado: la URL (o el proxy
+    que hay delante) apuntaría a otro sitio, así que se lanza OSError.
+    """
+    if not url_base:
+        return None
+    # El registro en memoria empieza vacío: lo que quedó en disco de otros arranques sobra
+    limpiar_estaticos()
+    try:
+        servidor = ThreadingHTTPServer((host, puerto), _Manejador)
+    except OSError as e:
+        raise OSError(f"No se pudo abrir el servidor de mapas en {host}:{puerto} (MAPAS_URL_BASE={url_base}): {e}") from e
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, name="servidor_mapas", daemon=True).start()
+    return url_base.rstrip("/")
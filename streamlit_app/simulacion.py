@@ -0,0 +1,114 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from roi import GASTOS_ANUALES, M2_MEDIOS, valores_por_fila
+
+
+# Nº fijo de lotes: los resultados con la misma semilla no dependen de los núcleos disponibles
+N_LOTES = 8
+# Por debajo de este nº de muestras (barrios x simulaciones) no compensa arrancar procesos
+MIN_MUESTRAS_POOL = 2_000_000
+
+
+def ajustar_distribuciones(df, precio_m2, ocupacion="days_rented", precio="price", barrio="neighbourhood"):
+    """Parámetros por barrio: Beta para la ocupación (días/365) y lognormal para el precio.
+
+    Ambas por método de momentos. El €/m² de compra es la media del barrio.
+    """
+    precios = valores_por_fila(df, precio)
+    datos = pd.DataFrame({
+        "barrio": df[barrio].astype(str).where(df[barrio].notna()),
+        "ocupacion": np.clip(valores_por_fila(df, ocupacion) / 365, 0.001, 0.999),
+        "log_precio": np.log(np.where(precios > 0, precios, np.nan)),
+        "precio_m2": valores_por_fila(df, precio_m2),
+    }).dropna()
+
+    params = datos.groupby("barrio").agg(
+        n=("ocupacion", "size"),
+        media_ocupacion=("ocupacion", "mean"),
+        var_ocupacion=("ocupacion", "var"),
+        mu_log_precio=("log_precio", "mean"),
+        sigma_log_precio=("log_precio", "std"),
+        precio_m2=("precio_m2", "mean"),
+    )
+    media = params["media_ocupacion"]
+    # Varianza nula o de un solo anuncio: se usa una Beta concentrada (var = 1% de la máxima)
+    var = params["var_ocupacion"].where(params["var_ocupacion"] > 0, media * (1 - media) * 0.01)
+    var = np.minimum(var.fillna(media * (1 - media) * 0.01), media * (1 - media) * 0.99)
+    comun = media * (1 - media) / var - 1
+    params["alpha"] = media * comun
+    params["beta"] = (1 - media) * comun
+    params["sigma_log_precio"] = params["sigma_log_precio"].fillna(0.0)
+    return params
+
+
+def _simular_lote(alpha, beta, mu_log_precio, sigma_log_precio, precio_m2,
+                  n, semilla, gastos, cv_gastos, m2, sigma_compra):
+    # Todas las muestras del lote de una vez: matrices (barrios, n)
+    rng = np.random.default_rng(semilla)
+    forma = (len(alpha), n)
+    ocupacion = rng.beta(alpha[:, None], beta[:, None], size=forma)
+    precio = rng.lognormal(mu_log_precio[:, None], sigma_log_precio[:, None], size=forma)
+    gastos_anuales = np.maximum(rng.normal(gastos, gastos * cv_gastos, size=forma), 0)
+    valor = precio_m2[:, None] * m2 * rng.lognormal(0.0, sigma_compra, size=forma)
+    ingresos_netos = precio * ocupacion * 365 - gastos_anuales
+    return (ingresos_netos / valor * 100).astype("float32")
+
+
+def simular_roi_neto(
+    params,
+    n_simulaciones=10_000,
+    semilla=42,
+    gastos=GASTOS_ANUALES,
+    cv_gastos=0.2,
+    m2=M2_MEDIOS,
+    sigma_compra=0.1,
+    max_procesos=None,
+):
+    """Monte Carlo del ROI neto por barrio a partir de ``ajustar_distribuciones``.
+
+    Las simulaciones se reparten en N_LOTES lotes con semillas derivadas de
+    ``semilla`` (SeedSequence.spawn) y, si hay suficientes muestras, se ejecutan
+    en un pool de procesos. Devuelve por barrio la media, percentiles, el VaR al
+    95 % (percentil 5 del ROI neto) y la probabilidad de pérdida.
+    """
+    if params.empty:
+        return pd.DataFrame()
+
+    semillas = np.random.SeedSequence(semilla).spawn(N_LOTES)
+    tamanos = [len(lote) for lote in np.array_split(np.arange(n_simulaciones), N_LOTES)]
+    argumentos = [
+        (params["alpha"].to_numpy(), params["beta"].to_numpy(),
+         params["mu_log_precio"].to_numpy(), params["sigma_log_precio"].to_numpy(),
+         params["precio_m2"].to_numpy(), n, s, gastos, cv_gastos, m2, sigma_compra)
+        for n, s in zip(tamanos, semillas)
+    ]
+
+    procesos = min(max_procesos or os.cpu_count() or 1, N_LOTES)
+    lotes = None
+    if procesos > 1 and len(params) * n_simulaciones >= MIN_MUESTRAS_POOL:
+        try:
+            # "spawn": el servidor de Streamlit tiene hilos y fork no es seguro con ellos
+            contexto = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=procesos, mp_context=contexto) as pool:
+                lotes = list(pool.map(_simular_lote, *zip(*argumentos)))
+        except (OSError, RuntimeError):
+            lotes = None  # entorno sin multiproceso: se calcula en serie
+    if lotes is None:
+        lotes = [_simular_lote(*args) for args in argumentos]
+
+    roi_neto = np.concatenate(lotes, axis=1)
+    p5, p50, p95 = np.percentile(roi_neto, [5, 50, 95], axis=1)
+    return pd.DataFrame({
+        "roi_neto_medio": roi_neto.mean(axis=1),
+        "p5": p5,
+        "p50": p50,
+        "p95": p95,
+        "var_95": p5,
+        "prob_perdida": (roi_neto < 0).mean(axis=1),
+        "n_anuncios": params["n"].to_numpy(),
+    }, index=params.index)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Los módulos de la app se importan por nombre desde streamlit_app/, como al hacer streamlit run
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "streamlit_app"))
@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from agregados import combinar_parciales, cubo_barrios, filas_seleccion, indice_barrios
+
+
+@pytest.fixture
+def anuncios():
+    rng = np.random.default_rng(0)
+    n = 200
+    df = pd.DataFrame({
+        "neighbourhood": rng.choice(["Russafa", "El Carme", "Benimaclet", "Patraix"], n),
+        "price": rng.uniform(30, 300, n),
+        "Net ROI (%)": rng.normal(5, 3, n),
+        "estimated_occupancy_l365d": rng.integers(0, 365, n),
+    })
+    df.loc[rng.choice(n, 20, replace=False), "price"] = np.nan
+    df["neighbourhood"] = df["neighbourhood"].astype("category")
+    return df
+
+
+def _directo(df, metricas):
+    return pd.DataFrame({
+        "count": df[metricas].count().astype("float64"),
+        "sum": df[metricas].sum(),
+        "mean": df[metricas].mean(),
+        "min": df[metricas].min(),
+        "max": df[metricas].max(),
+    })
+
+
+@pytest.mark.parametrize("seleccion", [None, ["Russafa"], ["El Carme", "Patraix"]])
+def test_combinar_parciales_igual_que_sobre_las_filas(anuncios, seleccion):
+    metricas = ["price", "Net ROI (%)"]
+    cubo = cubo_barrios(anuncios, metricas=metricas)
+    filas = anuncios
+    if seleccion is not None:
+        cubo = cubo.loc[seleccion]
+        filas = anuncios[anuncios["neighbourhood"].isin(seleccion)]
+    combinado = combinar_parciales(cubo).loc[metricas]
+    pd.testing.assert_frame_equal(combinado, _directo(filas, metricas), check_names=False, check_dtype=False)
+
+
+def test_activos_cuenta_anuncios_sobre_el_umbral(anuncios):
+    cubo = cubo_barrios(anuncios, metricas=["price"])
+    activos = combinar_parciales(cubo).loc["activos", "sum"]
+    assert activos == (anuncios["estimated_occupancy_l365d"] > 150).sum()
+    assert cubo[("anuncios", "size")].sum() == len(anuncios)
+
+
+def test_metrica_sin_valores_tiene_media_nula():
+    df = pd.DataFrame({"neighbourhood": ["a", "b"], "price": [np.nan, np.nan]})
+    combinado = combinar_parciales(cubo_barrios(df, metricas=["price"]))
+    assert combinado.loc["price", "count"] == 0
+    assert np.isnan(combinado.loc["price", "mean"])
+
+
+def test_filas_seleccion_en_el_orden_original(anuncios):
+    indice = indice_barrios(anuncios)
+    posiciones = filas_seleccion(indice, ["Patraix", "Russafa", "No existe"])
+    esperado = np.flatnonzero(anuncios["neighbourhood"].isin(["Patraix", "Russafa"]))
+    np.testing.assert_array_equal(posiciones, esperado)
+    assert filas_seleccion(indice, []).size == 0
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+
+from binning import _hexagono, agregar_hexagonos, desproyectar, geojson_hexagonos, proyectar_metros
+
+
+RAIZ3 = np.sqrt(3.0)
+VECINOS = [(1, 0), (1, -1), (0, -1), (-1, 0), (-1, 1), (0, 1)]
+
+
+def _centro(q, r, tamano):
+    return tamano * (RAIZ3 * q + RAIZ3 / 2 * r), tamano * 1.5 * r
+
+
+def test_cada_punto_cae_en_el_hexagono_de_centro_mas_cercano():
+    rng = np.random.default_rng(1)
+    tamano = 300.0
+    x, y = rng.uniform(-5000, 5000, 20_000), rng.uniform(-5000, 5000, 20_000)
+    q, r = _hexagono(x, y, tamano)
+    cx, cy = _centro(q, r, tamano)
+    distancia = np.hypot(x - cx, y - cy)
+    # Dentro del hexágono: como mucho el radio de centro a vértice
+    assert (distancia <= tamano * (1 + 1e-9)).all()
+    for dq, dr in VECINOS:
+        vx, vy = _centro(q + dq, r + dr, tamano)
+        assert (distancia <= np.hypot(x - vx, y - vy) + 1e-6).all()
+
+
+def test_los_centros_se_asignan_a_si_mismos():
+    q = np.array([0, 3, -2, 5, -4])
+    r = np.array([0, -1, 4, 2, -3])
+    x, y = _centro(q, r, 150.0)
+    rq, rr = _hexagono(x, y, 150.0)
+    np.testing.assert_array_equal(rq, q)
+    np.testing.assert_array_equal(rr, r)
+
+
+def test_proyeccion_ida_y_vuelta():
+    lat, lon = np.array([39.47, 39.49, 39.45]), np.array([-0.38, -0.35, -0.40])
+    x, y, origen = proyectar_metros(lat, lon)
+    lat2, lon2 = desproyectar(x, y, origen)
+    np.testing.assert_allclose(lat2, lat)
+    np.testing.assert_allclose(lon2, lon)
+
+
+def test_agregado_por_hexagono():
+    df = pd.DataFrame({
+        "latitude": [39.470, 39.4701, 39.490, np.nan],
+        "longitude": [-0.380, -0.3801, -0.350, -0.36],
+        "price": [100.0, 50.0, 80.0, 70.0],
+    })
+    celdas = agregar_hexagonos(df, tamano_m=150)
+    # El anuncio sin coordenadas no cuenta; los dos primeros (a ~15 m) comparten hexágono
+    assert celdas["n_anuncios"].sum() == 3
+    assert sorted(celdas["n_anuncios"]) == [1, 2]
+    assert celdas.loc[celdas["n_anuncios"] == 2, "precio_medio"].item() == 75.0
+    # Columnas que no existen: métricas vacías
+    assert celdas["roi_mediano"].isna().all()
+
+    geojson = geojson_hexagonos(celdas)
+    assert len(geojson["features"]) == len(celdas)
+    anillo = geojson["features"][0]["geometry"]["coordinates"][0]
+    assert len(anillo) == 7 and anillo[0] == anillo[-1]
@@ -0,0 +1,85 @@
+import os
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("pyarrow")
+
+import data_cache  # noqa: E402
+from data_cache import leer_csv_cacheado  # noqa: E402
+
+
+@pytest.fixture
+def csv(tmp_path):
+    path = tmp_path / "anuncios.csv"
+    pd.DataFrame({"id": [1, 2, 3], "price": [50.0, 80.0, 120.0], "room_type": ["a", "b", "a"]}).to_csv(path, index=False)
+    return str(path)
+
+
+def _sin_parseo(monkeypatch):
+    """A partir de aquí la lectura tiene que salir del Parquet"""
+    monkeypatch.setattr(data_cache.pd, "read_csv", lambda *a, **k: pytest.fail("se ha vuelto a parsear el CSV"))
+
+
+def _mover_mtime(path, segundos=10):
+    estado = os.stat(path)
+    os.utime(path, ns=(estado.st_atime_ns, estado.st_mtime_ns + segundos * 10 ** 9))
+
+
+def test_segunda_lectura_sale_del_parquet(csv, monkeypatch):
+    primera = leer_csv_cacheado(csv)
+    _sin_parseo(monkeypatch)
+    pd.testing.assert_frame_equal(leer_csv_cacheado(csv), primera)
+
+
+def test_mismo_contenido_con_otro_mtime_reutiliza_la_copia(csv, monkeypatch):
+    primera = leer_csv_cacheado(csv)
+    _mover_mtime(csv)
+    _sin_parseo(monkeypatch)
+    pd.testing.assert_frame_equal(leer_csv_cacheado(csv), primera)
+
+    # El meta se actualiza con el nuevo mtime: la siguiente lectura ya no calcula el hash
+    monkeypatch.setattr(data_cache, "_hash_archivo", lambda path: pytest.fail("se ha vuelto a calcular el hash"))
+    pd.testing.assert_frame_equal(leer_csv_cacheado(csv), primera)
+
+
+def test_contenido_nuevo_invalida_la_copia(csv):
+    leer_csv_cacheado(csv)
+    pd.DataFrame({"id": [7], "price": [99.0], "room_type": ["c"]}).to_csv(csv, index=False)
+    _mover_mtime(csv)
+    df = leer_csv_cacheado(csv)
+    assert df["id"].tolist() == [7]
+    assert df["price"].tolist() == [99.0]
+
+
+def test_hash_distinto_en_el_meta_regenera_la_copia(csv):
+    leer_csv_cacheado(csv)
+    path_parquet, path_meta = data_cache._rutas_cache(csv, {})
+    # Con otro mtime se compara el contenido: un hash guardado distinto obliga a regenerar
+    _mover_mtime(csv)
+    meta = data_cache._leer_meta(path_meta)
+    meta["sha1"] = "0" * 40
+    data_cache._guardar_meta(path_meta, meta)
+    df = leer_csv_cacheado(csv)
+    assert df["id"].tolist() == [1, 2, 3]
+    assert data_cache._leer_meta(path_meta)["sha1"] == data_cache._hash_archivo(csv)
+
+
+def test_proyeccion_de_columnas(csv):
+    esperado = ["id", "price"]
+    assert leer_csv_cacheado(csv, columnas=["id", "price", "no_existe"]).columns.tolist() == esperado
+    # Ya desde el Parquet
+    assert leer_csv_cacheado(csv, columnas=["id", "price", "no_existe"]).columns.tolist() == esperado
+
+
+def test_parquet_corrupto_vuelve_al_csv(csv):
+    leer_csv_cacheado(csv)
+    path_parquet, _ = data_cache._rutas_cache(csv, {})
+    with open(path_parquet, "wb") as f:
+        f.write(b"no es parquet")
+    df = leer_csv_cacheado(csv)
+    assert df["price"].tolist() == [50.0, 80.0, 120.0]
+
+
+def test_opciones_de_lectura_forman_parte_de_la_clave(csv):
+    assert data_cache._rutas_cache(csv, {}) != data_cache._rutas_cache(csv, {"sep": ";"})
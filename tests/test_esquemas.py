@@ -0,0 +1,42 @@
+import io
+
+import pandas as pd
+
+from esquemas import COLUMNAS_IDENTIFICADOR, _a_identificador, aplicar_esquema
+
+
+# Por encima de 2**53: float64 (y más aún float32) ya no los representa
+IDS = [1234567890123456789, 9007199254740993, 53]
+
+
+def test_ids_sin_nulos_quedan_en_int64():
+    serie = _a_identificador(pd.Series([str(i) for i in IDS]))
+    assert serie.dtype == "int64"
+    assert serie.tolist() == IDS
+
+
+def test_ids_con_nulos_quedan_en_int64_nullable():
+    serie = _a_identificador(pd.Series([str(IDS[0]), None, str(IDS[1])]))
+    assert serie.dtype == "Int64"
+    assert serie.isna().tolist() == [False, True, False]
+    assert [serie[0], serie[2]] == IDS[:2]
+
+
+def test_ids_ya_enteros_no_cambian():
+    serie = _a_identificador(pd.Series(IDS, dtype="int64"))
+    assert serie.dtype == "int64"
+    assert serie.tolist() == IDS
+
+
+def test_ida_y_vuelta_por_csv():
+    original = pd.DataFrame({"id": IDS, "host_id": [IDS[1], None, IDS[0]], "price": [10.0, 20.0, 30.0]})
+    original["host_id"] = original["host_id"].astype("Int64")
+    texto = original.to_csv(index=False)
+    # Como ciudades._opciones_lectura: los identificadores se leen como texto
+    df = aplicar_esquema(pd.read_csv(io.StringIO(texto), dtype={c: str for c in COLUMNAS_IDENTIFICADOR}))
+    assert df["id"].dtype == "int64"
+    assert df["id"].tolist() == IDS
+    assert df["host_id"].dtype == "Int64"
+    pd.testing.assert_series_equal(df["host_id"], original["host_id"])
+    # Sigue sirviendo para buscar un anuncio por su id exacto
+    assert df["id"].eq(IDS[0]).sum() == 1
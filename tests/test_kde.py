@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from kde import kde_1d, kde_2d, niveles_isoproporcion
+
+
+def _quantile_to_level(data, quantile):
+    """seaborn.distributions._DistributionPlotter._quantile_to_level"""
+    isoprop = np.asarray(quantile)
+    values = np.ravel(data)
+    sorted_values = np.sort(values)[::-1]
+    normalized_values = np.cumsum(sorted_values) / values.sum()
+    idx = np.searchsorted(normalized_values, 1 - isoprop)
+    levels = np.take(sorted_values, idx, mode="clip")
+    return levels
+
+
+def _integral(x, densidad):
+    return float(np.sum((densidad[1:] + densidad[:-1]) / 2 * np.diff(x)))
+
+
+@pytest.fixture(scope="module")
+def densidad():
+    rng = np.random.default_rng(4)
+    x = np.r_[rng.normal(0, 1, 3000), rng.normal(4, 0.5, 1000)]
+    y = np.r_[rng.normal(0, 1, 3000), rng.normal(3, 0.5, 1000)]
+    return kde_2d(x, y)[2]
+
+
+@pytest.mark.parametrize("thresh, niveles", [(0.05, 10), (0.2, 5), (0, 4)])
+def test_niveles_como_seaborn(densidad, thresh, niveles):
+    esperado = _quantile_to_level(densidad, np.linspace(thresh, 1, niveles))
+    np.testing.assert_array_equal(niveles_isoproporcion(densidad, thresh, niveles), np.unique(esperado))
+
+
+def test_el_nivel_inferior_encierra_la_masa_pedida(densidad):
+    inferior = niveles_isoproporcion(densidad, thresh=0.05)[0]
+    masa = densidad[densidad >= inferior].sum() / densidad.sum()
+    assert masa == pytest.approx(0.95, abs=0.01)
+
+
+def test_kde_1d_integra_a_uno_y_respeta_el_clip():
+    valores = np.random.default_rng(5).normal(10, 2, 5000)
+    x, densidad = kde_1d(valores)
+    assert _integral(x, densidad) == pytest.approx(1, abs=1e-3)
+    x, densidad = kde_1d(valores, clip=(10, np.inf))
+    assert x[0] == 10
+    # El clip limita la zona evaluada, no los datos: queda la mitad de la masa
+    assert _integral(x, densidad) == pytest.approx(0.5, abs=0.02)
+
+
+def test_kde_1d_como_gaussian_kde():
+    scipy_stats = pytest.importorskip("scipy.stats")
+    valores = np.random.default_rng(6).gamma(2, 3, 2000)
+    x, densidad = kde_1d(valores, bw_adjust=0.7)
+    referencia = scipy_stats.gaussian_kde(valores, bw_method=scipy_stats.gaussian_kde(valores).factor * 0.7)(x)
+    np.testing.assert_allclose(densidad, referencia, atol=1e-3 * referencia.max())
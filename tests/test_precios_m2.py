@@ -0,0 +1,49 @@
+import pandas as pd
+import pytest
+
+from precios_m2 import asignar_precio_m2, normalizar_barrio, tabla_precio_m2
+
+
+@pytest.fixture
+def tabla():
+    # €/m² de vivienda: solo dos barrios del distrito de l'Eixample y uno de Ciutat Vella
+    return tabla_precio_m2(pd.DataFrame({
+        "neighbourhood": ["Russafa", "Russafa", "Pla del Remei", "El Carme"],
+        "precio": [3000.0, 3200.0, 4000.0, 3600.0],
+    }))
+
+
+@pytest.fixture
+def distritos():
+    return pd.Series({"RUSSAFA": "L EIXAMPLE", "PLA DEL REMEI": "L EIXAMPLE", "GRAN VIA": "L EIXAMPLE",
+                      "EL CARME": "CIUTAT VELLA"})
+
+
+def test_normalizacion_de_nombres():
+    claves = normalizar_barrio(pd.Series(["Gran Vía", "l'Eixample", "  Sant-Francesc ", None]))
+    assert claves.tolist()[:3] == ["GRAN VIA", "L EIXAMPLE", "SANT FRANCESC"]
+    assert pd.isna(claves[3])
+
+
+def test_barrio_distrito_y_ciudad(tabla, distritos):
+    barrios = pd.Series(["Russafa", "Gran Vía", "Benimaclet", None])
+    precio, nivel = asignar_precio_m2(barrios, tabla, distritos)
+    assert nivel.tolist() == ["barrio", "distrito", "ciudad", "ciudad"]
+    assert precio[0] == 3100.0
+    # Media de los barrios de la tabla en l'Eixample: (3100 + 4000) / 2
+    assert precio[1] == 3550.0
+    # Media de los barrios de la tabla, no de las filas
+    assert precio[2] == precio[3] == pytest.approx((3100.0 + 4000.0 + 3600.0) / 3)
+
+
+def test_sin_distritos_se_pasa_a_la_ciudad(tabla):
+    precio, nivel = asignar_precio_m2(pd.Series(["Gran Vía", "El Carme"]), tabla, media_ciudad=2500.0)
+    assert nivel.tolist() == ["ciudad", "barrio"]
+    assert precio.tolist() == [2500.0, 3600.0]
+
+
+def test_conserva_el_indice_de_los_anuncios(tabla, distritos):
+    barrios = pd.Series(["El Carme", "Gran Vía"], index=[10, 20])
+    precio, nivel = asignar_precio_m2(barrios, tabla, distritos)
+    assert precio.index.tolist() == nivel.index.tolist() == [10, 20]
+    assert precio.dtype == "float64"
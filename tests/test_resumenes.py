@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("plotly")
+
+from resumenes import bordes_histograma, conteos_histograma, resumen_caja  # noqa: E402
+
+
+def _px_box(valores):
+    """Lo que dibuja px.box por defecto: cuartiles lineales y bigotes de Tukey al dato más extremo"""
+    v = pd.Series(valores).dropna()
+    q1, mediana, q3 = v.quantile([0.25, 0.5, 0.75])
+    rango = q3 - q1
+    dentro = v[v.between(q1 - 1.5 * rango, q3 + 1.5 * rango)]
+    return q1, mediana, q3, dentro.min(), dentro.max()
+
+
+@pytest.mark.parametrize("valores", [
+    [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 100],
+    [-50, 4, 4.5, 5, 5.2, 6, 7, 120, np.nan],
+    list(np.random.default_rng(2).lognormal(4, 1, 999)),
+])
+def test_resumen_como_px_box(valores):
+    resumen = resumen_caja(valores)
+    q1, mediana, q3, inferior, superior = _px_box(valores)
+    assert resumen["q1"] == pytest.approx(q1)
+    assert resumen["mediana"] == pytest.approx(mediana)
+    assert resumen["q3"] == pytest.approx(q3)
+    assert resumen["inferior"] == inferior
+    assert resumen["superior"] == superior
+    v = pd.Series(valores).dropna()
+    assert resumen["n"] == len(v)
+    np.testing.assert_array_equal(resumen["atipicos"], np.sort(v[(v < inferior) | (v > superior)]))
+
+
+def test_atipicos_acotados_conservan_los_extremos():
+    valores = np.r_[np.arange(1000), 10_000 + np.arange(100)]
+    resumen = resumen_caja(valores, max_atipicos=50)
+    assert resumen["atipicos"].size == 50
+    assert resumen["atipicos"][0] == 10_000 and resumen["atipicos"][-1] == 10_099
+
+
+def test_sin_datos_no_hay_caja():
+    assert resumen_caja([np.nan, np.inf]) is None
+
+
+def test_conteos_como_np_histogram():
+    valores = np.random.default_rng(3).normal(100, 20, 5000)
+    bordes = bordes_histograma(valores, nbins=40)
+    assert len(bordes) - 1 <= 41
+    np.testing.assert_array_equal(conteos_histograma(valores, bordes), np.histogram(valores, bordes)[0])
+    grupos = np.arange(5000) % 3
+    por_grupo = conteos_histograma(valores, bordes, grupos)
+    for g in range(3):
+        np.testing.assert_array_equal(por_grupo[g], np.histogram(valores[grupos == g], bordes)[0])
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+
+from roi import NOMBRES_MALAGA, calcular_roi
+
+
+def _valencia_notebook(df, precio_m2_valencia, average_m2=70, gastos_anuales=3000):
+    """Celdas de Valencia_EDA.ipynb, tal cual"""
+    df = df.copy()
+    df['annual_income'] = df['price'] * df['days_rented']
+    df['estimated_property_value'] = precio_m2_valencia * average_m2
+    df['ROI (%)'] = (df['annual_income'] / df['estimated_property_value']) * 100
+    df['net_annual_income'] = df['annual_income'] - gastos_anuales
+    df['Net ROI (%)'] = (df['net_annual_income'] / df['estimated_property_value']) * 100
+    return df
+
+
+def _malaga_notebook(df, gastos_anuales=3000, average_m2=70):
+    """calcular_roi() de malaga_eda.ipynb, tal cual"""
+    df = df.copy()
+    df['annual_income'] = df['estimated_revenue_l365d']
+    df['estimated_property_value'] = df['price_per_m2'] * average_m2
+    df['roi'] = (df['annual_income'] / df['estimated_property_value']) * 100
+    df['net_annual_income'] = df['annual_income'] - gastos_anuales
+    df['net_roi'] = (df['net_annual_income'] / df['estimated_property_value']) * 100
+    return df
+
+
+def _anuncios():
+    return pd.DataFrame({
+        "price": [60.0, 95.0, 150.0, np.nan],
+        "days_rented": [200, 120, 30, 100],
+        "estimated_revenue_l365d": [12000.0, 11400.0, 2500.0, 8000.0],
+        "price_per_m2": [2100.0, 3400.0, 2800.0, 2500.0],
+    })
+
+
+def test_valencia_igual_que_el_notebook():
+    esperado = _valencia_notebook(_anuncios(), 2450.0)
+    df = calcular_roi(_anuncios(), 2450.0)
+    for columna in ["annual_income", "estimated_property_value", "ROI (%)", "net_annual_income", "Net ROI (%)"]:
+        np.testing.assert_allclose(df[columna], esperado[columna], equal_nan=True, err_msg=columna)
+
+
+def test_malaga_igual_que_el_notebook():
+    esperado = _malaga_notebook(_anuncios())
+    df = calcular_roi(_anuncios(), "price_per_m2", ingresos="estimated_revenue_l365d", nombres=NOMBRES_MALAGA)
+    for columna in ["annual_income", "estimated_property_value", "roi", "net_annual_income", "net_roi"]:
+        np.testing.assert_allclose(df[columna], esperado[columna], equal_nan=True, err_msg=columna)
+
+
+def test_costes_de_compra_y_payback():
+    df = calcular_roi(_anuncios(), 2000.0, m2=50, gastos_anuales=1000, costes_compra=0.1)
+    inversion = 2000.0 * 50 * 1.1
+    ingresos = _anuncios()["price"] * _anuncios()["days_rented"]
+    np.testing.assert_allclose(df["ROI (%)"], ingresos / inversion * 100, equal_nan=True)
+    # El yield es sobre el valor del inmueble, sin costes de compra
+    np.testing.assert_allclose(df["Yield (%)"], ingresos / 100_000 * 100, equal_nan=True)
+    np.testing.assert_allclose(df["Payback (años)"][:3], inversion / (ingresos[:3] - 1000))
+    # Sin precio no hay ingreso neto positivo ni payback
+    assert np.isnan(df["Payback (años)"][3])
+
+
+def test_payback_sin_sentido_si_el_neto_no_es_positivo():
+    df = calcular_roi(pd.DataFrame({"price": [10.0], "days_rented": [100]}), 2000.0, gastos_anuales=1000)
+    assert df["net_annual_income"][0] == 0
+    assert np.isnan(df["Payback (años)"][0])